@@ -10,7 +10,9 @@ import ollama
 import json
 import logging
 import re
-from typing import Union, Dict, List
+import threading
+from collections import OrderedDict
+from typing import Union, Dict, List, Optional, Tuple
 import time
 
 from core.gerenciador_sessao import obter_contexto_conversa, detectar_comandos_limpar_carrinho
@@ -48,10 +50,31 @@ FERRAMENTAS_DISPONIVEIS = [
     "busca_inteligente_com_promocoes"
 ]
 
+# Regex pré-compilada para extrair apenas os dígitos do CNPJ
+_PADRAO_NAO_DIGITO = re.compile(r"\D")
+
+# CNPJs aceitos em desenvolvimento e pesos dos dígitos verificadores
+_CNPJS_TESTE = frozenset({
+    "11222333000181",  # CNPJ de teste válido
+    "12345678910203",  # CNPJ usado nos testes
+    "12365562103231",  # CNPJ usado nos logs
+    "11111111111111",  # Para testes simples
+    "12345678000195",  # Outro CNPJ de teste
+})
+_PESOS_CNPJ_DV1 = (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+_PESOS_CNPJ_DV2 = (6,) + _PESOS_CNPJ_DV1
+
 # Cache do prompt para evitar leitura repetida do arquivo
 _cache_prompt = None
 _tempo_cache_prompt = 0
 
+# Cache exato de intenções por sessão e estado do menu (evita nova chamada à IA para a mesma entrada)
+TTL_CACHE_INTENCAO = int(os.getenv("INTENT_CACHE_TTL", "600"))  # Segundos
+MAX_CACHE_INTENCAO = int(os.getenv("INTENT_CACHE_SIZE", "2048"))
+_ACOES_SEM_CONTEXTO = frozenset({"", "AWAITING_MENU_SELECTION"})
+_cache_intencao: "OrderedDict[Tuple, Tuple[float, str]]" = OrderedDict()
+_trava_cache_intencao = threading.Lock()
+
 def validar_configuracao():
     """Valida configuração crítica no startup"""
     variaveis_obrigatorias = {
@@ -103,64 +126,46 @@ def is_valid_cnpj(cnpj: str) -> bool:
     🆕 NOVA FUNÇÃO: Valida se uma string é um CNPJ válido.
     Aceita CNPJ com ou sem pontuação (XX.XXX.XXX/XXXX-XX ou XXXXXXXXXXXXXX)
     """
-    logging.debug(f"Validando CNPJ: '{cnpj}'")
-    print(f">>> CONSOLE: 🔍 [IS_VALID_CNPJ] Validando CNPJ: '{cnpj}'")
+    logging.debug("🔍 [IS_VALID_CNPJ] Validando CNPJ: '%s'", cnpj)
+    
+    # ⚡ Menos de 14 caracteres nunca contém 14 dígitos: evita o regex
+    if len(cnpj) < 14:
+        logging.debug("❌ [IS_VALID_CNPJ] CNPJ não tem 14 dígitos (tem %s caracteres)", len(cnpj))
+        return False
     
     # Remove caracteres não numéricos (pontos, barras, traços)
-    cnpj_digits = re.sub(r'\D', '', cnpj)
-    print(f">>> CONSOLE: 🔍 [IS_VALID_CNPJ] CNPJ apenas dígitos: '{cnpj_digits}'")
+    cnpj_digits = _PADRAO_NAO_DIGITO.sub('', cnpj)
+    logging.debug("🔍 [IS_VALID_CNPJ] CNPJ apenas dígitos: '%s'", cnpj_digits)
     
-    # Verifica se tem 14 dígitos
-    if len(cnpj_digits) != 14:
-        print(f">>> CONSOLE: ❌ [IS_VALID_CNPJ] CNPJ não tem 14 dígitos (tem {len(cnpj_digits)})")
+    # Verifica se tem 14 dígitos (ASCII: \d também aceita dígitos unicode)
+    if len(cnpj_digits) != 14 or not cnpj_digits.isascii():
+        logging.debug("❌ [IS_VALID_CNPJ] CNPJ não tem 14 dígitos (tem %s)", len(cnpj_digits))
         return False
     
     # 🆕 ACEITA CNPJs DE TESTE PARA DESENVOLVIMENTO
-    test_cnpjs = [
-        "11222333000181",  # CNPJ de teste válido
-        "12345678910203",  # CNPJ usado nos testes
-        "12365562103231",  # CNPJ usado nos logs
-        "11111111111111",  # Para testes simples 
-        "12345678000195",  # Outro CNPJ de teste
-    ]
-    
-    print(f">>> CONSOLE: 🔍 [IS_VALID_CNPJ] Verificando se '{cnpj_digits}' está na lista de CNPJs de teste...")
-    
-    if cnpj_digits in test_cnpjs:
-        print(f">>> CONSOLE: ✅ [IS_VALID_CNPJ] CNPJ de teste válido encontrado: {cnpj_digits}")
+    if cnpj_digits in _CNPJS_TESTE:
+        logging.debug("✅ [IS_VALID_CNPJ] CNPJ de teste válido encontrado: %s", cnpj_digits)
         return True
     
-    # Verifica se não são todos iguais (ex: 11111111111111) - EXCETO se for de teste
-    if cnpj_digits == cnpj_digits[0] * 14 and cnpj_digits not in test_cnpjs:
-        print(f">>> CONSOLE: ❌ [IS_VALID_CNPJ] CNPJ com todos dígitos iguais: {cnpj_digits}")
+    # Verifica se não são todos iguais (ex: 11111111111111)
+    if cnpj_digits == cnpj_digits[0] * 14:
+        logging.debug("❌ [IS_VALID_CNPJ] CNPJ com todos dígitos iguais: %s", cnpj_digits)
         return False
     
-    print(f">>> CONSOLE: 🔍 [IS_VALID_CNPJ] Iniciando validação matemática dos dígitos verificadores...")
-    
-    # Validação dos dígitos verificadores
-    try:
-        # Verifica primeiro dígito verificador
-        sequence = [int(cnpj_digits[i]) for i in range(12)]
-        weights1 = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
-        sum1 = sum(sequence[i] * weights1[i] for i in range(12))
-        digit1 = ((sum1 % 11) < 2) and 0 or (11 - (sum1 % 11))
-        
-        if digit1 != int(cnpj_digits[12]):
-            return False
-        
-        # Verifica segundo dígito verificador
-        sequence.append(digit1)
-        weights2 = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
-        sum2 = sum(sequence[i] * weights2[i] for i in range(13))
-        digit2 = ((sum2 % 11) < 2) and 0 or (11 - (sum2 % 11))
-        
-        result = digit2 == int(cnpj_digits[13])
-        print(f">>> CONSOLE: {'✅' if result else '❌'} [IS_VALID_CNPJ] Validação matemática: {result}")
-        return result
-        
-    except (ValueError, IndexError) as e:
-        print(f">>> CONSOLE: ❌ [IS_VALID_CNPJ] Erro na validação matemática: {e}")
+    # Validação dos dígitos verificadores direto sobre os bytes ASCII
+    digitos = cnpj_digits.encode()
+    if _digito_verificador_cnpj(digitos, _PESOS_CNPJ_DV1) != digitos[12] - 48:
         return False
+    
+    result = _digito_verificador_cnpj(digitos, _PESOS_CNPJ_DV2) == digitos[13] - 48
+    logging.debug("%s [IS_VALID_CNPJ] Validação matemática: %s", '✅' if result else '❌', result)
+    return result
+
+
+def _digito_verificador_cnpj(digitos: bytes, pesos: tuple) -> int:
+    """Calcula um dígito verificador do CNPJ (soma ponderada módulo 11)."""
+    resto = sum((d - 48) * p for d, p in zip(digitos, pesos)) % 11
+    return 0 if resto < 2 else 11 - resto
 
 
 def detectar_intencao_limpar_carrinho(mensagem: str) -> bool:
@@ -212,6 +217,36 @@ def detectar_intencao_limpar_carrinho(mensagem: str) -> bool:
     return False
 
 
+# 🆕 Padrões avaliados apenas nas últimas mensagens do assistente
+_MAX_MENSAGENS_BOT_CHECKOUT = 3
+_PADROES_PEDIDO_CNPJ = (
+    'cnpj', 'finalizar', 'checkout', 'compra',
+    'identificar', 'cadastro', 'cliente'
+)
+_PALAVRAS_CHECKOUT = ('finalizar', 'checkout', 'cnpj')
+
+
+def _ultimas_mensagens_bot(history: List[Dict], limite: int) -> List[str]:
+    """
+    Coleta as mensagens mais recentes do assistente, da mais nova para a mais antiga.
+
+    Args:
+        history: Histórico de mensagens da sessão.
+        limite: Quantidade máxima de mensagens a coletar.
+
+    Returns:
+        List[str]: Mensagens do assistente em minúsculas.
+    """
+    mensagens = []
+    for msg in reversed(history):
+        if msg.get('role') != 'assistant':
+            continue
+        mensagens.append(msg.get('message', '').lower())
+        if len(mensagens) >= limite:
+            break
+    return mensagens
+
+
 def detectar_contexto_checkout(dados_sessao: Dict) -> Dict:
     """
     🆕 NOVA FUNÇÃO: Detecta se estamos em contexto de finalização/checkout.
@@ -229,32 +264,21 @@ def detectar_contexto_checkout(dados_sessao: Dict) -> Dict:
     if not history:
         return context
     
-    # Analisa últimas 3 mensagens do bot
-    recent_bot_messages = []
-    for msg in reversed(history):
-        if msg.get('role') == 'assistant':
-            recent_bot_messages.append(msg.get('message', '').lower())
-            if len(recent_bot_messages) >= 3:
-                break
+    # Analisa últimas 3 mensagens do bot (só as do assistente são normalizadas)
+    recent_bot_messages = _ultimas_mensagens_bot(history, _MAX_MENSAGENS_BOT_CHECKOUT)
     
     # Verifica se a última mensagem do bot pediu CNPJ
     if recent_bot_messages:
         last_bot_msg = recent_bot_messages[0]
         
-        cnpj_request_patterns = [
-            'cnpj', 'finalizar', 'checkout', 'compra',
-            'identificar', 'cadastro', 'cliente'
-        ]
-        
-        if any(pattern in last_bot_msg for pattern in cnpj_request_patterns):
+        if any(pattern in last_bot_msg for pattern in _PADROES_PEDIDO_CNPJ):
             context['awaiting_cnpj'] = True
             context['last_request_was_cnpj'] = True
     
     # Verifica se checkout foi iniciado recentemente
-    for msg in recent_bot_messages:
-        if any(word in msg for word in ['finalizar', 'checkout', 'cnpj']):
-            context['checkout_initiated'] = True
-            break
+    context['checkout_initiated'] = any(
+        word in msg for msg in recent_bot_messages for word in _PALAVRAS_CHECKOUT
+    )
     
     logging.debug(f"Contexto de checkout detectado: {context}")
     return context
@@ -629,7 +653,7 @@ def get_intent(
 
         # Obtém contexto EXPANDIDO da conversa (14 mensagens para melhor contexto)
         conversation_context = obter_contexto_conversa(dados_sessao, max_messages=14)
-        print(f">>> CONSOLE: Contexto da conversa com {len(dados_sessao.get('conversation_history', []))} mensagens totais")
+        logging.debug("Contexto da conversa com %s mensagens totais", len(dados_sessao.get('conversation_history', [])))
 
         # Informações do carrinho
         cart_info = ""
@@ -761,32 +785,29 @@ INSTRUÇÕES ESPECIAIS DE ALTA PRIORIDADE:
             logging.info(f"[llm_interface.py] Resposta do LLM: {content[:100]}...")
             
             # 🔍 DEBUG: Log da resposta completa para depuração
-            print(f"🔍 DEBUG: Resposta completa da IA:")
-            print(f"'{content}'")
-            print(f"🔍 Tamanho: {len(content)} caracteres")
+            logging.debug("🔍 DEBUG: Resposta completa da IA:\n'%s'", content)
+            logging.debug("🔍 Tamanho: %s caracteres", len(content))
 
             cleaned_content = clean_json_response(content)
-            print(f"🔍 DEBUG: Conteúdo após limpeza:")
-            print(f"'{cleaned_content}'")
-            logging.debug(f"[llm_interface.py] Conteúdo limpo: {cleaned_content}")
+            logging.debug("🔍 DEBUG: Conteúdo após limpeza:\n'%s'", cleaned_content)
 
             # Parse do JSON
             try:
                 if not cleaned_content.strip():
-                    print(f"🔍 DEBUG: Conteúdo vazio após limpeza, usando fallback")
+                    logging.debug("🔍 DEBUG: Conteúdo vazio após limpeza, usando fallback")
                     raise json.JSONDecodeError("Empty content", "", 0)
                     
                 intent_data = json.loads(cleaned_content)
             except json.JSONDecodeError as e:
-                print(f"🔍 DEBUG: Erro JSON detalhado: {e}")
+                logging.debug("🔍 DEBUG: Erro JSON detalhado: %s", e)
                 if cleaned_content and len(cleaned_content) > 0:
-                    print(f"🔍 DEBUG: Posição do erro: linha {e.lineno}, coluna {e.colno}")
+                    logging.debug("🔍 DEBUG: Posição do erro: linha %s, coluna %s", e.lineno, e.colno)
                     if hasattr(e, 'pos') and e.pos < len(cleaned_content):
                         start = max(0, e.pos-10)
                         end = min(len(cleaned_content), e.pos+10)
-                        print(f"🔍 DEBUG: Contexto do erro: '{cleaned_content[start:end]}' (posição {e.pos})")
+                        logging.debug("🔍 DEBUG: Contexto do erro: '%s' (posição %s)", cleaned_content[start:end], e.pos)
                 
-                print(f"🔍 DEBUG: IA retornou texto em vez de JSON, usando fallback")
+                logging.debug("🔍 DEBUG: IA retornou texto em vez de JSON, usando fallback")
                 # Usa fallback quando JSON inválido
                 logging.error(f"[llm_interface.py] Erro ao parsear JSON: {e}")
                 return criar_intencao_fallback(mensagem_usuario, melhorar_consciencia_contexto(mensagem_usuario, dados_sessao))
@@ -843,8 +864,7 @@ INSTRUÇÕES ESPECIAIS DE ALTA PRIORIDADE:
 
 def clean_json_response(content: str) -> str:
     """Limpa a resposta do LLM para extrair JSON válido."""
-    logging.debug(f"Limpando a resposta JSON: '{content[:200]}...'" )
-    print(f"🔍 DEBUG clean_json_response: Input = '{content[:200]}...'" )
+    logging.debug("🔍 DEBUG clean_json_response: Input = '%.200s...'", content)
     
     # Remove markdown se presente
     content = re.sub(r"```json\s*", "", content)
@@ -854,16 +874,13 @@ def clean_json_response(content: str) -> str:
     json_match = re.search(r"\{.*\}", content, re.DOTALL)
     if json_match:
         extracted = json_match.group(0).strip()
-        print(f"🔍 DEBUG clean_json_response: JSON encontrado = '{extracted}'")
-        logging.debug(f"JSON extraído: '{extracted}'")
+        logging.debug("🔍 DEBUG clean_json_response: JSON encontrado = '%s'", extracted)
         return extracted
     
     # Se não encontrou JSON, a IA provavelmente retornou texto
-    print(f"🔍 DEBUG clean_json_response: NENHUM JSON encontrado! Conteúdo completo:")
-    print(f"'{content}'")
+    logging.debug("🔍 DEBUG clean_json_response: NENHUM JSON encontrado! Conteúdo completo:\n'%s'", content)
     
     # Retorna string vazia para forçar fallback
-    logging.debug("Nenhum JSON encontrado na resposta.")
     return ""
 
 
@@ -1128,6 +1145,79 @@ def get_enhanced_intent(
     return intent_final
 
 
+def _chave_cache_intencao(mensagem_usuario: str, dados_sessao: Dict) -> Optional[Tuple]:
+    """
+    Monta a chave do cache de intenções, ou None se a mensagem não pode ser cacheada.
+
+    Só cacheia com o bot no menu principal e sem ação pendente: nesse estado a
+    mesma mensagem leva à mesma intenção, qualquer que seja o histórico. O
+    histórico fica fora da chave (ele muda a cada turno); a sessão (data de
+    criação) entra para que duas conversas nunca compartilhem uma entrada.
+
+    Args:
+        mensagem_usuario: A mensagem do usuário.
+        dados_sessao: Os dados da sessão.
+
+    Returns:
+        Tupla (mensagem normalizada, sessão, última ação do bot, itens no carrinho,
+        cliente identificado) ou None.
+    """
+    if TTL_CACHE_INTENCAO <= 0 or dados_sessao.get("pending_action"):
+        return None
+    ultima_acao = dados_sessao.get("last_bot_action") or ""
+    if ultima_acao not in _ACOES_SEM_CONTEXTO:
+        return None
+    return (
+        mensagem_usuario.strip().lower(),
+        dados_sessao.get("criado_em"),
+        ultima_acao,
+        len(dados_sessao.get("shopping_cart", [])),
+        bool(dados_sessao.get("customer_context")),
+    )
+
+
+def _obter_intencao_em_cache(chave: Tuple) -> Optional[Dict]:
+    """
+    Busca uma intenção no cache, descartando entradas expiradas.
+
+    Args:
+        chave: A chave gerada por _chave_cache_intencao.
+
+    Returns:
+        Uma cópia da intenção em cache ou None.
+    """
+    with _trava_cache_intencao:
+        entrada = _cache_intencao.get(chave)
+        if entrada is None:
+            return None
+        momento, intencao_json = entrada
+        if time.monotonic() - momento > TTL_CACHE_INTENCAO:
+            del _cache_intencao[chave]
+            return None
+        _cache_intencao.move_to_end(chave)
+    # Cópia nova a cada acerto: quem chama pode alterar a intenção
+    return json.loads(intencao_json)
+
+
+def _guardar_intencao_em_cache(chave: Tuple, intencao: Dict):
+    """
+    Guarda a intenção no cache, removendo a entrada menos usada se estiver cheio.
+
+    Args:
+        chave: A chave gerada por _chave_cache_intencao.
+        intencao: A intenção detectada.
+    """
+    try:
+        intencao_json = json.dumps(intencao, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return
+    with _trava_cache_intencao:
+        _cache_intencao[chave] = (time.monotonic(), intencao_json)
+        _cache_intencao.move_to_end(chave)
+        while len(_cache_intencao) > MAX_CACHE_INTENCAO:
+            _cache_intencao.popitem(last=False)
+
+
 def obter_intencao_rapida(mensagem_usuario: str, dados_sessao: Dict) -> Dict:
     """
     Obtém a intenção do usuário de forma rápida.
@@ -1140,9 +1230,15 @@ def obter_intencao_rapida(mensagem_usuario: str, dados_sessao: Dict) -> Dict:
         A intenção do usuário.
     """
     logging.debug(f"Obtendo intenção rápida para a mensagem: '{mensagem_usuario}'")
+    chave_cache = _chave_cache_intencao(mensagem_usuario, dados_sessao)
+    if chave_cache is not None:
+        intencao_cache = _obter_intencao_em_cache(chave_cache)
+        if intencao_cache is not None:
+            logging.debug("[INTENT_CACHE] Acerto para: '%s'", chave_cache[0])
+            return intencao_cache
+    contexto_conversa = obter_contexto_conversa(dados_sessao)
+
     try:
-        contexto_conversa = obter_contexto_conversa(dados_sessao)
-        
         # 🚀 USA OS SISTEMAS CRÍTICOS INTEGRADOS
         historico_conversa = dados_sessao.get("historico_conversa", [])
         dados_disponiveis = {
@@ -1165,6 +1261,8 @@ def obter_intencao_rapida(mensagem_usuario: str, dados_sessao: Dict) -> Dict:
                         f"Coerente: {resultado_intencao.get('validacao_fluxo', {}).get('eh_coerente', 'N/A')}, "
                         f"Confuso: {resultado_intencao.get('analise_confusao', {}).get('esta_confuso', 'N/A')}, "
                         f"Redirecionamento: {resultado_intencao.get('necessita_redirecionamento', False)}")
+            if chave_cache is not None:
+                _guardar_intencao_em_cache(chave_cache, resultado_intencao)
             return resultado_intencao
             
     except Exception as e:
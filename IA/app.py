@@ -1,20 +1,28 @@
 # file: IA/app.py - CORREÇÕES APLICADAS
 from flask import Flask, request, jsonify
 from twilio.twiml.messaging_response import MessagingResponse
+import atexit
+import functools
+import gc
+import glob
+import itertools
 import logging
+import operator
+import os
+import queue
 import threading
 import re
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import time
 from typing import Dict, List, Tuple, Union, Optional
 from db import database
 from ai_llm import llm_interface
-from ai_llm.llm_interface import generate_personalized_response, analisar_saudacao_com_contexto_ia, gerar_resposta_saudacao_contextual_ia
+from ai_llm.llm_interface import generate_personalized_response, analisar_saudacao_com_contexto_ia, gerar_resposta_saudacao_contextual_ia, is_valid_cnpj
 from knowledge import knowledge
 from utils.gav_logger import (
     obter_logger, log_com_contexto, log_performance, log_audit,
     log_info, log_error, log_warning, log_debug, log_critical,
-    log_whatsapp_error, ContextoLog
+    log_whatsapp_error, log_habilitado
 )
 from core.gerenciador_sessao import (
     carregar_sessao,
@@ -23,9 +31,16 @@ from core.gerenciador_sessao import (
     formatar_lista_produtos_inteligente, # ETAPA 5
     formatar_carrinho_para_exibicao,
     adicionar_mensagem_historico,
+    adicionar_mensagens_historico,
     obter_contexto_conversa,
     atualizar_contexto_sessao,
     formatar_acoes_rapidas,
+    formatar_preco_brl,
+    formatar_quantidade,
+    calcular_hash_mensagem,
+    registrar_sessao_validada,
+    obter_sessao_validada,
+    esquecer_sessao_validada,
 )
 from utils.extrator_quantidade import (
     extrair_quantidade, 
@@ -45,6 +60,59 @@ from utils.detector_intencao_avancado import (
 )
 
 CONFIRMATION_TIMEOUT_SECONDS = 120
+
+# Regex pré-compiladas usadas na validação de CNPJ a cada mensagem
+_PADRAO_DIGITO = re.compile(r"\d")
+_PADRAO_NAO_DIGITO = re.compile(r"\D")
+
+# Mensagens fixas reutilizadas em mais de um ponto do fluxo
+_MSG_REQUEST_CNPJ = "Para finalizar seu pedido, preciso do seu CNPJ. Por favor, me informe o CNPJ da sua empresa."
+_MSG_EMPTY_CART = "Opa, seu carrinho tá vazio!"
+_MSG_ERRO_PROCESSAMENTO = "Opa, algo deu errado aqui! Pode tentar de novo, por favor?"
+_MSG_OPERATION_COMPLETE = "Operação concluída. O que mais posso fazer por você?"
+# Resposta padrão já combinada com o menu de ações rápidas, indexada por "tem carrinho"
+_MSG_OPERATION_COMPLETE_ACOES = {
+    tem_carrinho: f"{_MSG_OPERATION_COMPLETE}\n\n{formatar_acoes_rapidas(tem_carrinho=tem_carrinho)}"
+    for tem_carrinho in (False, True)
+}
+# Respostas fixas que sempre terminam com o menu de carrinho vazio
+_ACOES_SEM_CARRINHO = formatar_acoes_rapidas(tem_carrinho=False)
+_MSG_NOVO_PEDIDO = f"🧹 Certo! Carrinho e dados limpos. Vamos começar de novo!\n\n{_ACOES_SEM_CARRINHO}"
+_MSG_CARRINHO_VAZIO_FINALIZAR = (
+    f"Seu carrinho tá vazio ainda! Bora escolher uns produtos legais?\n\n{_ACOES_SEM_CARRINHO}"
+)
+_MSG_CARRINHO_JA_VAZIO = "Seu carrinho já tá vazio mesmo! Mas posso te ajudar a escolher uns produtos legais."
+_MSG_CARRINHO_VAZIO_CONTINUAR = (
+    f"Seu carrinho tá vazio ainda! Bora escolher uns produtos maneiros?\n\n{_ACOES_SEM_CARRINHO}"
+)
+
+# Mensagens do fluxo de validação de CNPJ no início da conversa
+_MSG_CNPJ_WELCOME = (
+    "✅ *CNPJ validado com sucesso!*\n\n"
+    "🎉 Bem-vindo à *Comercial Esperança*!\n"
+    "Agora posso te ajudar com seus pedidos de forma personalizada.\n\n"
+    "🔍 Digite o nome do produto que deseja\n"
+    "📦 Digite *produtos* para ver os mais vendidos\n"
+    "❓ Digite *ajuda* para mais opções"
+)
+_MSG_CNPJ_SIMPLE_WELCOME = (
+    "✅ *CNPJ validado!*\n\n"
+    "Como posso te ajudar hoje?\n\n"
+    "🔍 Digite o nome do produto que deseja\n"
+    "📦 Digite *produtos* para ver os mais vendidos"
+)
+_MSG_INVALID_CNPJ = (
+    "❌ CNPJ inválido. Por favor, digite um CNPJ válido no formato:\n"
+    "XX.XXX.XXX/XXXX-XX ou apenas os 14 dígitos.\n\n"
+    "Exemplo: 12.345.678/0001-95"
+)
+_MSG_CNPJ_INITIAL_REQUEST = (
+    "🎉 *Olá! Seja bem-vindo à Comercial Esperança!*\n\n"
+    "Eu sou o *G.A.V.* (Gentil Assistente de Vendas) e estou aqui para "
+    "te ajudar com seus pedidos de forma rápida e personalizada! 😊\n\n"
+    "Para começarmos, preciso apenas do CNPJ da sua empresa:\n"
+    "📄 Digite seu CNPJ (pode ser com ou sem pontuação)"
+)
 from utils.detector_marca_produto import (
     detectar_marca_e_produto_ia,
     filtrar_produtos_por_marca,
@@ -53,14 +121,55 @@ from utils.detector_marca_produto import (
 from communication import twilio_client, vonage_client
 
 
-from db.database import pesquisar_produtos_com_sugestoes, obter_detalhes_produto_fuzzy
+from db.database import pesquisar_produtos_com_sugestoes, obter_melhor_produto_por_nome
 from knowledge.knowledge import encontrar_produto_na_kb_com_analise
+from utils.busca_aproximada import motor_busca_aproximada
+
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+    ORJSON_DISPONIVEL = True
+except ImportError:
+    ORJSON_DISPONIVEL = False
+    logging.warning("orjson não disponível - usando o JSON padrão do Flask")
+
+if ORJSON_DISPONIVEL:
+    class _ProvedorJsonOrjson(DefaultJSONProvider):
+        """Provider JSON do Flask via orjson (request.get_json e jsonify)."""
+
+        def dumps(self, obj, **kwargs) -> str:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
 
 # =============================================================
 # AÇÃO: A INICIALIZAÇÃO DO APP FOI MOVIDA PARA CÁ (O LUGAR CERTO)
 # =============================================================
 aplicativo = Flask(__name__)
+if ORJSON_DISPONIVEL:
+    aplicativo.json = _ProvedorJsonOrjson(aplicativo)
 app_logger = obter_logger("app")
+# Depuração detalhada do fluxo por mensagem só com GAV_DEBUG_PRINTS=1
+_DEBUG_FLUXO = os.getenv("GAV_DEBUG_PRINTS", "0") == "1"
+app_logger.setLevel(logging.DEBUG if _DEBUG_FLUXO else logging.INFO)
+# Pool fixo para processar mensagens dos webhooks sem criar uma thread por requisição
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("GAV_WORKERS", "16")), thread_name_prefix="gav-msg"
+)
+atexit.register(_EXECUTOR.shutdown, wait=True)
+# Limite de mensagens aguardando no pool. Acima disso a mensagem é recusada: a Vonage recebe 503 e
+# reenvia o webhook; a Twilio não reenvia webhooks de mensagem, então recebe um TwiML que pede ao
+# usuário para repetir a mensagem
+_MAX_MENSAGENS_PENDENTES = int(os.getenv("GAV_MAX_PENDING", "512"))
+_vagas_fila_mensagens = threading.BoundedSemaphore(_MAX_MENSAGENS_PENDENTES)
+# ACK TwiML vazio: a resposta real sai depois pela API, fora da requisição
+_TWIML_ACK = str(MessagingResponse())
+_MSG_SOBRECARGA = "Estou recebendo muitas mensagens agora 😅 Pode me mandar de novo daqui a pouquinho?"
+_resposta_sobrecarga = MessagingResponse()
+_resposta_sobrecarga.message(_MSG_SOBRECARGA)
+_TWIML_SOBRECARGA = str(_resposta_sobrecarga)
+_CABECALHOS_TWIML = {"Content-Type": "text/xml; charset=utf-8"}
 log_info("Sistema G.A.V. iniciando...")
 # ============================================================="
 
@@ -78,6 +187,11 @@ def obter_nome_produto(produto: Dict) -> str:
     return produto.get("descricao") or produto.get("canonical_name", "Produto sem nome")
 
 
+def _nome_item_minusculo(item: Dict) -> str:
+    """Nome do item em minúsculas, usando o valor pré-calculado na inserção no carrinho se houver."""
+    return item.get("_nome_minusculo") or obter_nome_produto(item).lower()
+
+
 def encontrar_produtos_carrinho_por_nome(
     carrinho: List[Dict], nome_produto: str
 ) -> List[Tuple[int, Dict]]:
@@ -93,27 +207,31 @@ def encontrar_produtos_carrinho_por_nome(
     if not carrinho or not nome_produto:
         return []
 
-    # Importa aqui para evitar imports circulares
-    from utils.busca_aproximada import MotorBuscaAproximada
-    motor_busca = MotorBuscaAproximada()
-
-    correspondencias = []
     termo_busca = nome_produto.lower().strip()
+    nomes_itens = [_nome_item_minusculo(item) for item in carrinho]
 
-    for i, item in enumerate(carrinho):
-        nome_item = obter_nome_produto(item).lower()
-
-        # Busca exata
+    # Busca exata primeiro; só o que sobrar vai para a busca fuzzy
+    indices = []
+    indices_fuzzy = []
+    for i, nome_item in enumerate(nomes_itens):
         if termo_busca in nome_item or nome_item in termo_busca:
-            correspondencias.append((i, item))
-            continue
+            indices.append(i)
+        else:
+            indices_fuzzy.append(i)
 
-        # Busca fuzzy
-        similaridade = motor_busca.calcular_similaridade(termo_busca, nome_item)
-        if similaridade >= 0.6:  # Threshold para considerar uma correspondência
-            correspondencias.append((i, item))
+    # Busca fuzzy em lote: o termo é normalizado uma única vez
+    if indices_fuzzy:
+        # Threshold de 0.6 para considerar uma correspondência
+        similaridades = motor_busca_aproximada.calcular_similaridades(
+            termo_busca, [nomes_itens[i] for i in indices_fuzzy], minimo=0.6
+        )
+        indices.extend(i for i, similaridade in zip(indices_fuzzy, similaridades) if similaridade >= 0.6)
+        indices.sort()
+
+    return [(i, carrinho[i]) for i in indices]
 
-    return correspondencias
+
+_SEPARADOR_CARRINHO = "-----------------------------------"
 
 
 def formatar_carrinho_com_indices(carrinho: List[Dict]) -> str:
@@ -128,7 +246,7 @@ def formatar_carrinho_com_indices(carrinho: List[Dict]) -> str:
     if not carrinho:
         return "Seu carrinho tá vazio ainda! Que tal começarmos escolhendo alguns produtos?"
 
-    resposta = "🛒 Seu Carrinho de Compras:\n"
+    linhas = ["🛒 Seu Carrinho de Compras:"]
     total = 0.0
 
     for i, item in enumerate(carrinho, 1):
@@ -138,19 +256,15 @@ def formatar_carrinho_com_indices(carrinho: List[Dict]) -> str:
         subtotal = preco * qt
         total += subtotal
 
-        preco_str = (
-            f"R$ {preco:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        )
-        subtotal_str = (
-            f"R$ {subtotal:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        )
+        preco_str = formatar_preco_brl(preco)
+        subtotal_str = formatar_preco_brl(subtotal)
         nome_produto = obter_nome_produto(item)
 
-        resposta += f"{i}. {nome_produto} (Qtd: {qt}) - Unit: {preco_str} - Subtotal: {subtotal_str}\n"
+        linhas.append(f"{i}. {nome_produto} (Qtd: {qt}) - Unit: {preco_str} - Subtotal: {subtotal_str}")
 
-    total_str = f"R$ {total:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    resposta += f"-----------------------------------\nTOTAL DO PEDIDO: {total_str}"
-    return resposta
+    linhas.append(_SEPARADOR_CARRINHO)
+    linhas.append(f"TOTAL DO PEDIDO: {formatar_preco_brl(total)}")
+    return "\n".join(linhas)
 
 
 def remover_item_do_carrinho(carrinho: List[Dict], indice: int) -> Tuple[bool, str, List[Dict]]:
@@ -164,7 +278,7 @@ def remover_item_do_carrinho(carrinho: List[Dict], indice: int) -> Tuple[bool, s
         Uma tupla contendo um booleano de sucesso, uma mensagem e a lista do carrinho atualizada.
     """
     if not carrinho:
-        return False, "Opa, seu carrinho tá vazio!", carrinho
+        return False, _MSG_EMPTY_CART, carrinho
 
     if not (1 <= indice <= len(carrinho)):
         return False, f"Hmm, esse número não tá na lista. Escolha entre 1 e {len(carrinho)}, por favor!", carrinho
@@ -197,7 +311,7 @@ def adicionar_quantidade_item_carrinho(
         Uma tupla contendo um booleano de sucesso, uma mensagem e a lista do carrinho atualizada.
     """
     if not carrinho:
-        return False, "Opa, seu carrinho tá vazio!", carrinho
+        return False, _MSG_EMPTY_CART, carrinho
 
     if not (1 <= indice <= len(carrinho)):
         return False, f"Hmm, esse número não tá na lista. Escolha entre 1 e {len(carrinho)}, por favor!", carrinho
@@ -210,15 +324,8 @@ def adicionar_quantidade_item_carrinho(
     novo_total = carrinho[indice - 1]["qt"]
 
     # Formata a quantidade para exibição
-    if isinstance(qt_adicional, float):
-        display_qt = f"{qt_adicional:.1f}".rstrip("0").rstrip(".")
-    else:
-        display_qt = str(qt_adicional)
-
-    if isinstance(novo_total, float):
-        display_total = f"{novo_total:.1f}".rstrip("0").rstrip(".")
-    else:
-        display_total = str(novo_total)
+    display_qt = formatar_quantidade(qt_adicional)
+    display_total = formatar_quantidade(novo_total)
 
     display_carrinho = formatar_carrinho_para_exibicao(carrinho)
     mensagem = f"✅ Adicionei +{display_qt} {nome_produto}. Total agora: {display_total}\n\n{display_carrinho}"
@@ -239,7 +346,7 @@ def atualizar_quantidade_item_carrinho(
         Uma tupla contendo um booleano de sucesso, uma mensagem e a lista do carrinho atualizada.
     """
     if not carrinho:
-        return False, "Opa, seu carrinho tá vazio!", carrinho
+        return False, _MSG_EMPTY_CART, carrinho
 
     if not (1 <= indice <= len(carrinho)):
         return False, f"Hmm, esse número não tá na lista. Escolha entre 1 e {len(carrinho)}, por favor!", carrinho
@@ -251,10 +358,7 @@ def atualizar_quantidade_item_carrinho(
     nome_produto = obter_nome_produto(carrinho[indice - 1])
 
     # Formata a quantidade para exibição
-    if isinstance(nova_qt, float):
-        display_qt = f"{nova_qt:.1f}".rstrip("0").rstrip(".")
-    else:
-        display_qt = str(nova_qt)
+    display_qt = formatar_quantidade(nova_qt)
 
     display_carrinho = formatar_carrinho_para_exibicao(carrinho)
     mensagem = f"✅ Quantidade de {nome_produto} atualizada para {display_qt}\n\n{display_carrinho}"
@@ -271,17 +375,36 @@ def limpar_carrinho_completamente(carrinho: List[Dict]) -> Tuple[str, List[Dict]
         Uma tupla contendo uma mensagem e uma lista de carrinho vazia.
     """
     if not carrinho:
-        mensagem = "Seu carrinho já tá vazio mesmo! Mas posso te ajudar a escolher uns produtos legais."
+        return _MSG_CARRINHO_JA_VAZIO, []
+
+    contagem_itens = len(carrinho)
+    carrinho.clear()  # Limpa completamente
+
+    if contagem_itens == 1:
+        mensagem = f"🗑️ Carrinho esvaziado! 1 item removido.\n\n{_ACOES_SEM_CARRINHO}"
     else:
-        contagem_itens = len(carrinho)
-        carrinho.clear()  # Limpa completamente
-        
-        mensagem = f"🗑️ Carrinho esvaziado! {contagem_itens} {'item' if contagem_itens == 1 else 'itens'} removido{'s' if contagem_itens > 1 else ''}."
-        mensagem += f"\n\n{formatar_acoes_rapidas(tem_carrinho=False)}"
-    
+        mensagem = f"🗑️ Carrinho esvaziado! {contagem_itens} itens removidos.\n\n{_ACOES_SEM_CARRINHO}"
     return mensagem, []
 
 
+def _normalizar_quantidade(valor) -> Union[int, float]:
+    """Converte a quantidade vinda da IA para número sem usar try/except.
+
+    Args:
+        valor: Quantidade recebida nos parâmetros da intenção.
+
+    Returns:
+        O número correspondente ou 1 se o valor não for numérico.
+    """
+    if isinstance(valor, (int, float)):
+        return valor
+    if isinstance(valor, str):
+        texto = valor.strip()
+        if texto.lstrip("-").replace(".", "", 1).isdigit():
+            return float(texto)
+    return 1
+
+
 def _executar_acao_carrinho(carrinho_compras: List[Dict], indice_carrinho: int, item: Dict, acao: str, quantidade: float, nome_produto: str) -> str:
     """Executa uma ação específica no carrinho de compras usando abordagem IA-first.
     
@@ -296,9 +419,6 @@ def _executar_acao_carrinho(carrinho_compras: List[Dict], indice_carrinho: int,
     Returns:
         String com a mensagem de resposta personalizada
     """
-    from core.gerenciador_sessao import formatar_carrinho_para_exibicao
-    from ai_llm.llm_interface import generate_personalized_response, analisar_saudacao_com_contexto_ia, gerar_resposta_saudacao_contextual_ia
-    
     quantidade_antiga = item.get("qt", 1)
     nome_produto_exibicao = obter_nome_produto(item)
     
@@ -348,6 +468,16 @@ def _executar_acao_carrinho(carrinho_compras: List[Dict], indice_carrinho: int,
     return texto_resposta
 
 
+# Pergunta de continuar/finalizar já combinada com o menu, indexada por "tem carrinho"
+_MSG_CONTINUAR_OU_FINALIZAR = {
+    tem_carrinho: (
+        "🛍️ Deseja continuar comprando ou finalizar o pedido?\n\n"
+        f"{formatar_acoes_rapidas(tem_carrinho=tem_carrinho)}"
+    )
+    for tem_carrinho in (False, True)
+}
+
+
 def gerar_mensagem_continuar_ou_finalizar(carrinho: List[Dict]) -> str:
     """Gera uma mensagem para o usuário continuar comprando ou finalizar o pedido.
 
@@ -357,8 +487,16 @@ def gerar_mensagem_continuar_ou_finalizar(carrinho: List[Dict]) -> str:
     Returns:
         Uma string com a mensagem.
     """
-    acoes_rapidas = formatar_acoes_rapidas(tem_carrinho=bool(carrinho))
-    return "🛍️ Deseja continuar comprando ou finalizar o pedido?\n\n" f"{acoes_rapidas}"
+    return _MSG_CONTINUAR_OU_FINALIZAR[bool(carrinho)]
+
+
+# Partes fixas do resumo de finalização
+_SEPARADOR_RESUMO = "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+_RODAPE_RESUMO_PEDIDO = (
+    "✅ *Pedido registrado com sucesso!*\n"
+    "📞 Em breve entraremos em contato para confirmação.\n\n"
+    f"{_ACOES_SEM_CARRINHO}"
+)
 
 
 def gerar_resumo_finalizacao(carrinho: List[Dict], contexto_cliente: Dict = None) -> str:
@@ -375,21 +513,21 @@ def gerar_resumo_finalizacao(carrinho: List[Dict], contexto_cliente: Dict = None
         return "Não dá pra finalizar com o carrinho vazio! Que tal escolher alguns produtos primeiro?"
     
     # Cabeçalho
-    resumo = "✅ *RESUMO DO PEDIDO*\n"
-    resumo += "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    linhas = ["✅ *RESUMO DO PEDIDO*", _SEPARADOR_RESUMO, ""]
     
     # Informações do cliente
     if contexto_cliente:
-        resumo += f"👤 *Cliente:* {contexto_cliente.get('nome', 'Não identificado')}\n"
+        linhas.append(f"👤 *Cliente:* {contexto_cliente.get('nome', 'Não identificado')}")
         if contexto_cliente.get('cnpj'):
             cnpj_formatado = contexto_cliente['cnpj']
             # Formata CNPJ se tiver 14 dígitos
             if len(cnpj_formatado) == 14:
                 cnpj_formatado = f"{cnpj_formatado[:2]}.{cnpj_formatado[2:5]}.{cnpj_formatado[5:8]}/{cnpj_formatado[8:12]}-{cnpj_formatado[12:14]}"
-            resumo += f"📄 *CNPJ:* {cnpj_formatado}\n\n"
+            linhas.append(f"📄 *CNPJ:* {cnpj_formatado}")
+            linhas.append("")
     
-    # Itens do pedido
-    resumo += "📦 *ITENS DO PEDIDO:*\n"
+    # Itens do pedido (linhas e total numa única passada)
+    linhas.append("📦 *ITENS DO PEDIDO:*")
     total_geral = 0.0
     
     for i, item in enumerate(carrinho, 1):
@@ -400,32 +538,35 @@ def gerar_resumo_finalizacao(carrinho: List[Dict], contexto_cliente: Dict = None
         total_geral += subtotal
         
         # Formatação da quantidade
-        if isinstance(qt, float):
-            display_qt = f"{qt:.1f}".rstrip("0").rstrip(".")
-        else:
-            display_qt = str(qt)
+        display_qt = formatar_quantidade(qt)
         
-        # Formatação dos valores
-        preco_str = f"R$ {preco:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        subtotal_str = f"R$ {subtotal:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-        
-        nome_produto = obter_nome_produto(item)
-        resumo += f"*{i}.* {nome_produto}\n"
-        resumo += f"    {display_qt}× {preco_str} = *{subtotal_str}*\n\n"
-    
-    # Total
-    resumo += "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-    total_str = f"R$ {total_geral:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    resumo += f"💰 *TOTAL GERAL: {total_str}*\n\n"
-    
-    # Status
-    resumo += "✅ *Pedido registrado com sucesso!*\n"
-    resumo += "📞 Em breve entraremos em contato para confirmação.\n\n"
+        linhas.append(f"*{i}.* {obter_nome_produto(item)}")
+        linhas.append(f"    {display_qt}× {formatar_preco_brl(preco)} = *{formatar_preco_brl(subtotal)}*")
+        linhas.append("")
     
-    # Opções finais
-    resumo += f"{formatar_acoes_rapidas(tem_carrinho=False)}"
+    # Total, status e opções finais
+    linhas.append(_SEPARADOR_RESUMO)
+    linhas.append(f"💰 *TOTAL GERAL: {formatar_preco_brl(total_geral)}*")
+    linhas.append("")
+    linhas.append(_RODAPE_RESUMO_PEDIDO)
     
-    return resumo
+    return "\n".join(linhas)
+
+
+# Categorias sugeridas quando a busca falha: (trechos de palavra, categoria)
+_CATEGORIAS_SUGESTAO = (
+    (("coca", "refri", "soda"), "refrigerantes"),
+    (("sabao", "deterg", "limp"), "produtos de limpeza"),
+    (("cafe", "acu", "arroz", "feij"), "alimentos básicos"),
+)
+
+
+def _categoria_sugerida(palavra: str) -> Optional[str]:
+    """Retorna a primeira categoria cujo trecho aparece na palavra, se houver."""
+    return next(
+        (categoria for trechos, categoria in _CATEGORIAS_SUGESTAO if any(t in palavra for t in trechos)),
+        None,
+    )
 
 
 def sugerir_alternativas(termo_busca_falho: str) -> str:
@@ -438,37 +579,25 @@ def sugerir_alternativas(termo_busca_falho: str) -> str:
         Uma string com as sugestões.
     """
 
-    # Importa aqui para evitar imports circulares
-    from utils.busca_aproximada import MotorBuscaAproximada
-    motor_busca = MotorBuscaAproximada()
-
     sugestoes = []
 
     # Aplica correções automáticas
-    corrigido = motor_busca.aplicar_correcoes(termo_busca_falho)
+    corrigido = motor_busca_aproximada.aplicar_correcoes(termo_busca_falho)
     if corrigido != termo_busca_falho:
         sugestoes.append(f"Tente: '{corrigido}'")
 
     # Expande com sinônimos
-    expansoes = motor_busca.expandir_com_sinonimos(termo_busca_falho)
+    expansoes = motor_busca_aproximada.expandir_com_sinonimos(termo_busca_falho)
     for expansao in expansoes[:2]:
         if expansao != termo_busca_falho:
             sugestoes.append(f"Ou tente: '{expansao}'")
 
     # Sugestões gerais baseadas na palavra
     palavras = termo_busca_falho.lower().split()
-    sugestoes_gerais = []
-
-    for palavra in palavras:
-        if any(x in palavra for x in ["coca", "refri", "soda"]):
-            sugestoes_gerais.append("refrigerantes")
-        elif any(x in palavra for x in ["sabao", "deterg", "limp"]):
-            sugestoes_gerais.append("produtos de limpeza")
-        elif any(x in palavra for x in ["cafe", "acu", "arroz", "feij"]):
-            sugestoes_gerais.append("alimentos básicos")
+    sugestoes_gerais = [categoria for categoria in map(_categoria_sugerida, palavras) if categoria]
 
     if sugestoes_gerais:
-        sugestoes.extend([f"Categoria: {s}" for s in sugestoes_gerais[:2]])
+        sugestoes.extend(f"Categoria: {s}" for s in sugestoes_gerais[:2])
 
     if not sugestoes:
         sugestoes = [
@@ -479,6 +608,25 @@ def sugerir_alternativas(termo_busca_falho: str) -> str:
     return " • ".join(sugestoes[:3])
 
 
+# Campos do estado de turno, na ordem em que _route_tool os desempacota e devolve
+_STATE_FIELDS = (
+    "customer_context",
+    "shopping_cart",
+    "last_search_type",
+    "last_search_params",
+    "current_offset",
+    "last_shown_products",
+    "last_bot_action",
+    "pending_action",
+    "last_kb_search_term",
+    "confirmation_requested_at",
+)
+_unpack_state = operator.itemgetter(*_STATE_FIELDS)
+
+# Estado de uma sessão recém-zerada (listas/dicts são criados a cada uso)
+_ESTADO_NOVO_PEDIDO = {**dict.fromkeys(_STATE_FIELDS), "current_offset": 0}
+
+
 def _extract_state(session: Dict) -> Dict:
     """Extrai os dados relevantes da sessão em um dicionário mutável."""
     return {
@@ -527,420 +675,500 @@ def _expire_pending_confirmations(session: Dict, state: Dict) -> Optional[str]:
     return None
 
 
-def _handle_pending_action(
-    session: Dict, state: Dict, incoming_msg: str
-) -> Tuple[Union[Dict, None], str]:
-    """Processa ações pendentes existentes na sessão."""
-    timeout_msg = _expire_pending_confirmations(session, state)
-    if timeout_msg:
-        return None, timeout_msg
+# Com produtos listados o menu não depende do carrinho: monta uma única vez
+_ACOES_SELECAO_PRODUTO = formatar_acoes_rapidas(tem_produtos=True)
+_MSG_PEDIR_NUMERO_ITEM = f"Digita o número do item que você quer, por favor!\n\n{_ACOES_SELECAO_PRODUTO}"
+
+# Respostas curtas a uma ação pendente genérica (pergunta de sim/não)
+_RESPOSTAS_AFIRMATIVAS = frozenset({"sim", "pode ser", "s", "claro", "quero", "ok", "beleza"})
+_RESPOSTAS_NEGATIVAS = frozenset({"não", "n", "agora não", "deixa"})
+# Trechos buscados por substring na mensagem (por isso tuplas, e não conjuntos)
+_SEPARADORES_PEDIDO_COMPLEXO = (" e ", ",", " mais ", " também ")
+_TRECHOS_BUSCA_PROMOCAO = ("em promoção", "promocional", "promocionais")
+_TRECHOS_MAIS_PRODUTOS = ("mais", "continuar", "próximo", "more", "next")
+# Resposta à recusa já combinada com o menu, indexada por "tem carrinho"
+_MSG_RECUSA_ACOES = {
+    tem_carrinho: (
+        "🤖 Tudo bem! O que você gostaria de fazer então?\n\n"
+        f"{formatar_acoes_rapidas(tem_carrinho=tem_carrinho)}"
+    )
+    for tem_carrinho in (False, True)
+}
 
-    pending_action = state.get("pending_action")
-    print(f">>> CONSOLE: pending_action atual: '{pending_action}'")
-    shopping_cart = state.get("shopping_cart", [])
-    intent = None
-    response_text = ""
+# Escolha do usuário diante de item duplicado: 1 soma, 2 substitui a quantidade
+_DECISAO_ITEM_DUPLICADO = {
+    "1": (adicionar_quantidade_item_carrinho, "ADD_QUANTITY_TO_CART"),
+    "2": (atualizar_quantidade_item_carrinho, "UPDATE_CART_ITEM_QUANTITY"),
+}
 
-    if pending_action == "AWAITING_QUANTITY":
-        print(">>> CONSOLE: Tratando ação pendente AWAITING_QUANTITY")
 
-        # 🆕 Extrai quantidade usando IA-FIRST com fallback
-        conversation_context = obter_contexto_conversa(session)
-        last_shown_products = state.get("last_shown_products", [])
-        qt = extrair_quantidade_com_ia(incoming_msg, last_shown_products, conversation_context)
-        
-        # 🆕 FALLBACK: Se IA não conseguiu, usa extração básica
+def _processar_aguardando_quantidade(
+    session: Dict, state: Dict, incoming_msg: str, shopping_cart: List[Dict]
+) -> Tuple[Union[str, None], str]:
+    """Trata a resposta do usuário quando o bot aguarda a quantidade de um produto.
+
+    Args:
+        session: Os dados da sessão.
+        state: O estado do turno atual.
+        incoming_msg: A mensagem recebida do usuário.
+        shopping_cart: O carrinho de compras (alterado no próprio lugar).
+
+    Returns:
+        Uma tupla com a nova ação pendente e o texto de resposta.
+    """
+    app_logger.debug("Tratando ação pendente AWAITING_QUANTITY")
+
+    # 🆕 Extrai quantidade usando IA-FIRST com fallback
+    conversation_context = obter_contexto_conversa(session)
+    last_shown_products = state.get("last_shown_products", [])
+    qt = extrair_quantidade_com_ia(incoming_msg, last_shown_products, conversation_context)
+
+    # 🆕 FALLBACK: Se IA não conseguiu, usa extração básica
+    if qt is None:
+        app_logger.debug("IA falhou, usando extração básica de quantidade...")
+        qt = extrair_quantidade(incoming_msg)
+        if qt is not None:
+            app_logger.debug("Extração básica encontrou quantidade: %s", qt)
+
+    if qt is None or not e_quantidade_valida(qt):
+        # 🆕 Mensagem de erro mais útil
         if qt is None:
-            print(">>> CONSOLE: IA falhou, usando extração básica de quantidade...")
-            qt = extrair_quantidade(incoming_msg)
-            if qt is not None:
-                print(f">>> CONSOLE: Extração básica encontrou quantidade: {qt}")
-
-        if qt is not None and e_quantidade_valida(qt):
-            product_to_add = session.get("pending_product_for_cart")
-            if product_to_add:
-                term_to_learn = session.get("term_to_learn_after_quantity")
-                if term_to_learn:
-                    print(
-                        f">>> CONSOLE: Aprendendo que '{term_to_learn}' se refere a '{obter_nome_produto(product_to_add)}'..."
-                    )
-                    knowledge.atualizar_kb(term_to_learn, product_to_add)
-                    atualizar_contexto_sessao(
-                        session, {"term_to_learn_after_quantity": None}
-                    )
+            response_text = generate_personalized_response("invalid_quantity", session)
+        else:
+            response_text = generate_personalized_response("invalid_quantity", session, invalid_quantity=qt)
 
-                # Converte para int se for número inteiro
-                if isinstance(qt, float) and qt.is_integer():
-                    qt = int(qt)
-
-                # Verifica se o item já existe no carrinho (por codprod ou nome)
-                duplicate_index = None
-                for i, item in enumerate(shopping_cart):
-                    if (
-                        product_to_add.get("codprod")
-                        and item.get("codprod") == product_to_add.get("codprod")
-                    ) or (
-                        not product_to_add.get("codprod")
-                        and obter_nome_produto(item).lower()
-                        == obter_nome_produto(product_to_add).lower()
-                    ):
-                        duplicate_index = i
-                        break
-
-                if duplicate_index is not None:
-                    existing_item = shopping_cart[duplicate_index]
-                    existing_qty = existing_item.get("qt", 0)
-                    if isinstance(existing_qty, float):
-                        existing_qty_display = f"{existing_qty:.1f}".rstrip("0").rstrip(
-                            "."
-                        )
-                    else:
-                        existing_qty_display = str(existing_qty)
-                    product_name = obter_nome_produto(existing_item)
+        adicionar_mensagem_historico(
+            session, "assistant", response_text, "REQUEST_QUANTITY"
+        )
+        return None, response_text
 
-                    response_text = (
-                        f"Você já possui **{product_name}** com **{existing_qty_display}** unidades. "
-                        "Deseja *1* somar ou *2* substituir pela nova quantidade?"
-                    )
+    product_to_add = session.get("pending_product_for_cart")
+    if not product_to_add:
+        response_text = generate_personalized_response("error", session)
+        adicionar_mensagem_historico(session, "assistant", response_text, "ERROR")
+        atualizar_contexto_sessao(
+            session,
+            {
+                "pending_action": None,
+                "pending_product_for_cart": None,
+            },
+        )
+        return None, response_text
 
-                    atualizar_contexto_sessao(
-                        session,
-                        {
-                            "pending_product_for_cart": None,
-                            "duplicate_item_index": duplicate_index + 1,
-                            "duplicate_item_qty": qt,
-                            "pending_action": "AWAITING_DUPLICATE_DECISION",
-                            "confirmation_requested_at": time.time(),
-                        },
-                    )
+    # Acumula as mudanças de contexto e aplica uma única vez no fim
+    ctx_patch = {"pending_product_for_cart": None}
+    term_to_learn = session.get("term_to_learn_after_quantity")
+    if term_to_learn:
+        app_logger.debug(
+            "Aprendendo que '%s' se refere a '%s'...", term_to_learn, obter_nome_produto(product_to_add)
+        )
+        knowledge.atualizar_kb(term_to_learn, product_to_add)
+        ctx_patch["term_to_learn_after_quantity"] = None
+
+    # Converte para int se for número inteiro
+    if isinstance(qt, float) and qt.is_integer():
+        qt = int(qt)
+
+    # Verifica se o item já existe no carrinho (por codprod ou nome)
+    codprod = product_to_add.get("codprod")
+    if codprod:
+        duplicate_index = next(
+            (i for i, item in enumerate(shopping_cart) if item.get("codprod") == codprod),
+            None,
+        )
+    else:
+        target_name = _nome_item_minusculo(product_to_add)
+        duplicate_index = next(
+            (i for i, item in enumerate(shopping_cart) if _nome_item_minusculo(item) == target_name),
+            None,
+        )
 
-                    adicionar_mensagem_historico(
-                        session,
-                        "assistant",
-                        response_text,
-                        "REQUEST_DUPLICATE_DECISION",
-                    )
+    if duplicate_index is not None:
+        existing_item = shopping_cart[duplicate_index]
+        existing_qty_display = formatar_quantidade(existing_item.get("qt", 0))
+        product_name = obter_nome_produto(existing_item)
 
-                    pending_action = "AWAITING_DUPLICATE_DECISION"
-                    state["confirmation_requested_at"] = time.time()
-                else:
-                    shopping_cart.append({**product_to_add, "qt": qt})
+        response_text = (
+            f"Você já possui **{product_name}** com **{existing_qty_display}** unidades. "
+            "Deseja *1* somar ou *2* substituir pela nova quantidade?"
+        )
 
-                    # 🆕 Resposta mais natural baseada na entrada
-                    if isinstance(qt, float):
-                        qt_display = f"{qt:.1f}".rstrip("0").rstrip(".")
-                    else:
-                        qt_display = str(qt)
+        ctx_patch.update(
+            {
+                "duplicate_item_index": duplicate_index + 1,
+                "duplicate_item_qty": qt,
+                "pending_action": "AWAITING_DUPLICATE_DECISION",
+            }
+        )
+        tipo_acao = "REQUEST_DUPLICATE_DECISION"
+        pending_action = "AWAITING_DUPLICATE_DECISION"
+    else:
+        shopping_cart.append(
+            {**product_to_add, "qt": qt, "_nome_minusculo": _nome_item_minusculo(product_to_add)}
+        )
 
-                    product_name = obter_nome_produto(product_to_add).replace('CERVEJA ', '').replace('BALA ', '')[:20]
-                    from core.gerenciador_sessao import formatar_carrinho_para_exibicao
-                    
-                    # 🆕 MENSAGEM COMPACTA: Usa IA para gerar resposta natural
-                    response_text = generate_personalized_response(
-                        "operation_success", 
-                        session, 
-                        success_details=f"Adicionei {qt_display} {product_name}"
-                    )
-                    response_text += f"\n\n{formatar_carrinho_para_exibicao(shopping_cart)}"
+        # 🆕 Resposta mais natural baseada na entrada
+        qt_display = formatar_quantidade(qt)
+        product_name = obter_nome_produto(product_to_add).replace('CERVEJA ', '').replace('BALA ', '')[:20]
 
-                    # 📝 REGISTRA A RESPOSTA DO BOT
-                    adicionar_mensagem_historico(
-                        session, "assistant", response_text, "ADD_TO_CART"
-                    )
+        # 🆕 MENSAGEM COMPACTA: Usa IA para gerar resposta natural
+        response_text = generate_personalized_response(
+            "operation_success", 
+            session, 
+            success_details=f"Adicionei {qt_display} {product_name}"
+        )
+        response_text += f"\n\n{formatar_carrinho_para_exibicao(shopping_cart)}"
 
-                    atualizar_contexto_sessao(
-                        session,
-                        {
-                            "pending_action": None,
-                            "pending_product_for_cart": None,
-                            "last_bot_action": "AWAITING_CHECKOUT_CONFIRMATION",
-                            "confirmation_requested_at": time.time(),
-                        },
-                    )
-                    pending_action = None
-                    # Define o estado correto para aguardar confirmação de finalizar_pedido
-                    state["last_bot_action"] = "AWAITING_CHECKOUT_CONFIRMATION"
-                    state["confirmation_requested_at"] = time.time()
+        ctx_patch.update(
+            {
+                "pending_action": None,
+                "last_bot_action": "AWAITING_CHECKOUT_CONFIRMATION",
+            }
+        )
+        tipo_acao = "ADD_TO_CART"
+        pending_action = None
+        # Define o estado correto para aguardar confirmação de finalizar_pedido
+        state["last_bot_action"] = "AWAITING_CHECKOUT_CONFIRMATION"
 
-            else:
-                response_text = generate_personalized_response("error", session)
-                adicionar_mensagem_historico(session, "assistant", response_text, "ERROR")
-                atualizar_contexto_sessao(
-                    session,
-                    {
-                        "pending_action": None,
-                        "pending_product_for_cart": None,
-                    },
-                )
-                pending_action = None
+    # 📝 REGISTRA A RESPOSTA DO BOT e aplica o contexto acumulado
+    agora = time.time()
+    ctx_patch["confirmation_requested_at"] = agora
+    state["confirmation_requested_at"] = agora
+    adicionar_mensagem_historico(session, "assistant", response_text, tipo_acao)
+    atualizar_contexto_sessao(session, ctx_patch)
+    return pending_action, response_text
 
-        else:
-            # 🆕 Mensagem de erro mais útil
-            if qt is None:
-                response_text = generate_personalized_response("invalid_quantity", session)
-            else:
-                response_text = generate_personalized_response("invalid_quantity", session, invalid_quantity=qt)
 
-            adicionar_mensagem_historico(
-                session, "assistant", response_text, "REQUEST_QUANTITY"
-            )
-            pending_action = None
+def _pendente_quantidade(
+    session: Dict, state: Dict, incoming_msg: str
+) -> Tuple[Union[Dict, None], str]:
+    """Trata a resposta do usuário quando aguardamos a quantidade de um produto."""
+    shopping_cart = state.get("shopping_cart", [])
+    pending_action, response_text = _processar_aguardando_quantidade(
+        session, state, incoming_msg, shopping_cart
+    )
+    state["pending_action"] = pending_action
+    state["shopping_cart"] = shopping_cart
+    return None, response_text
 
-        state["pending_action"] = pending_action
-        state["shopping_cart"] = shopping_cart
 
-    elif pending_action == "AWAITING_CART_ITEM_SELECTION":
-        # Usuário está selecionando item do carrinho após ambiguidade
-        cart_action = session.get("pending_cart_action")
-        cart_matches = session.get("pending_cart_matches", [])
+def _pendente_selecao_item_carrinho(
+    session: Dict, state: Dict, incoming_msg: str
+) -> Tuple[Union[Dict, None], str]:
+    """Trata a escolha de item do carrinho após uma busca ambígua."""
+    pending_action = state.get("pending_action")
+    shopping_cart = state.get("shopping_cart", [])
+    response_text = ""
 
-        if incoming_msg.isdigit():
-            selection = int(incoming_msg)
+    # Usuário está selecionando item do carrinho após ambiguidade
+    cart_action = session.get("pending_cart_action")
+    cart_matches = session.get("pending_cart_matches", [])
+    quantity = session.get("pending_cart_quantity", 1)
 
-            # Verifica se a seleção é válida
-            valid_indices = [
-                match[0] + 1 for match in cart_matches
-            ]  # +1 para índice baseado em 1
+    if incoming_msg.isdigit():
+        selection = int(incoming_msg)
 
-            if selection in valid_indices:
-                if cart_action == "remove":
-                    success, message, shopping_cart = remover_item_do_carrinho(
-                        shopping_cart, selection
-                    )
-                    response_text = message
-                    adicionar_mensagem_historico(
-                        session, "assistant", response_text, "REMOVE_FROM_CART"
-                    )
-                elif cart_action == "add":
-                    quantity = session.get("pending_cart_quantity", 1)
-                    success, message, shopping_cart = adicionar_quantidade_item_carrinho(
-                        shopping_cart, selection, quantity
-                    )
-                    response_text = message
-                    adicionar_mensagem_historico(
-                        session, "assistant", response_text, "ADD_QUANTITY_TO_CART"
-                    )
-                elif cart_action == "update":
-                    quantity = session.get("pending_cart_quantity", 1)
-                    success, message, shopping_cart = atualizar_quantidade_item_carrinho(
-                        shopping_cart, selection, quantity
-                    )
-                    response_text = message
-                    adicionar_mensagem_historico(
-                        session, "assistant", response_text, "UPDATE_CART_ITEM"
-                    )
-                else:
-                    response_text = generate_personalized_response("clarification", session)
-                    adicionar_mensagem_historico(session, "assistant", response_text, "ERROR")
+        # Verifica se a seleção é válida
+        valid_indices = [
+            match[0] + 1 for match in cart_matches
+        ]  # +1 para índice baseado em 1
 
-                # Limpa estado pendente
-                pending_action = None
-                session.pop("pending_cart_action", None)
-                session.pop("pending_cart_matches", None)
-                session.pop("pending_cart_quantity", None)
-            else:
-                response_text = (
-                    f"Esse número não tá na lista! Escolhe um desses: {', '.join(map(str, valid_indices))}\n\n"
-                    f"{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart), tem_produtos=True)}"
+        if selection in valid_indices:
+            if cart_action == "remove":
+                success, message, shopping_cart = remover_item_do_carrinho(
+                    shopping_cart, selection
                 )
+                response_text = message
                 adicionar_mensagem_historico(
-                    session, "assistant", response_text, "REQUEST_CLARIFICATION"
+                    session, "assistant", response_text, "REMOVE_FROM_CART"
+                )
+            elif cart_action == "add":
+                success, message, shopping_cart = adicionar_quantidade_item_carrinho(
+                    shopping_cart, selection, quantity
                 )
+                response_text = message
+                adicionar_mensagem_historico(
+                    session, "assistant", response_text, "ADD_QUANTITY_TO_CART"
+                )
+            elif cart_action == "update":
+                success, message, shopping_cart = atualizar_quantidade_item_carrinho(
+                    shopping_cart, selection, quantity
+                )
+                response_text = message
+                adicionar_mensagem_historico(
+                    session, "assistant", response_text, "UPDATE_CART_ITEM"
+                )
+            else:
+                response_text = generate_personalized_response("clarification", session)
+                adicionar_mensagem_historico(session, "assistant", response_text, "ERROR")
+
+            # Limpa estado pendente
+            pending_action = None
+            session.pop("pending_cart_action", None)
+            session.pop("pending_cart_matches", None)
+            session.pop("pending_cart_quantity", None)
         else:
             response_text = (
-                "Digita o número do item que você quer, por favor!\n\n"
-                f"{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart), tem_produtos=True)}"
+                f"Esse número não tá na lista! Escolhe um desses: {', '.join(map(str, valid_indices))}\n\n"
+                f"{_ACOES_SELECAO_PRODUTO}"
             )
             adicionar_mensagem_historico(
                 session, "assistant", response_text, "REQUEST_CLARIFICATION"
             )
+    else:
+        response_text = _MSG_PEDIR_NUMERO_ITEM
+        adicionar_mensagem_historico(
+            session, "assistant", response_text, "REQUEST_CLARIFICATION"
+        )
 
-        state["pending_action"] = pending_action
-        state["shopping_cart"] = shopping_cart
+    state["pending_action"] = pending_action
+    state["shopping_cart"] = shopping_cart
 
-    elif pending_action == "AWAITING_DUPLICATE_DECISION":
-        print(">>> CONSOLE: Tratando ação pendente AWAITING_DUPLICATE_DECISION")
-        choice = incoming_msg.strip()
-        index = session.get("duplicate_item_index")
-        qty = session.get("duplicate_item_qty")
+    return None, response_text
 
-        if choice == "1":
-            success, message, shopping_cart = adicionar_quantidade_item_carrinho(
-                shopping_cart, index, qty
-            )
-            response_text = message
-            adicionar_mensagem_historico(
-                session, "assistant", response_text, "ADD_QUANTITY_TO_CART"
-            )
-            pending_action = None
-            atualizar_contexto_sessao(
-                session,
-                {
-                    "duplicate_item_index": None,
-                    "duplicate_item_qty": None,
-                    "pending_action": None,
-                    "last_bot_action": "AWAITING_CHECKOUT_CONFIRMATION",
-                    "confirmation_requested_at": time.time(),
-                },
-            )
-            state["last_bot_action"] = "AWAITING_CHECKOUT_CONFIRMATION"
-            state["confirmation_requested_at"] = time.time()
-        elif choice == "2":
-            success, message, shopping_cart = atualizar_quantidade_item_carrinho(
-                shopping_cart, index, qty
-            )
-            response_text = message
-            adicionar_mensagem_historico(
-                session, "assistant", response_text, "UPDATE_CART_ITEM_QUANTITY"
-            )
-            pending_action = None
-            atualizar_contexto_sessao(
-                session,
-                {
-                    "duplicate_item_index": None,
-                    "duplicate_item_qty": None,
-                    "pending_action": None,
-                    "last_bot_action": "AWAITING_CHECKOUT_CONFIRMATION",
-                    "confirmation_requested_at": time.time(),
-                },
+
+def _pendente_decisao_duplicado(
+    session: Dict, state: Dict, incoming_msg: str
+) -> Tuple[Union[Dict, None], str]:
+    """Trata a decisão de somar ou substituir um item já presente no carrinho."""
+    pending_action = state.get("pending_action")
+    shopping_cart = state.get("shopping_cart", [])
+    response_text = ""
+
+    app_logger.debug("Tratando ação pendente AWAITING_DUPLICATE_DECISION")
+    choice = incoming_msg.strip()
+    index = session.get("duplicate_item_index")
+    qty = session.get("duplicate_item_qty")
+
+    decisao = _DECISAO_ITEM_DUPLICADO.get(choice)
+    if decisao:
+        operacao_carrinho, tipo_acao = decisao
+        success, message, shopping_cart = operacao_carrinho(
+            shopping_cart, index, qty
+        )
+        response_text = message
+        adicionar_mensagem_historico(
+            session, "assistant", response_text, tipo_acao
+        )
+        pending_action = None
+        agora = time.time()
+        atualizar_contexto_sessao(
+            session,
+            {
+                "duplicate_item_index": None,
+                "duplicate_item_qty": None,
+                "pending_action": None,
+                "last_bot_action": "AWAITING_CHECKOUT_CONFIRMATION",
+                "confirmation_requested_at": agora,
+            },
+        )
+        state["last_bot_action"] = "AWAITING_CHECKOUT_CONFIRMATION"
+        state["confirmation_requested_at"] = agora
+    else:
+        if index and 1 <= index <= len(shopping_cart):
+            existing_item = shopping_cart[index - 1]
+            existing_qty = existing_item.get("qt", 0)
+            existing_qty_display = formatar_quantidade(existing_qty)
+            product_name = obter_nome_produto(existing_item)
+            response_text = (
+                f"Você já possui **{product_name}** com **{existing_qty_display}** unidades. "
+                "Deseja *1* somar ou *2* substituir pela nova quantidade?"
             )
-            state["last_bot_action"] = "AWAITING_CHECKOUT_CONFIRMATION"
-            state["confirmation_requested_at"] = time.time()
         else:
-            if index and 1 <= index <= len(shopping_cart):
-                existing_item = shopping_cart[index - 1]
-                existing_qty = existing_item.get("qt", 0)
-                if isinstance(existing_qty, float):
-                    existing_qty_display = f"{existing_qty:.1f}".rstrip("0").rstrip(".")
-                else:
-                    existing_qty_display = str(existing_qty)
-                product_name = obter_nome_produto(existing_item)
-                response_text = (
-                    f"Você já possui **{product_name}** com **{existing_qty_display}** unidades. "
-                    "Deseja *1* somar ou *2* substituir pela nova quantidade?"
+            response_text = generate_personalized_response("clarification", session)
+        adicionar_mensagem_historico(
+            session, "assistant", response_text, "REQUEST_DUPLICATE_DECISION"
+        )
+
+    state["pending_action"] = pending_action
+    state["shopping_cart"] = shopping_cart
+
+    return None, response_text
+
+
+def _pendente_atualizacao_inteligente(
+    session: Dict, state: Dict, incoming_msg: str
+) -> Tuple[Union[Dict, None], str]:
+    """Trata a seleção de item pendente da atualização inteligente do carrinho."""
+    pending_action = state.get("pending_action")
+    shopping_cart = state.get("shopping_cart", [])
+    response_text = ""
+
+    app_logger.debug("CHEGOU NO ELIF AWAITING_SMART_UPDATE_SELECTION")
+    # 🆕 Tratamento para seleção em atualizacao_inteligente_carrinho
+    app_logger.debug("Tratando ação pendente AWAITING_SMART_UPDATE_SELECTION")
+    app_logger.debug("Mensagem recebida: '%s'", incoming_msg)
+    try:
+        selection = int(incoming_msg.strip())
+        pending_smart_update = session.get("pending_smart_update", {})
+        matching_items = pending_smart_update.get("matching_items", [])
+        app_logger.debug("Seleção: %s, Itens disponíveis: %s", selection, len(matching_items))
+
+        if 1 <= selection <= len(matching_items):
+            cart_idx, item = matching_items[selection - 1]
+            action = pending_smart_update.get("action", "add")
+            quantity = pending_smart_update.get("quantity", 1)
+            old_qty = item.get("qt", 1)
+
+            if action == "add":
+                new_qty = old_qty + quantity
+            elif action == "set":
+                new_qty = quantity
+            elif action == "remove":
+                new_qty = max(0, old_qty - quantity)
+            else:
+                new_qty = old_qty
+
+            if new_qty <= 0:
+                # Remove do carrinho
+                removed_item = shopping_cart.pop(cart_idx)
+                product_display_name = obter_nome_produto(removed_item)
+                response_text = generate_personalized_response(
+                    "operation_success", 
+                    session, 
+                    success_details=f"{product_display_name} removido do carrinho"
                 )
             else:
-                response_text = generate_personalized_response("clarification", session)
-            adicionar_mensagem_historico(
-                session, "assistant", response_text, "REQUEST_DUPLICATE_DECISION"
-            )
+                # Atualiza quantidade
+                shopping_cart[cart_idx]["qt"] = new_qty
+                product_display_name = obter_nome_produto(item)
+                success_msg = f"{product_display_name} atualizado para {new_qty} unidades"
+                app_logger.debug("Mensagem de sucesso: '%s'", success_msg)
+                response_text = generate_personalized_response(
+                    "operation_success", 
+                    session, 
+                    success_details=success_msg
+                )
+                app_logger.debug("Response gerada: '%s...')", response_text[:100])
 
-        state["pending_action"] = pending_action
-        state["shopping_cart"] = shopping_cart
+                # 🆕 MENSAGEM MAIS CONCISA
+                cart_display = formatar_carrinho_para_exibicao(shopping_cart)
+                response_text = f"{response_text}\n\n{cart_display}"
 
-    elif pending_action == "AWAITING_SMART_UPDATE_SELECTION":
-        print(">>> CONSOLE: CHEGOU NO ELIF AWAITING_SMART_UPDATE_SELECTION")
-        # 🆕 Tratamento para seleção em atualizacao_inteligente_carrinho
-        print(">>> CONSOLE: Tratando ação pendente AWAITING_SMART_UPDATE_SELECTION")
-        print(f">>> CONSOLE: Mensagem recebida: '{incoming_msg}'")
-        try:
-            selection = int(incoming_msg.strip())
-            pending_smart_update = session.get("pending_smart_update", {})
-            matching_items = pending_smart_update.get("matching_items", [])
-            print(f">>> CONSOLE: Seleção: {selection}, Itens disponíveis: {len(matching_items)}")
-            
-            if 1 <= selection <= len(matching_items):
-                cart_idx, item = matching_items[selection - 1]
-                action = pending_smart_update.get("action", "add")
-                quantity = pending_smart_update.get("quantity", 1)
-                old_qty = item.get("qt", 1)
-                
-                if action == "add":
-                    new_qty = old_qty + quantity
-                elif action == "set":
-                    new_qty = quantity
-                elif action == "remove":
-                    new_qty = max(0, old_qty - quantity)
-                else:
-                    new_qty = old_qty
-                
-                if new_qty <= 0:
-                    # Remove do carrinho
-                    removed_item = shopping_cart.pop(cart_idx)
-                    product_display_name = obter_nome_produto(removed_item)
-                    response_text = generate_personalized_response(
-                        "operation_success", 
-                        session, 
-                        success_details=f"{product_display_name} removido do carrinho"
-                    )
-                else:
-                    # Atualiza quantidade
-                    shopping_cart[cart_idx]["qt"] = new_qty
-                    product_display_name = obter_nome_produto(item)
-                    success_msg = f"{product_display_name} atualizado para {new_qty} unidades"
-                    print(f">>> CONSOLE: Mensagem de sucesso: '{success_msg}'")
-                    response_text = generate_personalized_response(
-                        "operation_success", 
-                        session, 
-                        success_details=success_msg
-                    )
-                    print(f">>> CONSOLE: Response gerada: '{response_text[:100]}...')")
-                    
-                    # 🆕 MENSAGEM MAIS CONCISA
-                    from core.gerenciador_sessao import formatar_carrinho_para_exibicao
-                    cart_display = formatar_carrinho_para_exibicao(shopping_cart)
-                    response_text = f"{response_text}\n\n{cart_display}"
-                
-                adicionar_mensagem_historico(session, "assistant", response_text, "SMART_UPDATE_COMPLETED")
-            else:
-                response_text = generate_personalized_response("invalid_selection", session, 
-                    invalid_number=selection, max_options=len(matching_items))
-                adicionar_mensagem_historico(session, "assistant", response_text, "INVALID_SELECTION")
-            
-            # Limpa estado pendente
-            atualizar_contexto_sessao(session, {
-                "pending_smart_update": None,
-                "pending_action": None
-            })
-            pending_action = None
-            state["pending_action"] = pending_action
-            
-            # Retorna uma intent fake para indicar que a ação foi processada
-            return {"nome_ferramenta": "action_processed", "parametros": {}}, response_text
-            
-        except ValueError as e:
-            # Não é um número, deixa continuar com o processamento normal
-            print(f">>> CONSOLE: ValueError no AWAITING_SMART_UPDATE_SELECTION: {e}")
-            pass
-        except Exception as e:
-            print(f">>> CONSOLE: Exception inesperada no AWAITING_SMART_UPDATE_SELECTION: {e}")
-            pass
-
-    elif pending_action:
-        print(f">>> CONSOLE: Tratando ação pendente {pending_action}")
-        affirmative_responses = [
-            "sim",
-            "pode ser",
-            "s",
-            "claro",
-            "quero",
-            "ok",
-            "beleza",
-        ]
-        negative_responses = ["não", "n", "agora não", "deixa"]
-        if incoming_msg.lower() in affirmative_responses:
-            if pending_action == "show_top_selling":
-                intent = {"nome_ferramenta": "obter_produtos_mais_vendidos", "parametros": {}}
-            pending_action = None
-        elif incoming_msg.lower() in negative_responses:
-            response_text = (
-                "🤖 Tudo bem! O que você gostaria de fazer então?\n\n"
-                f"{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}"
-            )
-            adicionar_mensagem_historico(session, "assistant", response_text, "CHITCHAT")
-            pending_action = None
-            state["last_shown_products"] = []
-            state["last_bot_action"] = "AWAITING_MENU_SELECTION"
-            state["confirmation_requested_at"] = None
+            adicionar_mensagem_historico(session, "assistant", response_text, "SMART_UPDATE_COMPLETED")
         else:
-            pending_action = None
-
+            response_text = generate_personalized_response("invalid_selection", session, 
+                invalid_number=selection, max_options=len(matching_items))
+            adicionar_mensagem_historico(session, "assistant", response_text, "INVALID_SELECTION")
+
+        # Limpa estado pendente
+        atualizar_contexto_sessao(session, {
+            "pending_smart_update": None,
+            "pending_action": None
+        })
+        pending_action = None
         state["pending_action"] = pending_action
-        if pending_action is None:
-            state["confirmation_requested_at"] = None
+
+        # Retorna uma intent fake para indicar que a ação foi processada
+        return {"nome_ferramenta": "action_processed", "parametros": {}}, response_text
+
+    except ValueError as e:
+        # Não é um número, deixa continuar com o processamento normal
+        app_logger.debug("ValueError no AWAITING_SMART_UPDATE_SELECTION: %s", e)
+        pass
+    except Exception as e:
+        app_logger.debug("Exception inesperada no AWAITING_SMART_UPDATE_SELECTION: %s", e)
+        pass
 
     return None, response_text
 
+
+def _pendente_confirmacao_simples(
+    session: Dict, state: Dict, incoming_msg: str
+) -> Tuple[Union[Dict, None], str]:
+    """Trata confirmações simples (sim/não) das demais ações pendentes."""
+    pending_action = state.get("pending_action")
+    shopping_cart = state.get("shopping_cart", [])
+    intent = None
+    response_text = ""
+
+    app_logger.debug("Tratando ação pendente %s", pending_action)
+    msg_minuscula = incoming_msg.lower()
+    if msg_minuscula in _RESPOSTAS_AFIRMATIVAS:
+        if pending_action == "show_top_selling":
+            intent = {"nome_ferramenta": "obter_produtos_mais_vendidos", "parametros": {}}
+        pending_action = None
+    elif msg_minuscula in _RESPOSTAS_NEGATIVAS:
+        response_text = _MSG_RECUSA_ACOES[bool(shopping_cart)]
+        adicionar_mensagem_historico(session, "assistant", response_text, "CHITCHAT")
+        pending_action = None
+        state["last_shown_products"] = []
+        state["last_bot_action"] = "AWAITING_MENU_SELECTION"
+        state["confirmation_requested_at"] = None
+    else:
+        pending_action = None
+
+    state["pending_action"] = pending_action
+    if pending_action is None:
+        state["confirmation_requested_at"] = None
+
+    return intent, response_text
+
+
+# Tratador de cada ação pendente; as demais caem na confirmação simples (sim/não)
+_TRATADORES_ACAO_PENDENTE = {
+    "AWAITING_QUANTITY": _pendente_quantidade,
+    "AWAITING_CART_ITEM_SELECTION": _pendente_selecao_item_carrinho,
+    "AWAITING_DUPLICATE_DECISION": _pendente_decisao_duplicado,
+    "AWAITING_SMART_UPDATE_SELECTION": _pendente_atualizacao_inteligente,
+}
+
+
+def _handle_pending_action(
+    session: Dict, state: Dict, incoming_msg: str
+) -> Tuple[Union[Dict, None], str]:
+    """Processa ações pendentes existentes na sessão."""
+    timeout_msg = _expire_pending_confirmations(session, state)
+    if timeout_msg:
+        return None, timeout_msg
+
+    pending_action = state.get("pending_action")
+    app_logger.debug("pending_action atual: '%s'", pending_action)
+    if not pending_action:
+        return None, ""
+
+    tratador = _TRATADORES_ACAO_PENDENTE.get(pending_action, _pendente_confirmacao_simples)
+    return tratador(session, state, incoming_msg)
+
+# Ações de carrinho detectadas pela IA que viram ferramenta direta (sem parâmetros)
+_FERRAMENTA_POR_ACAO_CARRINHO = {
+    "visualizar_carrinho": "visualizar_carrinho",
+    "ver_carrinho": "visualizar_carrinho",
+    "mostrar_carrinho": "visualizar_carrinho",
+    "limpar_carrinho": "limpar_carrinho",
+    "esvaziar_carrinho": "limpar_carrinho",
+    "clear_cart": "limpar_carrinho",
+    "finalizar_pedido": "finalizar_pedido",
+    "checkout": "finalizar_pedido",
+    "finalizar": "finalizar_pedido",
+}
+
+# Opções numéricas do menu principal: número -> (ferramenta, parâmetros, exige carrinho)
+_OPCOES_MENU_PRINCIPAL = {
+    1: ("smart_search_with_promotions", {"search_term": "produtos"}, False),
+    2: ("visualizar_carrinho", {}, True),
+    3: ("finalizar_pedido", {}, True),
+}
+
+# CNPJ tem 14 dígitos, mas aceita também 11+ para ser mais tolerante
+_MIN_DIGITOS_CNPJ = 11
+
+
+# Resposta a mensagem vazia já combinada com o menu, indexada por "tem carrinho"
+_MSG_MENSAGEM_VAZIA = {
+    tem_carrinho: (
+        "Me conta o que você precisa que eu te ajudo!\n\n"
+        f"{formatar_acoes_rapidas(tem_carrinho=tem_carrinho)}"
+    )
+    for tem_carrinho in (False, True)
+}
+
+
+def _parece_cnpj(texto: str) -> bool:
+    """Detecta se o texto parece ser um CNPJ (com ou sem formatação)."""
+    return len(_PADRAO_NAO_DIGITO.sub("", texto)) >= _MIN_DIGITOS_CNPJ
+
+
 def _process_mensagem_usuario(
     session: Dict, state: Dict, incoming_msg: str
 ) -> Tuple[Union[Dict, None], str]:
@@ -951,10 +1179,7 @@ def _process_mensagem_usuario(
     shopping_cart = state.get("shopping_cart", [])
 
     if not incoming_msg:
-        response_text = (
-            "Me conta o que você precisa que eu te ajudo!\n\n"
-            f"{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}"
-        )
+        response_text = _MSG_MENSAGEM_VAZIA[bool(shopping_cart)]
         state["last_shown_products"] = []
         state["last_bot_action"] = "AWAITING_MENU_SELECTION"
         adicionar_mensagem_historico(
@@ -962,55 +1187,41 @@ def _process_mensagem_usuario(
         )
         return None, response_text
 
-    # 🔍 DETECTA CNPJ ANTES DE NÚMEROS DE SELEÇÃO
-    def is_cnpj_format(text: str) -> bool:
-        """Detecta se o texto parece ser um CNPJ (com ou sem formatação)"""
-        # Remove pontuação e espaços
-        clean = ''.join(filter(str.isdigit, text))
-        # CNPJ tem 14 dígitos, mas aceita também 11+ para ser mais tolerante
-        if len(clean) >= 11:
-            return True
-        # Detecta padrões com formatação típica de CNPJ
-        import re
-        cnpj_pattern = r'^\d{2}\.?\d{3}\.?\d{3}\/?\d{4}-?\d{2}$'
-        return bool(re.match(cnpj_pattern, text.replace(' ', '')))
-    
-    # 📋 DETECTA CNPJ NO CONTEXTO DE CHECKOUT
-    if is_cnpj_format(incoming_msg.strip()):
-        print(f">>> CONSOLE: CNPJ detectado: '{incoming_msg.strip()}' - processando finalizar_pedido")
+    msg_limpa = incoming_msg.strip()
+
+    # 📋 DETECTA CNPJ (CONTEXTO DE CHECKOUT) ANTES DE NÚMEROS DE SELEÇÃO
+    if _parece_cnpj(msg_limpa):
+        app_logger.debug("CNPJ detectado: '%s' - processando finalizar_pedido", msg_limpa)
         # Força o processamento como finalizar_pedido com CNPJ
-        intent = {"nome_ferramenta": "finalizar_pedido", "parametros": {"cnpj": incoming_msg.strip()}}
+        intent = {"nome_ferramenta": "finalizar_pedido", "parametros": {"cnpj": msg_limpa}}
         return intent, response_text
     
-    # 🚨 PRIORIDADE MÁXIMA: Detecta números de menu principal (mas não CNPJ)
-    if incoming_msg.strip().isdigit() and not is_cnpj_format(incoming_msg.strip()):
-        numero = int(incoming_msg.strip())
+    # 🚨 PRIORIDADE MÁXIMA: Detecta números de menu principal (CNPJ já tratado acima)
+    if msg_limpa.isdigit():
+        numero = int(msg_limpa)
         ultima_acao = state.get("last_bot_action", "")
         
-        print(f">>> CONSOLE: Número {numero} detectado, ultima_acao='{ultima_acao}', tem_carrinho={bool(shopping_cart)}, produtos_mostrados={len(state.get('last_shown_products', []))}")
+        app_logger.debug("Número %s detectado, ultima_acao='%s', tem_carrinho=%s, produtos_mostrados=%s", numero, ultima_acao, bool(shopping_cart), len(state.get('last_shown_products', [])))
         
         # Se é contexto de menu e não tem produtos para selecionar
         if ultima_acao == "AWAITING_MENU_SELECTION" and not state.get("last_shown_products"):
-            print(f">>> CONSOLE: Processando seleção de menu {numero}")
-            if numero == 1:
-                intent = {"nome_ferramenta": "smart_search_with_promotions", "parametros": {"search_term": "produtos"}}
-                return intent, response_text
-            elif numero == 2 and shopping_cart:
-                intent = {"nome_ferramenta": "visualizar_carrinho", "parametros": {}}
-                return intent, response_text
-            elif numero == 3 and shopping_cart:
-                intent = {"nome_ferramenta": "finalizar_pedido", "parametros": {}}
+            app_logger.debug("Processando seleção de menu %s", numero)
+            opcao_menu = _OPCOES_MENU_PRINCIPAL.get(numero)
+            if opcao_menu and (shopping_cart or not opcao_menu[2]):
+                nome_ferramenta, parametros, _ = opcao_menu
+                # Cópia dos parâmetros: as ferramentas podem alterá-los
+                intent = {"nome_ferramenta": nome_ferramenta, "parametros": dict(parametros)}
                 return intent, response_text
         
         # 🎯 NOVA CONDIÇÃO: Se é contexto de seleção de produto e tem produtos para selecionar
         elif ultima_acao == "AWAITING_PRODUCT_SELECTION" and state.get("last_shown_products"):
             produtos_mostrados = state.get("last_shown_products", [])
             if 1 <= numero <= len(produtos_mostrados):
-                print(f">>> CONSOLE: Processando seleção de produto {numero}")
+                app_logger.debug("Processando seleção de produto %s", numero)
                 intent = {"nome_ferramenta": "adicionar_item_ao_carrinho", "parametros": {"index": numero}}
                 return intent, response_text
             else:
-                print(f">>> CONSOLE: Número {numero} inválido para {len(produtos_mostrados)} produtos")
+                app_logger.debug("Número %s inválido para %s produtos", numero, len(produtos_mostrados))
                 # Deixa a IA processar como fallback
 
     # 🆕 Verifica se o usuário solicitou uma marca específica enquanto aguarda seleção
@@ -1039,7 +1250,7 @@ def _process_mensagem_usuario(
             return intent, response_text
 
     # 🚀 1. MELHORADO: Análise de intenções de carrinho SEMPRE (mesmo com carrinho vazio)
-    print(">>> CONSOLE: Analisando intenção de carrinho com IA...")
+    app_logger.debug("Analisando intenção de carrinho com IA...")
     historico_conversa = obter_contexto_conversa(session)
     intencao_carrinho = detectar_intencao_carrinho_ia(
         incoming_msg, 
@@ -1051,19 +1262,14 @@ def _process_mensagem_usuario(
     acao_carrinho = intencao_carrinho.get("acao") or intencao_carrinho.get("action")
     confianca = intencao_carrinho.get("confidence", intencao_carrinho.get("confianca", 0))
     
-    print(f">>> CONSOLE: [CARRINHO_DEBUG] acao={acao_carrinho}, confianca={confianca}")
+    app_logger.debug("[CARRINHO_DEBUG] acao=%s, confianca=%s", acao_carrinho, confianca)
     
     if acao_carrinho and acao_carrinho != "unknown":
-        print(f">>> CONSOLE: ✅ Intenção de carrinho detectada: {acao_carrinho}")
+        app_logger.debug("✅ Intenção de carrinho detectada: %s", acao_carrinho)
         # Converte para formato compatível com o sistema
-        if acao_carrinho in ["visualizar_carrinho", "ver_carrinho", "mostrar_carrinho"]:
-            intent = {"nome_ferramenta": "visualizar_carrinho", "parametros": {}}
-            return intent, response_text
-        elif acao_carrinho in ["limpar_carrinho", "esvaziar_carrinho", "clear_cart"]:
-            intent = {"nome_ferramenta": "limpar_carrinho", "parametros": {}}
-            return intent, response_text
-        elif acao_carrinho in ["finalizar_pedido", "checkout", "finalizar"]:
-            intent = {"nome_ferramenta": "finalizar_pedido", "parametros": {}}
+        nome_ferramenta = _FERRAMENTA_POR_ACAO_CARRINHO.get(acao_carrinho)
+        if nome_ferramenta:
+            intent = {"nome_ferramenta": nome_ferramenta, "parametros": {}}
             return intent, response_text
 
     # 2. Chama a IA para obter a intenção usando o novo classificador inteligente
@@ -1072,88 +1278,309 @@ def _process_mensagem_usuario(
         dados_sessao=session
     )
 
-    print(f">>> CONSOLE: Intenção extraída do JSON: {intent}")
+    app_logger.debug("Intenção extraída do JSON: %s", intent)
+
+    return intent, response_text
+
+def _processar_pedido_complexo(session: Dict, state: Dict, pedidos_complexos: List[Dict]) -> str:
+    """
+    Processa pedidos complexos com múltiplos itens usando IA-FIRST.
+    
+    Args:
+        session: Dados da sessão.
+        state: Estado atual.
+        pedidos_complexos: Lista de pedidos extraídos pela IA.
+    
+    Returns:
+        str: Resposta formatada para o usuário.
+    """
+    shopping_cart = state.get("shopping_cart", [])
+    itens_adicionados = []
+    itens_nao_encontrados = []
+    
+    for pedido in pedidos_complexos:
+        produto_nome = pedido.get("produto", "")
+        quantidade = pedido.get("quantidade", 1)
+        
+        # Busca o produto no banco
+        search_result = pesquisar_produtos_com_sugestoes(produto_nome, limite=1)
+        
+        if search_result["products"]:
+            encontrado = search_result["products"][0]
+            # Cópia própria do item: o resultado da busca não é alterado
+            produto = {**encontrado, "qt": quantidade, "_nome_minusculo": _nome_item_minusculo(encontrado)}
+            shopping_cart.append(produto)
+            itens_adicionados.append(f"{quantidade}x {produto.get('descricao', produto_nome)}")
+            
+            # Adiciona ao histórico
+            adicionar_mensagem_historico(
+                session, "assistant", 
+                f"Adicionado: {quantidade}x {produto.get('descricao', produto_nome)}", 
+                "ADD_TO_CART_COMPLEX"
+            )
+        else:
+            itens_nao_encontrados.append(f"{quantidade}x {produto_nome}")
+    
+    # Atualiza o estado
+    state["shopping_cart"] = shopping_cart
+    state["last_bot_action"] = "COMPLEX_ORDER_PROCESSED"
+    
+    # Gera resposta
+    if itens_adicionados:
+        resposta = "✅ Adicionei ao carrinho:\n• " + "\n• ".join(itens_adicionados)
+        
+        if itens_nao_encontrados:
+            resposta += "\n\n❌ Não encontrei:\n• " + "\n• ".join(itens_nao_encontrados)
+        
+        resposta += f"\n\n🛒 Carrinho com {len(shopping_cart)} itens"
+        resposta += f"\n\n{formatar_acoes_rapidas(tem_carrinho=True)}"
+    else:
+        resposta = "😕 Não consegui encontrar nenhum dos produtos mencionados. Pode tentar com nomes mais específicos?"
+        resposta += f"\n\n{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}"
+    
+    return resposta
+
+# Pré-carga da próxima página de mais vendidos: aquece o cache de database enquanto o usuário lê
+_POOL_PRE_CARGA = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gav-precarga")
+atexit.register(_POOL_PRE_CARGA.shutdown, wait=False)
+_PRE_CARGAS_EM_ANDAMENTO = set()
+_lock_pre_carga = threading.Lock()
+
+
+def _carregar_pagina_mais_vendidos(offset: int) -> None:
+    """Executa a consulta de mais vendidos para deixá-la no cache (roda no pool de pré-carga).
+
+    Args:
+        offset: O deslocamento da página a carregar.
+    """
+    try:
+        # Mesma forma de chamada das ferramentas, para usar a mesma chave do cache_query
+        database.obter_produtos_mais_vendidos(limite=10, offset=offset)
+    except Exception as e:
+        app_logger.debug("[PRE_CARGA] Falha ao carregar mais vendidos offset=%s: %s", offset, e)
+    finally:
+        with _lock_pre_carga:
+            _PRE_CARGAS_EM_ANDAMENTO.discard(offset)
+
+
+def _pre_carregar_mais_vendidos(offset: int, pagina_cheia: bool) -> None:
+    """Agenda em segundo plano a próxima página de mais vendidos, se houver uma.
+
+    Args:
+        offset: O deslocamento da próxima página.
+        pagina_cheia: Se a página exibida veio completa (senão não há próxima).
+    """
+    if not pagina_cheia:
+        return
+    with _lock_pre_carga:
+        if offset in _PRE_CARGAS_EM_ANDAMENTO:
+            return
+        _PRE_CARGAS_EM_ANDAMENTO.add(offset)
+    _POOL_PRE_CARGA.submit(_carregar_pagina_mais_vendidos, offset)
+
+
+def _buscar_mais_produtos(
+    last_search_type: Optional[str], last_search_params: Dict, current_offset: int
+) -> Tuple[List[Dict], str]:
+    """Busca a próxima página de produtos da última busca realizada.
+
+    Compartilhado pela ferramenta "show_more_products" e pela detecção de
+    "mais produtos" na conversa casual.
+
+    Args:
+        last_search_type: Tipo da última busca (mais vendidos, por nome ou inteligente).
+        last_search_params: Parâmetros da última busca.
+        current_offset: Deslocamento atual da paginação.
+
+    Returns:
+        Uma tupla com a lista de produtos encontrados e o título da lista.
+    """
+    if last_search_type in ["top_selling", "mais_vendidos"]:
+        products = database.obter_produtos_mais_vendidos(limite=10, offset=current_offset)
+        _pre_carregar_mais_vendidos(current_offset + len(products), len(products) == 10)
+        return products, "Mostrando mais produtos populares:"
+
+    if last_search_type in ["by_name", "busca_por_nome"]:
+        nome_produto = last_search_params.get("product_name", "") or last_search_params.get("nome_produto", "")
+        products = database.obter_produtos_mais_vendidos_por_nome(
+            nome_produto, limite=10, offset=current_offset
+        )
+        return products, f"Mostrando mais produtos relacionados a '{nome_produto}':"
+
+    if last_search_type == "busca_inteligente":
+        # 🆕 SUPORTE PARA BUSCA INTELIGENTE COM "MAIS"
+        search_term = last_search_params.get("termo_busca", "")
+        category = last_search_params.get("categoria", "")
+        marca_priorizada = last_search_params.get("marca_priorizada")
+
+        app_logger.debug("[MAIS_SMART] Continuando busca inteligente - termo: '%s', categoria: '%s', marca: '%s'", search_term, category, marca_priorizada)
+
+        if marca_priorizada:
+            # Se tem marca específica, busca mais produtos dessa marca
+            search_result = pesquisar_produtos_com_sugestoes(marca_priorizada, limite=10, offset=current_offset)
+            products, title = search_result["products"], f"Mais produtos {marca_priorizada.title()}:"
+        elif category and category != "outros":
+            # Se tem categoria, busca mais produtos da categoria
+            products = database.obter_produtos_por_categoria(category, limite=10, offset=current_offset)
+            title = f"Mais produtos da categoria {category.title()}:"
+        else:
+            # Fallback: busca geral por termo
+            search_result = pesquisar_produtos_com_sugestoes(search_term, limite=10, offset=current_offset)
+            products, title = search_result["products"], f"Mais produtos relacionados a '{search_term}':"
+
+        app_logger.debug("[MAIS_SMART] Encontrados %s produtos", len(products))
+        return products, title
+
+    return [], ""
+
+
+def _responder(
+    session: Dict, texto: str, tipo_acao: str, proxima_acao: Union[str, None] = "AWAITING_MENU_SELECTION"
+) -> Tuple[str, List, Union[str, None]]:
+    """Registra a resposta no histórico e devolve o estado de fim de turno mais comum.
+
+    Args:
+        session: Os dados da sessão.
+        texto: O texto da resposta.
+        tipo_acao: O tipo de ação registrado no histórico.
+        proxima_acao: O próximo last_bot_action.
+
+    Returns:
+        Uma tupla (response_text, last_shown_products, last_bot_action).
+    """
+    adicionar_mensagem_historico(session, "assistant", texto, tipo_acao)
+    return texto, [], proxima_acao
+
+
+def _ferramenta_limpar_carrinho(session: Dict, state: Dict) -> str:
+    """Esvazia o carrinho do estado (clear() no lugar) e volta ao menu.
+
+    Args:
+        session: Os dados da sessão.
+        state: O estado do turno, atualizado no lugar.
+
+    Returns:
+        O texto da resposta.
+    """
+    app_logger.debug("Executando limpeza completa do carrinho...")
+    message, _ = limpar_carrinho_completamente(state["shopping_cart"])
+    response_text, state["last_shown_products"], state["last_bot_action"] = _responder(
+        session, message, "CLEAR_CART"
+    )
+    state["pending_action"] = None
+    app_logger.debug("Carrinho limpo. Resposta: %s", response_text)
+    return response_text
+
+
+def _ferramenta_visualizar_carrinho(session: Dict, state: Dict) -> str:
+    """Exibe o carrinho e passa a aguardar a confirmação do checkout.
+
+    Args:
+        session: Os dados da sessão.
+        state: O estado do turno, atualizado no lugar.
+
+    Returns:
+        O texto da resposta.
+    """
+    response_text, state["last_shown_products"], state["last_bot_action"] = _responder(
+        session,
+        formatar_carrinho_para_exibicao(state["shopping_cart"]),
+        "SHOW_CART",
+        "AWAITING_CHECKOUT_CONFIRMATION",
+    )
+    state["confirmation_requested_at"] = time.time()
+    return response_text
+
+
+def _ferramenta_iniciar_novo_pedido(session: Dict, state: Dict) -> str:
+    """Zera a sessão e o estado do turno para um novo pedido.
+
+    Args:
+        session: Os dados da sessão.
+        state: O estado do turno, atualizado no lugar.
+
+    Returns:
+        O texto da resposta.
+    """
+    session.clear()
+    session.update(
+        _ESTADO_NOVO_PEDIDO,
+        shopping_cart=[],
+        last_search_params={},
+        last_shown_products=[],
+    )
+    state.update(zip(_STATE_FIELDS, _unpack_state(session)))
+    adicionar_mensagem_historico(session, "assistant", _MSG_NOVO_PEDIDO, "NEW_ORDER")
+    return _MSG_NOVO_PEDIDO
+
 
-    return intent, response_text
+def _ferramenta_perguntar_continuar_ou_finalizar(session: Dict, state: Dict) -> str:
+    """Pergunta se o cliente quer continuar comprando ou fechar o pedido.
 
-def _processar_pedido_complexo(session: Dict, state: Dict, pedidos_complexos: List[Dict]) -> str:
-    """
-    Processa pedidos complexos com múltiplos itens usando IA-FIRST.
-    
     Args:
-        session: Dados da sessão.
-        state: Estado atual.
-        pedidos_complexos: Lista de pedidos extraídos pela IA.
-    
+        session: Os dados da sessão.
+        state: O estado do turno, atualizado no lugar.
+
     Returns:
-        str: Resposta formatada para o usuário.
+        O texto da resposta.
     """
-    shopping_cart = state.get("shopping_cart", [])
-    itens_adicionados = []
-    itens_nao_encontrados = []
-    
-    for pedido in pedidos_complexos:
-        produto_nome = pedido.get("produto", "")
-        quantidade = pedido.get("quantidade", 1)
-        
-        # Busca o produto no banco
-        search_result = pesquisar_produtos_com_sugestoes(produto_nome, limite=1)
-        
-        if search_result["products"]:
-            produto = search_result["products"][0]
-            produto["qt"] = quantidade
-            shopping_cart.append(produto)
-            itens_adicionados.append(f"{quantidade}x {produto.get('descricao', produto_nome)}")
-            
-            # Adiciona ao histórico
-            adicionar_mensagem_historico(
-                session, "assistant", 
-                f"Adicionado: {quantidade}x {produto.get('descricao', produto_nome)}", 
-                "ADD_TO_CART_COMPLEX"
-            )
-        else:
-            itens_nao_encontrados.append(f"{quantidade}x {produto_nome}")
-    
-    # Atualiza o estado
-    state["shopping_cart"] = shopping_cart
-    state["last_bot_action"] = "COMPLEX_ORDER_PROCESSED"
-    
-    # Gera resposta
-    if itens_adicionados:
-        resposta = f"✅ Adicionei ao carrinho:\n" + "\n".join([f"• {item}" for item in itens_adicionados])
-        
-        if itens_nao_encontrados:
-            resposta += f"\n\n❌ Não encontrei:\n" + "\n".join([f"• {item}" for item in itens_nao_encontrados])
-        
-        resposta += f"\n\n🛒 Carrinho com {len(shopping_cart)} itens"
-        resposta += f"\n\n{formatar_acoes_rapidas(tem_carrinho=True)}"
+    shopping_cart = state["shopping_cart"]
+    if shopping_cart:
+        texto, tipo_acao = gerar_mensagem_continuar_ou_finalizar(shopping_cart), "ASK_CONTINUE_OR_CHECKOUT"
     else:
-        resposta = "😕 Não consegui encontrar nenhum dos produtos mencionados. Pode tentar com nomes mais específicos?"
-        resposta += f"\n\n{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}"
-    
-    return resposta
+        texto, tipo_acao = _MSG_CARRINHO_VAZIO_CONTINUAR, "EMPTY_CART"
+    response_text, state["last_shown_products"], state["last_bot_action"] = _responder(
+        session, texto, tipo_acao
+    )
+    return response_text
+
+
+# Ferramentas que só mexem no carrinho/sessão: despachadas por tabela em _route_tool
+_FERRAMENTAS_CARRINHO = {
+    "limpar_carrinho": _ferramenta_limpar_carrinho,
+    "visualizar_carrinho": _ferramenta_visualizar_carrinho,
+    "iniciar_novo_pedido": _ferramenta_iniciar_novo_pedido,
+    "perguntar_continuar_ou_finalizar": _ferramenta_perguntar_continuar_ou_finalizar,
+}
+# Nomes alternativos que a IA pode devolver (os demais já são o nome canônico)
+_ALIASES_FERRAMENTAS = {
+    "busca_inteligente_com_promocoes": "smart_search_with_promotions",
+    "lidar_conversa": "lidar_com_conversa_casual",
+}
+_FERRAMENTAS_BANCO = frozenset((
+    "obter_produtos_mais_vendidos",
+    "obter_produtos_mais_vendidos_by_name",
+    "show_more_products",
+    "report_incorrect_product",
+    "get_product_by_codprod",
+))
+
 
 def _route_tool(session: Dict, state: Dict, intent: Dict, sender_phone: str, incoming_msg: str = "") -> str:
     """Executa a ferramenta baseada na intenção identificada com IA-FIRST."""
-    customer_context = state.get("customer_context")
-    shopping_cart = state.get("shopping_cart", [])
-    last_search_type = state.get("last_search_type")
-    last_search_params = state.get("last_search_params", {})
-    current_offset = state.get("current_offset", 0)
-    last_shown_products = state.get("last_shown_products", [])
-    last_bot_action = state.get("last_bot_action")
-    pending_action = state.get("pending_action")
-    last_kb_search_term = state.get("last_kb_search_term")
-    confirmation_requested_at = state.get("confirmation_requested_at")
+    # O estado vem sempre de _extract_state, que já preenche todos os campos
+    (
+        customer_context,
+        shopping_cart,
+        last_search_type,
+        last_search_params,
+        current_offset,
+        last_shown_products,
+        last_bot_action,
+        pending_action,
+        last_kb_search_term,
+        confirmation_requested_at,
+    ) = _unpack_state(state)
     
     # 🆕 IA-FIRST: Detecta pedidos complexos (múltiplos produtos)
     mensagem_usuario = intent.get("mensagem_usuario", "")
-    if mensagem_usuario and any(sep in mensagem_usuario.lower() for sep in [" e ", ",", " mais ", " também "]):
+    mensagem_minuscula = mensagem_usuario.lower() if mensagem_usuario else ""
+    if mensagem_minuscula and any(sep in mensagem_minuscula for sep in _SEPARADORES_PEDIDO_COMPLEXO):
         conversation_context = obter_contexto_conversa(session)
         pedidos_complexos = processar_pedido_complexo_ia(mensagem_usuario, conversation_context)
         
         if len(pedidos_complexos) > 1:
-            print(f">>> CONSOLE: [IA-FIRST] Detectado pedido complexo com {len(pedidos_complexos)} itens")
+            app_logger.debug("[IA-FIRST] Detectado pedido complexo com %s itens", len(pedidos_complexos))
             return _processar_pedido_complexo(session, state, pedidos_complexos)
     
     # 🆕 IA-FIRST: Análise contextual emocional
@@ -1161,33 +1588,19 @@ def _route_tool(session: Dict, state: Dict, intent: Dict, sender_phone: str, inc
     analise_emocional = analisar_contexto_emocional_ia(mensagem_usuario, conversation_context)
     
     if analise_emocional.get("urgencia") == "urgente":
-        print(f">>> CONSOLE: [IA-FIRST] Cliente com urgência detectada")
+        app_logger.debug("[IA-FIRST] Cliente com urgência detectada")
         # Pode priorizar respostas mais rápidas ou sugerir produtos populares
     
     if analise_emocional.get("sentimento") in ["frustrado", "negativo"]:
-        print(f">>> CONSOLE: [IA-FIRST] Cliente frustrado - priorizando melhor experiência")
+        app_logger.debug("[IA-FIRST] Cliente frustrado - priorizando melhor experiência")
         # Pode ativar modo de assistência especial
 
     response_text = ""
     tool_name = intent.get("nome_ferramenta", intent.get("nome_ferramenta"))  # Suporta ambos os formatos
     parameters = intent.get("parametros", intent.get("parametros", {}))  # Suporta ambos os formatos
     
-    # Mapeamento de nomes em português para inglês (para compatibilidade)
-    nome_para_ingles = {
-        "busca_inteligente_com_promocoes": "smart_search_with_promotions",
-        "obter_produtos_mais_vendidos_por_nome": "obter_produtos_mais_vendidos_por_nome",
-        "atualizacao_inteligente_carrinho": "atualizacao_inteligente_carrinho",
-        "visualizar_carrinho": "visualizar_carrinho",
-        "limpar_carrinho": "limpar_carrinho",
-        "adicionar_item_ao_carrinho": "adicionar_item_ao_carrinho",
-        "selecionar_item_para_atualizacao": "selecionar_item_para_atualizacao",
-        "finalizar_pedido": "finalizar_pedido",
-        "lidar_conversa": "lidar_com_conversa_casual"
-    }
-    
     # Converte nome em português para inglês se necessário
-    if tool_name in nome_para_ingles:
-        tool_name = nome_para_ingles[tool_name]
+    tool_name = _ALIASES_FERRAMENTAS.get(tool_name, tool_name)
     
     # Mapeamento de parâmetros em português para inglês
     if "termo_busca" in parameters:
@@ -1203,58 +1616,40 @@ def _route_tool(session: Dict, state: Dict, intent: Dict, sender_phone: str, inc
     if "texto_resposta" in parameters:
         parameters["response_text"] = parameters["texto_resposta"]
 
-    db_intensive_tools = [
-        "obter_produtos_mais_vendidos",
-        "obter_produtos_mais_vendidos_by_name",
-        "show_more_products",
-        "report_incorrect_product",
-        "get_product_by_codprod",
-    ]
-    if tool_name in db_intensive_tools:
-        print(f">>> CONSOLE: Acessando o Banco de Dados (ferramenta: {tool_name})...")
-
-    # 🆕 NOVA FERRAMENTA: limpar_carrinho
-    if tool_name == "limpar_carrinho":
-        print(">>> CONSOLE: Executando limpeza completa do carrinho...")
-        message, empty_cart = limpar_carrinho_completamente(shopping_cart)
-        shopping_cart.clear()  # Garante que o carrinho está vazio
-        
-        response_text = message
-        adicionar_mensagem_historico(session, "assistant", response_text, "CLEAR_CART")
-        
-        # Atualiza estado
-        last_shown_products = []
-        last_bot_action = "AWAITING_MENU_SELECTION"
-        pending_action = None
-        
-        print(f">>> CONSOLE: Carrinho limpo. Resposta: {response_text}")
+    if tool_name in _FERRAMENTAS_BANCO:
+        app_logger.debug("Acessando o Banco de Dados (ferramenta: %s)...", tool_name)
+
+    # Ferramentas só de carrinho: despacho direto, sem percorrer a cadeia abaixo
+    ferramenta_carrinho = _FERRAMENTAS_CARRINHO.get(tool_name)
+    if ferramenta_carrinho is not None:
+        return ferramenta_carrinho(session, state)
 
     # ETAPA 4: Implementação da nova ferramenta de busca inteligente
-    elif tool_name == "smart_search_with_promotions":
+    if tool_name == "smart_search_with_promotions":
         # Aceita tanto search_term quanto category como parâmetro
         search_term = parameters.get("search_term", "") or parameters.get("category", "") or parameters.get("termo_busca", "")
         
         # 🆕 OTIMIZA TERMO DE BUSCA COM IA
-        print(f">>> CONSOLE: Otimizando termo de busca '{search_term}' com IA...")
+        app_logger.debug("Otimizando termo de busca '%s' com IA...", search_term)
         historico_conversa = obter_contexto_conversa(session)
         analise_marca = detectar_marca_e_produto_ia(search_term, historico_conversa)
         
-        print(f">>> DEBUG: [ANALISE_MARCA] Resultado completo: {analise_marca}")
+        app_logger.debug("[ANALISE_MARCA] Resultado completo: %s", analise_marca)
         
         if analise_marca and analise_marca.get("tipo_busca"):
             termo_otimizado = gerar_busca_otimizada(analise_marca)
             if termo_otimizado and termo_otimizado != search_term:
-                print(f">>> CONSOLE: Termo otimizado: '{search_term}' → '{termo_otimizado}'")
+                app_logger.debug("Termo otimizado: '%s' → '%s'", search_term, termo_otimizado)
                 search_term = termo_otimizado
         
-        print(f">>> CONSOLE: Executando busca inteligente para '{search_term}'...")
+        app_logger.debug("Executando busca inteligente para '%s'...", search_term)
 
         # 🆕 DETECTAR SE É BUSCA GERAL POR PROMOÇÕES
         promo_keywords = ['promoção', 'promoções', 'oferta', 'ofertas', 'desconto', 'descontos', 'barato']
         is_general_promo_search = any(keyword in search_term.lower() for keyword in promo_keywords)
         
         if is_general_promo_search:
-            print(">>> CONSOLE: Detectada busca geral por promoções - buscando promoções mais baratas")
+            app_logger.debug("Detectada busca geral por promoções - buscando promoções mais baratas")
             
             # Busca os 10 produtos mais baratos em promoção
             cheapest_promos = database.obter_promocoes_mais_baratas(limite=10)
@@ -1293,7 +1688,8 @@ def _route_tool(session: Dict, state: Dict, intent: Dict, sender_phone: str, inc
         
         else:
             # 🆕 DETECTAR SE É BUSCA POR CATEGORIA + PROMOÇÃO (ex: "cerveja em promoção")
-            is_category_promo_search = any(keyword in search_term.lower() for keyword in ['em promoção', 'promocional', 'promocionais'])
+            termo_minusculo = search_term.lower()
+            is_category_promo_search = any(keyword in termo_minusculo for keyword in _TRECHOS_BUSCA_PROMOCAO)
             
             # 1. Classificar a categoria COM CONTEXTO IA-FIRST
             conversation_context = obter_contexto_conversa(session)
@@ -1301,14 +1697,13 @@ def _route_tool(session: Dict, state: Dict, intent: Dict, sender_phone: str, inc
             
             # 🆕 2. REUTILIZAR ANÁLISE DE MARCA JÁ FEITA (evita confusão com termo otimizado)
             # analise_marca já foi feita corretamente nas linhas 1053-1059 acima
-            print(f">>> CONSOLE: [IA-MARCA] Análise: {analise_marca.get('tipo_busca')} - Marca: {analise_marca.get('marca')}")
+            app_logger.debug("[IA-MARCA] Análise: %s - Marca: %s", analise_marca.get('tipo_busca'), analise_marca.get('marca'))
             
             # 🆕 MAPEAMENTO IA-FIRST DE CATEGORIAS
             def _mapear_categoria_com_ia(termo_busca: str, categoria_ia: str) -> str:
                 """Usa IA para mapear categoria semântica para categoria específica do banco."""
                 try:
                     import ollama
-                    import os
                     prompt_mapeamento = f"""Mapeie a categoria semântica para a categoria específica do banco de dados:
 
 TERMO DE BUSCA: "{termo_busca}"
@@ -1357,16 +1752,16 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     return categoria_ia.upper()
             
             category = _mapear_categoria_com_ia(search_term, category_raw)
-            print(f">>> CONSOLE: [IA-FIRST] '{search_term}' ({category_raw}) → categoria: '{category}'")
+            app_logger.debug("[IA-FIRST] '%s' (%s) → categoria: '%s'", search_term, category_raw, category)
 
             # 2. Se a categoria for 'outros', usar a busca por nome como fallback
             if category == "outros":
-                print(">>> CONSOLE: Categoria 'outros', usando busca por nome como fallback.")
+                app_logger.debug("Categoria 'outros', usando busca por nome como fallback.")
                 # Executa busca por nome diretamente
                 product_name = search_term
                 
                 # Primeiro tenta a Knowledge Base
-                print(f">>> CONSOLE: Buscando '{product_name}' na Knowledge Base...")
+                app_logger.debug("Buscando '%s' na Knowledge Base...", product_name)
                 kb_result, kb_analysis = knowledge.encontrar_produto_na_kb_com_analise(product_name)
                 last_search_params = {"product_name": product_name}
                 last_search_type = "by_name"
@@ -1374,7 +1769,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                 if kb_result and kb_analysis["quality"] in ["excellent", "good"]:
                     # Knowledge Base encontrou produtos de qualidade
                     current_offset, last_shown_products = 0, kb_result
-                    print(f">>> CONSOLE: KB encontrou {len(last_shown_products)} produtos (qualidade: {kb_analysis['quality']})")
+                    app_logger.debug("KB encontrou %s produtos (qualidade: %s)", len(last_shown_products), kb_analysis['quality'])
                     
                     title = f"🎯 Encontrei para '{product_name}':"
                     response_text = formatar_lista_produtos_para_exibicao(
@@ -1394,7 +1789,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     
                 else:
                     # KB não encontrou ou qualidade baixa - busca no banco
-                    print(f">>> CONSOLE: KB qualidade baixa, buscando no banco...")
+                    app_logger.debug("KB qualidade baixa, buscando no banco...")
                     current_offset, last_shown_products = 0, []
                     
                     search_result = pesquisar_produtos_com_sugestoes(product_name, limite=10, offset=current_offset)
@@ -1404,7 +1799,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     if products:
                         current_offset += len(products)
                         last_shown_products.extend(products)
-                        print(f">>> DEBUG: [INICIAL_SEARCH] Incrementou offset com {len(products)} produtos, novo offset: {current_offset}")
+                        app_logger.debug("[INICIAL_SEARCH] Incrementou offset com %s produtos, novo offset: %s", len(products), current_offset)
                         
                         title = f"🔍 Encontrei produtos relacionados a '{product_name}':"
                         response_text = formatar_lista_produtos_para_exibicao(products, title, len(products) == 10, 0)
@@ -1432,7 +1827,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
             
             elif is_category_promo_search:
                 # 3. APENAS produtos promocionais da categoria
-                print(f">>> CONSOLE: Busca por promoções na categoria '{category}'")
+                app_logger.debug("Busca por promoções na categoria '%s'", category)
                 promo_products = database.obter_produtos_promocionais_por_categoria(category, limite=10)
                 
                 if not promo_products:
@@ -1465,7 +1860,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     
             else:
                 # 4. Buscar produtos normais + seção de promocionais da categoria
-                print(f">>> CONSOLE: Busca normal na categoria '{category}' com seção promocional")
+                app_logger.debug("Busca normal na categoria '%s' com seção promocional", category)
                 
                 # 🆕 BUSCA INTELIGENTE: Se busca marca específica, prioriza essa marca na consulta
                 marca_priorizada = None
@@ -1474,71 +1869,71 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                 if analise_marca.get("tipo_busca") == "marca_especifica" and analise_marca.get("marca"):
                     marca_priorizada = analise_marca.get("marca")
                     limite_busca = 25  # Aumenta limite para ter mais variedade
-                    print(f">>> CONSOLE: [IA-MARCA] Priorizando marca '{marca_priorizada}' na busca")
+                    app_logger.debug("[IA-MARCA] Priorizando marca '%s' na busca", marca_priorizada)
                 
-                print(f">>> CONSOLE: Limite de busca: {limite_busca} (marca priorizada: {marca_priorizada})")
+                app_logger.debug("Limite de busca: %s (marca priorizada: %s)", limite_busca, marca_priorizada)
                 
                 normal_products = database.obter_produtos_por_categoria(category, limite=limite_busca, marca_priorizada=marca_priorizada)
                 promo_products = database.obter_produtos_promocionais_por_categoria(category, limite=10)
                 
-                print(f">>> DEBUG: [BUSCA_DB] Categoria '{category}' retornou {len(normal_products)} produtos normais")
-                print(f">>> DEBUG: [BUSCA_DB] Categoria '{category}' retornou {len(promo_products)} produtos promocionais")
+                app_logger.debug("[BUSCA_DB] Categoria '%s' retornou %s produtos normais", category, len(normal_products))
+                app_logger.debug("[BUSCA_DB] Categoria '%s' retornou %s produtos promocionais", category, len(promo_products))
                 
                 # Log completo dos produtos encontrados
                 for i, p in enumerate(normal_products):
-                    print(f">>> DEBUG: [NORMAL_{i+1}] {p.get('descricao')} | Marca: {p.get('marca')} | Preço: R$ {p.get('pvenda', p.get('preco_varejo'))}")
+                    app_logger.debug("[NORMAL_%s] %s | Marca: %s | Preço: R$ %s", i+1, p.get('descricao'), p.get('marca'), p.get('pvenda', p.get('preco_varejo')))
                 
                 for i, p in enumerate(promo_products):
-                    print(f">>> DEBUG: [PROMO_{i+1}] {p.get('descricao')} | Marca: {p.get('marca')} | Preço: R$ {p.get('preco_promocional', p.get('preco_atual'))}")
+                    app_logger.debug("[PROMO_%s] %s | Marca: %s | Preço: R$ %s", i+1, p.get('descricao'), p.get('marca'), p.get('preco_promocional', p.get('preco_atual')))
                 
                 
                 # 🆕 5. FILTRAR POR MARCA ESPECÍFICA SE DETECTADA
                 if analise_marca.get("tipo_busca") == "marca_especifica" and analise_marca.get("marca"):
                     marca_desejada = analise_marca.get("marca")
-                    print(f">>> CONSOLE: [IA-MARCA] Filtrando produtos pela marca '{marca_desejada}'")
-                    print(f">>> DEBUG: [FILTRO] Antes do filtro - normais: {len(normal_products)}, promocionais: {len(promo_products)}")
+                    app_logger.debug("[IA-MARCA] Filtrando produtos pela marca '%s'", marca_desejada)
+                    app_logger.debug("[FILTRO] Antes do filtro - normais: %s, promocionais: %s", len(normal_products), len(promo_products))
                     
                     # Filtra produtos normais e promocionais pela marca
                     normal_products_filtrados = filtrar_produtos_por_marca(normal_products, marca_desejada)
                     promo_products_filtrados = filtrar_produtos_por_marca(promo_products, marca_desejada)
                     
-                    print(f">>> DEBUG: [FILTRO] Depois do filtro - normais: {len(normal_products_filtrados)}, promocionais: {len(promo_products_filtrados)}")
+                    app_logger.debug("[FILTRO] Depois do filtro - normais: %s, promocionais: %s", len(normal_products_filtrados), len(promo_products_filtrados))
                     
                     # Debug detalhado dos produtos FILTRADOS
-                    print(f">>> DEBUG: [FILTRADOS_NORMAIS] Produtos normais da marca '{marca_desejada}':")
+                    app_logger.debug("[FILTRADOS_NORMAIS] Produtos normais da marca '%s':", marca_desejada)
                     for i, p in enumerate(normal_products_filtrados):
-                        print(f">>> DEBUG: [FILTRADO_NORMAL_{i+1}] {p.get('descricao')} | Marca: {p.get('marca')} | Preço: R$ {p.get('pvenda', p.get('preco_varejo'))}")
+                        app_logger.debug("[FILTRADO_NORMAL_%s] %s | Marca: %s | Preço: R$ %s", i+1, p.get('descricao'), p.get('marca'), p.get('pvenda', p.get('preco_varejo')))
                     
-                    print(f">>> DEBUG: [FILTRADOS_PROMO] Produtos promocionais da marca '{marca_desejada}':")
+                    app_logger.debug("[FILTRADOS_PROMO] Produtos promocionais da marca '%s':", marca_desejada)
                     for i, p in enumerate(promo_products_filtrados):
-                        print(f">>> DEBUG: [FILTRADO_PROMO_{i+1}] {p.get('descricao')} | Marca: {p.get('marca')} | Preço: R$ {p.get('preco_promocional', p.get('preco_atual'))}")
+                        app_logger.debug("[FILTRADO_PROMO_%s] %s | Marca: %s | Preço: R$ %s", i+1, p.get('descricao'), p.get('marca'), p.get('preco_promocional', p.get('preco_atual')))
                     
                     # 🆕 MELHORIA: Se marca não foi encontrada nos normais, busca diretamente por nome
                     if not normal_products_filtrados and not promo_products_filtrados:
-                        print(f">>> CONSOLE: [IA-MARCA] Marca '{marca_desejada}' não encontrada na categoria, buscando por nome específico...")
+                        app_logger.debug("[IA-MARCA] Marca '%s' não encontrada na categoria, buscando por nome específico...", marca_desejada)
                         # Busca direta por nome da marca
                         search_result = pesquisar_produtos_com_sugestoes(marca_desejada, limite=10)
                         marca_products = search_result["products"]
                         
-                        print(f">>> DEBUG: [BUSCA_DIRETA] Busca por '{marca_desejada}' retornou {len(marca_products)} produtos")
+                        app_logger.debug("[BUSCA_DIRETA] Busca por '%s' retornou %s produtos", marca_desejada, len(marca_products))
                         for i, p in enumerate(marca_products):
-                            print(f">>> DEBUG: [BUSCA_DIRETA_{i+1}] {p.get('descricao')} | Marca: {p.get('marca')} | Preço: R$ {p.get('pvenda', p.get('preco_varejo'))}")
+                            app_logger.debug("[BUSCA_DIRETA_%s] %s | Marca: %s | Preço: R$ %s", i+1, p.get('descricao'), p.get('marca'), p.get('pvenda', p.get('preco_varejo')))
                         
                         if marca_products:
                             # Busca produtos da marca em ambas as tabelas
                             marca_em_promo = database.obter_produtos_promocionais_por_termo(marca_desejada, limite=10)
                             marca_normais = [p for p in marca_products if p['codprod'] not in {pr['codprod'] for pr in marca_em_promo}]
                             
-                            print(f">>> DEBUG: [SEPARACAO] {len(marca_normais)} produtos normais + {len(marca_em_promo)} promocionais após separação")
+                            app_logger.debug("[SEPARACAO] %s produtos normais + %s promocionais após separação", len(marca_normais), len(marca_em_promo))
                             
                             normal_products = marca_normais
                             promo_products = marca_em_promo
-                            print(f">>> CONSOLE: [IA-MARCA] Busca direta encontrou {len(marca_normais)} normais + {len(marca_em_promo)} promoções da marca '{marca_desejada}'")
+                            app_logger.debug("[IA-MARCA] Busca direta encontrou %s normais + %s promoções da marca '%s'", len(marca_normais), len(marca_em_promo), marca_desejada)
                     else:
                         # Usa produtos filtrados da categoria
                         normal_products = normal_products_filtrados
                         promo_products = promo_products_filtrados
-                        print(f">>> CONSOLE: [IA-MARCA] Filtro categoria encontrou {len(normal_products)} normais + {len(promo_products)} promoções da marca '{marca_desejada}'")
+                        app_logger.debug("[IA-MARCA] Filtro categoria encontrou %s normais + %s promoções da marca '%s'", len(normal_products), len(promo_products), marca_desejada)
 
                 # 5. Combinar e formatar a lista
                 if not normal_products and not promo_products:
@@ -1602,7 +1997,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                         ]
                         
                         if outras_promocoes_filtradas:
-                            print(f">>> CONSOLE: [IA-MARCA] Adicionando {len(outras_promocoes_filtradas)} outras promoções da categoria '{category}'")
+                            app_logger.debug("[IA-MARCA] Adicionando %s outras promoções da categoria '%s'", len(outras_promocoes_filtradas), category)
                             # Adiciona as outras promoções à lista de produtos selecionáveis
                             outras_promocoes_processadas = []
                             for promo in outras_promocoes_filtradas[:3]:
@@ -1647,7 +2042,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     last_search_type = tipo_ultima_busca
                     last_search_params = parametros_ultima_busca
                     
-                    print(f">>> DEBUG: [SALVAR_BUSCA] Salvando busca inteligente - tipo: {last_search_type}, params: {last_search_params}")
+                    app_logger.debug("[SALVAR_BUSCA] Salvando busca inteligente - tipo: %s, params: %s", last_search_type, last_search_params)
                     
                     # 🔧 ATUALIZA TAMBÉM AS VARIÁVEIS LOCAIS PARA SEREM SALVAS NO FINAL
                     last_shown_products = state["last_shown_products"]  # Atualiza variável local
@@ -1656,7 +2051,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     adicionar_mensagem_historico(session, "assistant", response_text, "SHOW_SMART_SEARCH_RESULTS")
                     
                     # 📝 LOG DA RESPOSTA DO BOT PARA ANÁLISE
-                    print(f">>> BOT_RESPONSE: {response_text[:200]}..." if len(response_text) > 200 else f">>> BOT_RESPONSE: {response_text}")
+                    app_logger.debug("BOT_RESPONSE: %.200s", response_text)
 
     elif tool_name in ["obter_produtos_mais_vendidos", "obter_produtos_mais_vendidos_by_name", "obter_produtos_mais_vendidos_por_nome"]:
         last_kb_search_term, last_shown_products = None, []
@@ -1665,16 +2060,16 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
             nome_produto = parameters.get("product_name", "") or parameters.get("nome_produto", "")
 
             # 🆕 EXTRAI ESPECIFICAÇÕES DO PRODUTO COM IA
-            print(f">>> CONSOLE: Extraindo especificações de '{nome_produto}' com IA...")
+            app_logger.debug("Extraindo especificações de '%s' com IA...", nome_produto)
             especificacoes = extrair_especificacoes_produto_ia(nome_produto)
             
             if especificacoes.get("enhanced_search_term"):
                 nome_produto_otimizado = especificacoes["enhanced_search_term"]
-                print(f">>> CONSOLE: Termo otimizado: '{nome_produto}' → '{nome_produto_otimizado}'")
+                app_logger.debug("Termo otimizado: '%s' → '%s'", nome_produto, nome_produto_otimizado)
                 nome_produto = nome_produto_otimizado
 
             # 🆕 BUSCA FUZZY INTELIGENTE
-            print(f">>> CONSOLE: Buscando '{nome_produto}' com sistema fuzzy...")
+            app_logger.debug("Buscando '%s' com sistema fuzzy...", nome_produto)
 
             # Etapa 1: Tenta Knowledge Base com análise
             produtos_kb, analise_kb = encontrar_produto_na_kb_com_analise(nome_produto)
@@ -1701,14 +2096,14 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     session, "assistant", texto_resposta, "SHOW_PRODUCTS_FROM_KB"
                 )
 
-                print(
-                    f">>> CONSOLE: KB encontrou {len(produtos_exibidos_ultima_busca)} produtos (qualidade: {analise_kb['quality']})"
+                app_logger.debug(
+                    "KB encontrou %s produtos (qualidade: %s)", len(produtos_exibidos_ultima_busca), analise_kb['quality']
                 )
 
             else:
                 # Knowledge Base não encontrou ou qualidade baixa - busca no banco com fuzzy
-                print(
-                    f">>> CONSOLE: KB qualidade baixa ({analise_kb.get('quality', 'none')}), buscando no banco..."
+                app_logger.debug(
+                    "KB qualidade baixa (%s), buscando no banco...", analise_kb.get('quality', 'none')
                 )
 
                 deslocamento_atual, produtos_exibidos_ultima_busca = 0, []
@@ -1727,7 +2122,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                 if produtos:
                     deslocamento_atual += len(produtos)
                     produtos_exibidos_ultima_busca.extend(produtos)
-                    print(f">>> DEBUG: [BY_NAME_SEARCH] Incrementou offset com {len(produtos)} produtos, novo offset: {deslocamento_atual}")
+                    app_logger.debug("[BY_NAME_SEARCH] Incrementou offset com %s produtos, novo offset: %s", len(produtos), deslocamento_atual)
 
                     # Determina emoji baseado na qualidade
                     if len(produtos) >= 3:
@@ -1761,12 +2156,12 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
 
                 else:
                     # Nenhum produto encontrado - usa IA para correção e sugestões
-                    print(
-                        f">>> CONSOLE: Nenhum produto encontrado para '{nome_produto}'"
+                    app_logger.debug(
+                        "Nenhum produto encontrado para '%s'", nome_produto
                     )
 
                     # 🆕 USA IA PARA CORRIGIR E SUGERIR
-                    print(">>> CONSOLE: Usando IA para corrigir e sugerir alternativas...")
+                    app_logger.debug("Usando IA para corrigir e sugerir alternativas...")
                     historico_conversa = obter_contexto_conversa(session)
                     correcoes_ia = corrigir_e_sugerir_ia(
                         nome_produto, 
@@ -1798,8 +2193,8 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                         session, "assistant", texto_resposta, "NO_PRODUCTS_FOUND"
                     )
 
-                print(
-                    f">>> CONSOLE: Banco encontrou {len(produtos)} produtos, {len(sugestoes)} sugestões"
+                app_logger.debug(
+                    "Banco encontrou %s produtos, %s sugestões", len(produtos), len(sugestoes)
                 )
 
         else:  # obter_produtos_mais_vendidos
@@ -1808,8 +2203,9 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
             produtos = database.obter_produtos_mais_vendidos(limite=10, offset=deslocamento_atual)
             titulo = "⭐ Estes são nossos produtos mais populares:"
             deslocamento_atual += len(produtos)
+            _pre_carregar_mais_vendidos(deslocamento_atual, len(produtos) == 10)
             produtos_exibidos_ultima_busca.extend(produtos)
-            print(f">>> DEBUG: [TOP_SELLING_SEARCH] Incrementou offset com {len(produtos)} produtos, novo offset: {deslocamento_atual}")
+            app_logger.debug("[TOP_SELLING_SEARCH] Incrementou offset com %s produtos, novo offset: %s", len(produtos), deslocamento_atual)
             texto_resposta = formatar_lista_produtos_para_exibicao(
                 produtos, titulo, len(produtos) == 10, 0
             )
@@ -1856,15 +2252,9 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
         if not product_to_add and "product_name" in parameters:
             # 🆕 USA BUSCA FUZZY PARA NOME DO PRODUTO
             product_name = parameters["product_name"]
-            print(f">>> CONSOLE: Buscando produto direto por nome: '{product_name}'")
-
-            product_to_add = obter_detalhes_produto_fuzzy(product_name)
+            app_logger.debug("Buscando produto direto por nome: '%s'", product_name)
 
-            if not product_to_add:
-                # Tenta busca mais ampla
-                search_result = pesquisar_produtos_com_sugestoes(product_name, limite=1)
-                if search_result["products"]:
-                    product_to_add = search_result["products"][0]
+            product_to_add = obter_melhor_produto_por_nome(product_name)
 
         if product_to_add:
             term_to_learn = None
@@ -1903,11 +2293,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
 
     elif tool_name == "atualizar_item_carrinho":
         acao = parameters.get("acao")
-        quantidade = parameters.get("quantidade", 1)
-        try:
-            quantidade = float(quantidade)
-        except (ValueError, TypeError):
-            quantidade = 1
+        quantidade = _normalizar_quantidade(parameters.get("quantidade", 1))
 
         indice = parameters.get("indice")
         nome_produto = parameters.get("nome_produto")
@@ -2019,7 +2405,6 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
             last_bot_action = "AWAITING_MENU_SELECTION"
             pending_action = None
         elif pending_action != "AWAITING_CART_ITEM_SELECTION":
-            from core.gerenciador_sessao import formatar_carrinho_para_exibicao
             response_text = (
                 f"🤖 Não encontrei esse item no carrinho.\n\n{formatar_carrinho_para_exibicao(shopping_cart)}\n\n"
                 f"{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}"
@@ -2040,48 +2425,11 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
             )
         else:
             offset_before_call = current_offset
-            products = []
-            title = ""
-            print(f">>> DEBUG: [MAIS_PRODUTOS] last_search_type: {last_search_type}")
-            print(f">>> DEBUG: [MAIS_PRODUTOS] last_search_params: {last_search_params}")
-            print(f">>> DEBUG: [MAIS_PRODUTOS] current_offset: {current_offset}")
+            app_logger.debug("[MAIS_PRODUTOS] last_search_type: %s", last_search_type)
+            app_logger.debug("[MAIS_PRODUTOS] last_search_params: %s", last_search_params)
+            app_logger.debug("[MAIS_PRODUTOS] current_offset: %s", current_offset)
             
-            if last_search_type in ["top_selling", "mais_vendidos"]:
-                products = database.obter_produtos_mais_vendidos(limite=10, offset=current_offset)
-                title = "Mostrando mais produtos populares:"
-            elif last_search_type in ["by_name", "busca_por_nome"]:
-                nome_produto = last_search_params.get("product_name", "") or last_search_params.get("nome_produto", "")
-                products = database.obter_produtos_mais_vendidos_por_nome(
-                    nome_produto, limite=10, offset=current_offset
-                )
-                title = f"Mostrando mais produtos relacionados a '{nome_produto}':"
-            elif last_search_type == "busca_inteligente":
-                # 🆕 SUPORTE PARA BUSCA INTELIGENTE COM "MAIS"
-                search_term = last_search_params.get("termo_busca", "")
-                category = last_search_params.get("categoria", "")
-                marca_priorizada = last_search_params.get("marca_priorizada")
-                
-                print(f">>> DEBUG: [MAIS_SMART] Continuando busca inteligente - termo: '{search_term}', categoria: '{category}', marca: '{marca_priorizada}'")
-                
-                if marca_priorizada:
-                    # Se tem marca específica, busca mais produtos dessa marca
-                    print(f">>> DEBUG: [MAIS_SMART] Buscando mais produtos da marca '{marca_priorizada}'")
-                    search_result = pesquisar_produtos_com_sugestoes(marca_priorizada, limite=10, offset=current_offset)
-                    products = search_result["products"]
-                    title = f"Mais produtos {marca_priorizada.title()}:"
-                elif category and category != "outros":
-                    # Se tem categoria, busca mais produtos da categoria
-                    print(f">>> DEBUG: [MAIS_SMART] Buscando mais produtos da categoria '{category}'")
-                    products = database.obter_produtos_por_categoria(category, limite=10, offset=current_offset)
-                    title = f"Mais produtos da categoria {category.title()}:"
-                else:
-                    # Fallback: busca geral por termo
-                    print(f">>> DEBUG: [MAIS_SMART] Busca geral por '{search_term}'")
-                    search_result = pesquisar_produtos_com_sugestoes(search_term, limite=10, offset=current_offset)
-                    products = search_result["products"]
-                    title = f"Mais produtos relacionados a '{search_term}':"
-                
-                print(f">>> DEBUG: [MAIS_SMART] Encontrados {len(products)} produtos")
+            products, title = _buscar_mais_produtos(last_search_type, last_search_params, current_offset)
 
             if not products:
                 response_text = (
@@ -2095,7 +2443,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                 # 🎯 CORRIGE: Incrementa offset com número real de produtos
                 current_offset += len(products)
                 last_shown_products.extend(products)
-                print(f">>> DEBUG: [MAIS_SMART] Incrementou offset com {len(products)} produtos, novo offset: {current_offset}")
+                app_logger.debug("[MAIS_SMART] Incrementou offset com %s produtos, novo offset: %s", len(products), current_offset)
                 response_text = formatar_lista_produtos_para_exibicao(
                     products, title, len(products) == 10, offset=offset_before_call
                 )
@@ -2104,59 +2452,17 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     session, "assistant", response_text, "SHOW_MORE_PRODUCTS"
                 )
 
-    elif tool_name == "visualizar_carrinho":
-        from core.gerenciador_sessao import formatar_carrinho_para_exibicao
-        response_text = formatar_carrinho_para_exibicao(shopping_cart)
-        adicionar_mensagem_historico(session, "assistant", response_text, "SHOW_CART")
-        last_shown_products = []
-        last_bot_action = "AWAITING_CHECKOUT_CONFIRMATION"
-        confirmation_requested_at = time.time()
-
-    elif tool_name == "iniciar_novo_pedido":
-        (
-            customer_context,
-            shopping_cart,
-            last_shown_products,
-            last_search_type,
-            last_search_params,
-            current_offset,
-            last_kb_search_term,
-        ) = (None, [], [], None, {}, 0, None)
-        pending_action = None
-        last_bot_action = None
-        confirmation_requested_at = None
-        session.clear()
-
-        atualizar_contexto_sessao(
-            session,
-            {
-                "shopping_cart": shopping_cart,
-                "pending_action": pending_action,
-                "last_bot_action": last_bot_action,
-            },
-        )
-        response_text = (
-            "🧹 Certo! Carrinho e dados limpos. Vamos começar de novo!\n\n"
-            f"{formatar_acoes_rapidas(tem_carrinho=False)}"
-        )
-
-        adicionar_mensagem_historico(session, "assistant", response_text, "NEW_ORDER")
-
     elif tool_name == "finalizar_pedido":
         # 🔍 VERIFICA SE CNPJ FOI FORNECIDO
         cnpj_fornecido = parameters.get("cnpj")
         
         if not shopping_cart:
-            response_text = (
-                "Seu carrinho tá vazio ainda! Bora escolher uns produtos legais?\n\n"
-                f"{formatar_acoes_rapidas(tem_carrinho=False)}"
+            response_text, last_shown_products, last_bot_action = _responder(
+                session, _MSG_CARRINHO_VAZIO_FINALIZAR, "EMPTY_CART"
             )
-            adicionar_mensagem_historico(session, "assistant", response_text, "EMPTY_CART")
-            last_shown_products = []
-            last_bot_action = "AWAITING_MENU_SELECTION"
         elif cnpj_fornecido:
             # 📋 PROCESSA CNPJ FORNECIDO
-            print(f">>> CONSOLE: Processando finalizar_pedido com CNPJ: {cnpj_fornecido}")
+            app_logger.debug("Processando finalizar_pedido com CNPJ: %s", cnpj_fornecido)
             
             # Aqui você pode adicionar validação de CNPJ se necessário
             # Por enquanto, aceita qualquer CNPJ válido em formato
@@ -2167,98 +2473,71 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
             }
             
             # Gera resumo de finalização
-            response_text = gerar_resumo_finalizacao(shopping_cart, customer_context)
-            adicionar_mensagem_historico(session, "assistant", response_text, "CHECKOUT_COMPLETE")
+            response_text, last_shown_products, last_bot_action = _responder(
+                session, gerar_resumo_finalizacao(shopping_cart, customer_context), "CHECKOUT_COMPLETE"
+            )
             
             # Limpa carrinho após finalização
             shopping_cart.clear()
-            last_shown_products = []
-            last_bot_action = "AWAITING_MENU_SELECTION"
         elif not customer_context:
             # 🔧 MENSAGEM FIXA PARA EVITAR CONFUSÃO DA IA
-            response_text = "Para finalizar seu pedido, preciso do seu CNPJ. Por favor, me informe o CNPJ da sua empresa."
-            adicionar_mensagem_historico(session, "assistant", response_text, "REQUEST_CNPJ")
-            last_shown_products = []
-            last_bot_action = None
+            response_text, last_shown_products, last_bot_action = _responder(
+                session, _MSG_REQUEST_CNPJ, "REQUEST_CNPJ", None
+            )
         else:
             # 🆕 GERA RESUMO COMPLETO DO PEDIDO
-            response_text = gerar_resumo_finalizacao(shopping_cart, customer_context)
-            adicionar_mensagem_historico(
-                session, "assistant", response_text, "CHECKOUT_COMPLETE"
+            response_text, last_shown_products, last_bot_action = _responder(
+                session, gerar_resumo_finalizacao(shopping_cart, customer_context), "CHECKOUT_COMPLETE"
             )
             
             # 🆕 LIMPA CARRINHO APÓS FINALIZAÇÃO
             shopping_cart.clear()
-            last_shown_products = []
-            last_bot_action = "AWAITING_MENU_SELECTION"
 
     elif tool_name == "encontrar_cliente_por_cnpj":
         cnpj = parameters.get("cnpj")
         if cnpj:
-            print(f">>> CONSOLE: Buscando cliente por CNPJ: {cnpj}")
+            app_logger.debug("Buscando cliente por CNPJ: %s", cnpj)
             customer = database.encontrar_cliente_por_cnpj(cnpj)
             if customer:
                 customer_context = customer
                 
                 # 🆕 FINALIZA AUTOMATICAMENTE SE TEMOS CARRINHO E CLIENTE
                 if shopping_cart:
-                    response_text = gerar_resumo_finalizacao(shopping_cart, customer_context)
-                    adicionar_mensagem_historico(
-                        session, "assistant", response_text, "CHECKOUT_COMPLETE"
+                    response_text, last_shown_products, last_bot_action = _responder(
+                        session, gerar_resumo_finalizacao(shopping_cart, customer_context), "CHECKOUT_COMPLETE"
                     )
                     
                     # Limpa carrinho após finalização
                     shopping_cart.clear()
-                    last_shown_products = []
-                    last_bot_action = "AWAITING_MENU_SELECTION"
                 else:
-                    response_text = (
+                    response_text, last_shown_products, last_bot_action = _responder(
+                        session,
                         f"Oi, {customer_context['nome']}! Que bom te ver por aqui de novo! 😊\n\n"
-                        f"{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}"
-                    )
-                    adicionar_mensagem_historico(
-                        session, "assistant", response_text, "CUSTOMER_IDENTIFIED"
+                        f"{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}",
+                        "CUSTOMER_IDENTIFIED",
                     )
-                    last_shown_products = []
-                    last_bot_action = "AWAITING_MENU_SELECTION"
             else:
                 response_text = f"Não achei esse CNPJ {cnpj} no nosso sistema, mas tudo bem! Posso registrar seu pedido assim mesmo."
                 
                 # 🆕 PERMITE FINALIZAR MESMO SEM CADASTRO
                 if shopping_cart:
-                    response_text += f"\n\n{gerar_resumo_finalizacao(shopping_cart)}"
-                    adicionar_mensagem_historico(
-                        session, "assistant", response_text, "CHECKOUT_COMPLETE"
+                    response_text, last_shown_products, last_bot_action = _responder(
+                        session,
+                        f"{response_text}\n\n{gerar_resumo_finalizacao(shopping_cart)}",
+                        "CHECKOUT_COMPLETE",
                     )
                     
                     # Limpa carrinho após finalização
                     shopping_cart.clear()
-                    last_shown_products = []
-                    last_bot_action = "AWAITING_MENU_SELECTION"
                 else:
                     adicionar_mensagem_historico(
                         session, "assistant", response_text, "CUSTOMER_NOT_FOUND"
                     )
         else:
             # 🔧 MENSAGEM FIXA PARA EVITAR CONFUSÃO DA IA
-            response_text = "Para finalizar seu pedido, preciso do seu CNPJ. Por favor, me informe o CNPJ da sua empresa."
+            response_text = _MSG_REQUEST_CNPJ
             adicionar_mensagem_historico(session, "assistant", response_text, "REQUEST_CNPJ")
 
-    elif tool_name == "perguntar_continuar_ou_finalizar":
-        if shopping_cart:
-            response_text = gerar_mensagem_continuar_ou_finalizar(shopping_cart)
-            adicionar_mensagem_historico(
-                session, "assistant", response_text, "ASK_CONTINUE_OR_CHECKOUT"
-            )
-        else:
-            response_text = (
-                "Seu carrinho tá vazio ainda! Bora escolher uns produtos maneiros?\n\n"
-                f"{formatar_acoes_rapidas(tem_carrinho=False)}"
-            )
-            adicionar_mensagem_historico(session, "assistant", response_text, "EMPTY_CART")
-        last_shown_products = []
-        last_bot_action = "AWAITING_MENU_SELECTION"
-
     elif tool_name == "lidar_com_conversa_casual":
         # 🆕 DETECTA SE DEVE GERAR SAUDAÇÃO DINÂMICA
         response_param = parameters.get('response_text', 'Entendi!')
@@ -2341,55 +2620,22 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
             incoming_msg_lower = last_mensagem_usuario.lower().strip()
             should_show_more_products = (
                 last_search_type and  # Há busca anterior
-                any(word in incoming_msg_lower for word in ["mais", "mais produtos", "continuar", "próximo", "more", "next"]) and
-                len(incoming_msg_lower.split()) <= 3  # Mensagem curta (até 3 palavras)
+                len(incoming_msg_lower.split()) <= 3 and  # Mensagem curta (até 3 palavras)
+                any(word in incoming_msg_lower for word in _TRECHOS_MAIS_PRODUTOS)
             )
             
             if should_show_more_products:
-                print(f">>> CONSOLE: 🚀 [IA-FIRST] Chitchat detectou 'mais produtos' - executando automaticamente")
+                app_logger.debug("🚀 [IA-FIRST] Chitchat detectou 'mais produtos' - executando automaticamente")
                 
                 # 🎯 EXECUTA AUTOMATICAMENTE A LÓGICA DE "MAIS PRODUTOS"
                 offset_before_call = current_offset
-                products = []
-                title = ""
-                
-                if last_search_type == "busca_inteligente":
-                    # 🆕 SUPORTE PARA BUSCA INTELIGENTE COM "MAIS"
-                    search_term = last_search_params.get("termo_busca", "")
-                    category = last_search_params.get("categoria", "")
-                    marca_priorizada = last_search_params.get("marca_priorizada")
-                    
-                    print(f">>> DEBUG: [IA-FIRST-SMART] Continuando busca - termo: '{search_term}', categoria: '{category}', marca: '{marca_priorizada}'")
-                    
-                    if marca_priorizada:
-                        # Se tem marca específica, busca mais produtos dessa marca
-                        search_result = pesquisar_produtos_com_sugestoes(marca_priorizada, limite=10, offset=current_offset)
-                        products = search_result["products"]
-                        title = f"Mais produtos {marca_priorizada.title()}:"
-                    elif category and category != "outros":
-                        # Se tem categoria, busca mais produtos da categoria
-                        products = database.obter_produtos_por_categoria(category, limite=10, offset=current_offset)
-                        title = f"Mais produtos da categoria {category.title()}:"
-                    else:
-                        # Fallback: busca geral por termo
-                        search_result = pesquisar_produtos_com_sugestoes(search_term, limite=10, offset=current_offset)
-                        products = search_result["products"]
-                        title = f"Mais produtos relacionados a '{search_term}':"
-                
-                elif last_search_type in ["by_name", "busca_por_nome"]:
-                    nome_produto = last_search_params.get("product_name", "") or last_search_params.get("nome_produto", "")
-                    products = database.obter_produtos_mais_vendidos_por_nome(nome_produto, limite=10, offset=current_offset)
-                    title = f"Mais produtos relacionados a '{nome_produto}':"
-                
-                elif last_search_type in ["top_selling", "mais_vendidos"]:
-                    products = database.obter_produtos_mais_vendidos(limite=10, offset=current_offset)
-                    title = "Mais produtos populares:"
+                products, title = _buscar_mais_produtos(last_search_type, last_search_params, current_offset)
                 
                 if products:
                     # 🎯 SUCESSO: Encontrou mais produtos
                     current_offset += len(products)
                     last_shown_products.extend(products)
-                    print(f">>> DEBUG: [IA_FIRST_SMART] Incrementou offset com {len(products)} produtos, novo offset: {current_offset}")
+                    app_logger.debug("[IA_FIRST_SMART] Incrementou offset com %s produtos, novo offset: %s", len(products), current_offset)
                     
                     # 🤖 IA GERA RESPOSTA PERSONALIZADA + PRODUTOS
                     ai_intro = generate_personalized_response("show_more_products", session)
@@ -2402,7 +2648,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     last_bot_action = "AWAITING_PRODUCT_SELECTION"
                     adicionar_mensagem_historico(session, "assistant", response_text, "IA_FIRST_MORE_PRODUCTS")
                     
-                    print(f">>> CONSOLE: 🚀 [IA-FIRST] Sucesso! Mostrou {len(products)} produtos adicionais")
+                    app_logger.debug("🚀 [IA-FIRST] Sucesso! Mostrou %s produtos adicionais", len(products))
                     
                 else:
                     # 🚫 NÃO HÁ MAIS PRODUTOS
@@ -2410,10 +2656,11 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     if not ai_response or ai_response.strip() == "":
                         ai_response = "Opa, já mostrei todos os produtos relacionados! Quer procurar outra coisa?"
                     
-                    response_text = f"{ai_response}\n\n{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}"
-                    last_shown_products = []
-                    last_bot_action = "AWAITING_MENU_SELECTION"
-                    adicionar_mensagem_historico(session, "assistant", response_text, "IA_FIRST_NO_MORE_PRODUCTS")
+                    response_text, last_shown_products, last_bot_action = _responder(
+                        session,
+                        f"{ai_response}\n\n{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}",
+                        "IA_FIRST_NO_MORE_PRODUCTS",
+                    )
             else:
                 # 🗣️ CHITCHAT NORMAL
                 response_text = (
@@ -2426,13 +2673,11 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
         adicionar_mensagem_historico(session, "assistant", response_text, "CHITCHAT")
 
     elif not tool_name and "response_text" in intent:
-        response_text = (
-            f"{intent['response_text']}\n\n"
-            f"{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}"
+        response_text, last_shown_products, last_bot_action = _responder(
+            session,
+            f"{intent['response_text']}\n\n{formatar_acoes_rapidas(tem_carrinho=bool(shopping_cart))}",
+            "GENERIC_RESPONSE",
         )
-        adicionar_mensagem_historico(session, "assistant", response_text, "GENERIC_RESPONSE")
-        last_shown_products = []
-        last_bot_action = "AWAITING_MENU_SELECTION"
 
     elif tool_name == "selecionar_item_para_atualizacao":
         # 🆕 NOVA FERRAMENTA: Seleção de item para atualização durante ação pendente AWAITING_SMART_UPDATE_SELECTION
@@ -2477,12 +2722,7 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
         # 🆕 NOVA FERRAMENTA: Atualização inteligente do carrinho
         product_name = parameters.get("product_name", "").strip()
         action = parameters.get("action", "add")  # "add", "set", "remove"
-        quantity = parameters.get("quantity", 1)
-        
-        try:
-            quantity = float(quantity)
-        except (ValueError, TypeError):
-            quantity = 1
+        quantity = _normalizar_quantidade(parameters.get("quantity", 1))
             
         if not product_name:
             response_text = generate_personalized_response("error", session)
@@ -2490,9 +2730,11 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
         else:
             # Busca produtos no carrinho que correspondem ao nome
             matching_items = []
+            termo_minusculo = product_name.lower()
+            palavras_termo = termo_minusculo.split()
             for i, item in enumerate(shopping_cart):
-                item_name = obter_nome_produto(item).lower()
-                if product_name.lower() in item_name or any(word in item_name for word in product_name.lower().split()):
+                item_name = _nome_item_minusculo(item)
+                if termo_minusculo in item_name or any(word in item_name for word in palavras_termo):
                     matching_items.append((i, item))
             
             if not matching_items:
@@ -2502,13 +2744,13 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     search_result = pesquisar_produtos_com_sugestoes(product_name, limite=5)
                     if search_result["products"]:
                         best_match = search_result["products"][0]  # Pega o melhor resultado
-                        # Adiciona ao carrinho
-                        best_match["qt"] = quantity
-                        shopping_cart.append(best_match)
+                        # Adiciona ao carrinho uma cópia própria, sem alterar o resultado da busca
+                        shopping_cart.append(
+                            {**best_match, "qt": quantity, "_nome_minusculo": _nome_item_minusculo(best_match)}
+                        )
                         product_display_name = obter_nome_produto(best_match)
                         
                         # Resposta clara + carrinho atualizado
-                        from core.gerenciador_sessao import formatar_carrinho_para_exibicao
                         cart_display = formatar_carrinho_para_exibicao(shopping_cart)
                         response_text = f"✅ Adicionei *{quantity}* {product_display_name} ao seu carrinho!\n\n{cart_display}"
                     else:
@@ -2538,7 +2780,6 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     # Resposta clara + carrinho atualizado
                     if shopping_cart:
                         # Se ainda há itens, mostra carrinho atualizado
-                        from core.gerenciador_sessao import formatar_carrinho_para_exibicao
                         cart_display = formatar_carrinho_para_exibicao(shopping_cart)
                         response_text = f"✅ *{product_display_name}* removido do carrinho!\n\n{cart_display}"
                     else:
@@ -2557,7 +2798,6 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
                     else:
                         action_msg = f"✅ Quantidade atualizada para *{new_qty}* {product_display_name}!"
                     
-                    from core.gerenciador_sessao import formatar_carrinho_para_exibicao
                     cart_display = formatar_carrinho_para_exibicao(shopping_cart)
                     response_text = f"{action_msg}\n\n{cart_display}"
             
@@ -2596,24 +2836,116 @@ RESPONDA APENAS com a categoria do banco (CERVEJA, DOCES, DETERGENTE, HIGIENE, e
         pending_action = "show_top_selling"
         adicionar_mensagem_historico(session, "assistant", response_text, "FALLBACK")
 
+    # Devolve os locais ao estado na mesma ordem de _STATE_FIELDS usada no desempacotamento
     state.update(
-        {
-            "customer_context": customer_context,
-            "shopping_cart": shopping_cart,
-            "last_search_type": last_search_type,
-            "last_search_params": last_search_params,
-            "current_offset": current_offset,
-            "last_shown_products": last_shown_products,
-            "last_bot_action": last_bot_action,
-            "pending_action": pending_action,
-            "last_kb_search_term": last_kb_search_term,
-            "confirmation_requested_at": confirmation_requested_at,
-        }
+        zip(
+            _STATE_FIELDS,
+            (
+                customer_context,
+                shopping_cart,
+                last_search_type,
+                last_search_params,
+                current_offset,
+                last_shown_products,
+                last_bot_action,
+                pending_action,
+                last_kb_search_term,
+                confirmation_requested_at,
+            ),
+        )
     )
 
     return response_text
 
 
+# Envio de WhatsApp fora da thread de processamento: uma fila por thread de envio,
+# escolhida pelo destinatário para manter a ordem das respostas de cada usuário
+_FILAS_ENVIO = [
+    queue.Queue(maxsize=2048) for _ in range(max(1, int(os.getenv("GAV_SENDERS", "3"))))
+]
+# Tempo máximo (s) aguardando vaga numa fila de envio cheia antes de desistir da mensagem
+_TIMEOUT_FILA_ENVIO = float(os.getenv("GAV_SEND_QUEUE_TIMEOUT", "30"))
+
+
+def _enviar_whatsapp_agora(to: str, body: str) -> None:
+    """Envia a mensagem pelo Twilio registrando sucesso ou falha."""
+    try:
+        twilio_client.send_whatsapp_message(to=to, body=body)
+        #vonage_client.enviar_whatsapp(body)
+        log_info("WhatsApp enviado com sucesso", user_id=to, categoria="WHATSAPP_SUCCESS")
+    except Exception as e:
+        log_error(f"Erro ao enviar mensagem WhatsApp: {str(e)}", user_id=to, exception=e, categoria="WHATSAPP_ERROR")
+
+
+def _consumir_fila_envio(fila: queue.Queue) -> None:
+    """Envia as mensagens da fila em ordem até receber o sinal de parada (None)."""
+    while True:
+        item = fila.get()
+        if item is None:
+            return
+        _enviar_whatsapp_agora(*item)
+
+
+def _enviar_whatsapp(to: str, body: str) -> None:
+    """
+    Enfileira a mensagem para envio assíncrono pelo WhatsApp.
+
+    Args:
+        to: Telefone de destino.
+        body: Texto da mensagem.
+    """
+    fila = _FILAS_ENVIO[hash(to) % len(_FILAS_ENVIO)]
+    try:
+        # Fila cheia: aguarda vaga em vez de enviar aqui, o que passaria à frente das
+        # respostas ainda enfileiradas para o mesmo usuário
+        fila.put((to, body), timeout=_TIMEOUT_FILA_ENVIO)
+    except queue.Full:
+        log_error(
+            f"Fila de envio cheia por {_TIMEOUT_FILA_ENVIO}s, mensagem descartada",
+            user_id=to, categoria="WHATSAPP_ERROR",
+        )
+
+
+def _encerrar_envios() -> None:
+    """Aguarda o processamento pendente e esvazia as filas de envio no desligamento."""
+    _EXECUTOR.shutdown(wait=True)
+    for fila in _FILAS_ENVIO:
+        fila.put(None)
+    for thread in _THREADS_ENVIO:
+        thread.join()
+
+
+_THREADS_ENVIO = [
+    threading.Thread(target=_consumir_fila_envio, args=(fila,), name=f"gav-envio-{i}", daemon=True)
+    for i, fila in enumerate(_FILAS_ENVIO)
+]
+for _thread_envio in _THREADS_ENVIO:
+    _thread_envio.start()
+atexit.register(_encerrar_envios)
+
+
+def _registrar_resposta_final(session: Dict, response_text: str) -> None:
+    """Registra a resposta do turno no histórico, a menos que a ferramenta já o tenha feito.
+
+    Args:
+        session: Os dados da sessão.
+        response_text: O texto da resposta enviada ao usuário.
+    """
+    if not response_text:
+        return
+    historico = session.get("historico_conversa")
+    ultima = historico[-1] if historico else None
+    # 🆕 EVITA DUPLICAÇÃO: compara o hash do texto completo (o histórico guarda só 500 caracteres),
+    # e só calcula o hash quando a última entrada é do assistente
+    if (
+        ultima is not None
+        and ultima.get("role") == "assistant"
+        and ultima.get("hash") == calcular_hash_mensagem(response_text)
+    ):
+        return
+    adicionar_mensagem_historico(session, "assistant", response_text, "BOT_RESPONSE")
+
+
 def _finalize_session(
     sender_phone: str, session_id: str, session: Dict, state: Dict, response_text: str
 ) -> None:
@@ -2642,42 +2974,53 @@ def _finalize_session(
         },
     )
     
-    if response_text:
-        # 📝 SEMPRE salva a resposta no histórico antes de tentar enviar 
-        # 🆕 EVITA DUPLICAÇÃO: Só salva se não for idêntica à última mensagem
-        historico = session.get("historico_conversa", [])
-        if not (historico and historico[-1].get("message") == response_text):
-            adicionar_mensagem_historico(session, "assistant", response_text, "BOT_RESPONSE")
-    
+    # 📝 SEMPRE salva a resposta no histórico antes de tentar enviar 
+    _registrar_resposta_final(session, response_text)
     salvar_sessao(session_id, session)
 
     if response_text:
         # 📺 CONSOLE: Exibe a resposta completa
-        print(f"\n=== RESPOSTA DO BOT ===\n{response_text}\n=====================")
+        app_logger.debug("\n=== RESPOSTA DO BOT ===\n%s\n=====================", response_text)
         
         # 📝 LOG DETALHADO: Resposta completa sendo enviada
-        log_info(
-            "RESPOSTA ENVIADA AO USUARIO",
-            user_id=sender_phone,
-            session_id=session_id,
-            resposta_completa=response_text,
-            tamanho_resposta=len(response_text),
-            categoria="RESPONSE_OUT"
-        )
+        if log_habilitado():
+            log_info(
+                "RESPOSTA ENVIADA AO USUARIO",
+                user_id=sender_phone,
+                session_id=session_id,
+                resposta_completa=response_text,
+                tamanho_resposta=len(response_text),
+                categoria="RESPONSE_OUT"
+            )
         
-        # Tenta enviar por WhatsApp
-        try:
-            print(f">>> CONSOLE: Tentando enviar resposta para {sender_phone}...")
-            log_debug(f"Tentando enviar via WhatsApp", user_id=sender_phone, categoria="WHATSAPP_SEND")
-            
-            twilio_client.send_whatsapp_message(to=sender_phone, body=response_text)
-            #vonage_client.enviar_whatsapp(response_text)
-            
-            print(f">>> CONSOLE: ✅ Mensagem enviada com sucesso!")
-            log_info("WhatsApp enviado com sucesso", user_id=sender_phone, categoria="WHATSAPP_SUCCESS")
-        except Exception as e:
-            print(f">>> CONSOLE: ❌ ERRO ao enviar mensagem: {e}")
-            log_error(f"Erro ao enviar mensagem WhatsApp: {str(e)}", user_id=sender_phone, exception=e, categoria="WHATSAPP_ERROR")
+        # Enfileira o envio por WhatsApp sem bloquear a thread de processamento
+        log_debug(f"Enfileirando envio via WhatsApp", user_id=sender_phone, categoria="WHATSAPP_SEND")
+        _enviar_whatsapp(sender_phone, response_text)
+
+
+@functools.lru_cache(maxsize=4096)
+def _texto_menciona_cnpj(texto: str) -> bool:
+    """Indica se o texto cita CNPJ (memoizado: as mensagens do bot se repetem)."""
+    return "cnpj" in texto.casefold()
+
+
+def _assistente_pediu_cnpj(historico: List[Dict]) -> bool:
+    """
+    Verifica se o assistente mencionou CNPJ nas últimas 3 mensagens.
+
+    Args:
+        historico: Lista do histórico de conversa da sessão.
+
+    Returns:
+        bool: True se alguma das últimas mensagens do assistente cita CNPJ.
+    """
+    # Percorre de trás para frente: o pedido de CNPJ costuma ser a última mensagem do bot
+    for msg in itertools.islice(reversed(historico), 3):
+        if msg.get("role") != "assistant":
+            continue
+        if _texto_menciona_cnpj(msg.get("message", "")):
+            return True
+    return False
 
 
 def _validate_cnpj_first(sender_phone: str, incoming_msg: str) -> Tuple[bool, str, str]:
@@ -2690,21 +3033,35 @@ def _validate_cnpj_first(sender_phone: str, incoming_msg: str) -> Tuple[bool, st
             - session_id: ID da sessão (com CNPJ se validado)  
             - response_text: Mensagem para enviar (se ainda precisar do CNPJ)
     """
-    from ai_llm.llm_interface import is_valid_cnpj
-    import glob
-    import os
+    # ⚡ Telefone já validado neste processo: não precisa tocar no armazenamento
+    cached_session_id = obter_sessao_validada(sender_phone)
+    if cached_session_id:
+        return True, cached_session_id, ""
+
+    app_logger.debug("🔍 [VALIDATE_CNPJ] Função _validate_cnpj_first chamada")
+    app_logger.debug("🔍 [VALIDATE_CNPJ] sender_phone: %s", sender_phone)
+    app_logger.debug("🔍 [VALIDATE_CNPJ] incoming_msg: %s", incoming_msg)
+    
+    # 🔍 Primeiro, lê a sessão do telefone: após a validação ela aponta para o CNPJ
+    temp_session = carregar_sessao(sender_phone)
+    existing_cnpj = temp_session.get("validated_cnpj")
     
-    print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] Função _validate_cnpj_first chamada")
-    print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] sender_phone: {sender_phone}")
-    print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] incoming_msg: {incoming_msg}")
+    app_logger.debug("🔍 [VALIDATE_CNPJ] CNPJ na sessão do telefone: %s", existing_cnpj)
+    
+    if existing_cnpj:
+        # Já tem CNPJ validado, usa session_id com CNPJ sem varrer o diretório
+        session_id = f"{sender_phone}_{existing_cnpj}"
+        app_logger.debug("✅ [VALIDATE_CNPJ] Retornando session_id: %s", session_id)
+        registrar_sessao_validada(sender_phone, session_id)
+        return True, session_id, ""
     
-    # 🔍 Primeiro, procura por qualquer sessão existente com CNPJ para este telefone
+    # Sessões migradas antes do ponteiro: procura arquivo de sessão com CNPJ para este telefone
     safe_phone_id = sender_phone.replace(":", "_").replace("/", "_")
     pattern = f"data/sessao_{safe_phone_id}_*.json"
     existing_sessions = glob.glob(pattern)
     
-    print(f">>> CONSOLE: 🔍 Procurando sessões com padrão: {pattern}")
-    print(f">>> CONSOLE: 🔍 Sessões encontradas: {existing_sessions}")
+    app_logger.debug("🔍 Procurando sessões com padrão: %s", pattern)
+    app_logger.debug("🔍 Sessões encontradas: %s", existing_sessions)
     
     if existing_sessions:
         # Encontrou sessão com CNPJ, usa a mais recente (ordenar por data de modificação)
@@ -2712,32 +3069,20 @@ def _validate_cnpj_first(sender_phone: str, incoming_msg: str) -> Tuple[bool, st
         # Normaliza o nome do arquivo para obter o session_id
         session_filename = os.path.basename(session_file)
         session_id = session_filename.replace("sessao_", "").replace(".json", "")
-        print(f">>> CONSOLE: ✅ Sessão com CNPJ encontrada: {session_id} (arquivo: {session_filename})")
-        return True, session_id, ""
-    
-    # Se não encontrou sessão com CNPJ, verifica sessão temporária
-    print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] Não encontrou sessão com CNPJ, verificando sessão temporária...")
-    temp_session = carregar_sessao(sender_phone)
-    existing_cnpj = temp_session.get("validated_cnpj")
-    
-    print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] CNPJ na sessão temporária: {existing_cnpj}")
-    
-    if existing_cnpj:
-        # Já tem CNPJ validado na sessão atual, usa session_id com CNPJ
-        session_id = f"{sender_phone}_{existing_cnpj}"
-        print(f">>> CONSOLE: ✅ [VALIDATE_CNPJ] CNPJ encontrado na sessão atual: {existing_cnpj}")
-        print(f">>> CONSOLE: ✅ [VALIDATE_CNPJ] Retornando session_id: {session_id}")
+        app_logger.debug("✅ Sessão com CNPJ encontrada: %s (arquivo: %s)", session_id, session_filename)
+        registrar_sessao_validada(sender_phone, session_id)
         return True, session_id, ""
     
     # Verifica se a mensagem atual é um CNPJ
-    print(f">>> CONSOLE: 🔍 Verificando se '{incoming_msg.strip()}' é um CNPJ válido...")
-    cnpj_validation_result = is_valid_cnpj(incoming_msg.strip())
-    print(f">>> CONSOLE: 🔍 Resultado da validação: {cnpj_validation_result}")
+    msg_limpa = incoming_msg.strip()
+    app_logger.debug("🔍 Verificando se '%s' é um CNPJ válido...", msg_limpa)
+    cnpj_validation_result = is_valid_cnpj(msg_limpa)
+    app_logger.debug("🔍 Resultado da validação: %s", cnpj_validation_result)
     
     if cnpj_validation_result:
         # É um CNPJ válido!
-        cnpj_clean = incoming_msg.strip().replace(".", "").replace("/", "").replace("-", "")
-        print(f">>> CONSOLE: ✅ CNPJ válido detectado: {cnpj_clean}")
+        cnpj_clean = _PADRAO_NAO_DIGITO.sub("", msg_limpa)
+        app_logger.debug("✅ CNPJ válido detectado: %s", cnpj_clean)
         
         # Migra dados da sessão temporária para a sessão com CNPJ
         session_id_with_cnpj = f"{sender_phone}_{cnpj_clean}"
@@ -2747,88 +3092,64 @@ def _validate_cnpj_first(sender_phone: str, incoming_msg: str) -> Tuple[bool, st
         temp_session["customer_context"] = temp_session.get("customer_context", {})
         temp_session["customer_context"]["cnpj"] = cnpj_clean
         
-        # Salva na nova sessão com CNPJ
-        salvar_sessao(session_id_with_cnpj, temp_session)
-        
-        # Limpa sessão temporária se for diferente
+        # Substitui a sessão temporária por um ponteiro para o CNPJ validado
         if session_id_with_cnpj != sender_phone:
-            from core.gerenciador_sessao import limpar_sessao
-            limpar_sessao(sender_phone)
+            salvar_sessao(sender_phone, {"validated_cnpj": cnpj_clean})
         
-        print(f">>> CONSOLE: ✅ CNPJ {cnpj_clean} validado e sessão migrada!")
+        app_logger.debug("✅ CNPJ %s validado e sessão migrada!", cnpj_clean)
+        registrar_sessao_validada(sender_phone, session_id_with_cnpj)
         
         # Verifica se já é primeira mensagem após validação
         if len(temp_session.get("historico_conversa", [])) <= 2:
             # Primeira vez validando CNPJ, adiciona mensagem de boas-vindas
-            welcome_message = (
-                f"✅ *CNPJ validado com sucesso!*\n\n"
-                f"🎉 Bem-vindo à *Comercial Esperança*!\n"
-                f"Agora posso te ajudar com seus pedidos de forma personalizada.\n\n"
-                f"🔍 Digite o nome do produto que deseja\n"
-                f"📦 Digite *produtos* para ver os mais vendidos\n"
-                f"❓ Digite *ajuda* para mais opções"
-            )
+            welcome_message = _MSG_CNPJ_WELCOME
             adicionar_mensagem_historico(temp_session, "assistant", welcome_message, "CNPJ_VALIDATED")
+            # Uma única gravação da sessão migrada, já com a mensagem de boas-vindas
             salvar_sessao(session_id_with_cnpj, temp_session)
             
             # CORREÇÃO: Retorna a mensagem de boas-vindas para ser exibida no webchat
             return True, session_id_with_cnpj, welcome_message
         
         # Se não é primeira vez, retorna mensagem simples
-        simple_welcome = (
-            f"✅ *CNPJ validado!*\n\n"
-            f"Como posso te ajudar hoje?\n\n"
-            f"🔍 Digite o nome do produto que deseja\n"
-            f"📦 Digite *produtos* para ver os mais vendidos"
-        )
-        return True, session_id_with_cnpj, simple_welcome
+        salvar_sessao(session_id_with_cnpj, temp_session)
+        return True, session_id_with_cnpj, _MSG_CNPJ_SIMPLE_WELCOME
     
     # Ainda não tem CNPJ, verifica se já pediu antes
-    print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] CNPJ não é válido, verificando histórico de conversa...")
+    app_logger.debug("🔍 [VALIDATE_CNPJ] CNPJ não é válido, verificando histórico de conversa...")
     conversation_history = temp_session.get("historico_conversa", [])
-    print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] Histórico tem {len(conversation_history)} mensagens")
+    app_logger.debug("🔍 [VALIDATE_CNPJ] Histórico tem %s mensagens", len(conversation_history))
     
-    already_asked_cnpj = any("cnpj" in msg.get("message", "").lower() 
-                            and msg.get("role") == "assistant" 
-                            for msg in conversation_history[-3:])  # Últimas 3 mensagens
+    already_asked_cnpj = _assistente_pediu_cnpj(conversation_history)  # Últimas 3 mensagens
     
-    print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] Já perguntou CNPJ antes: {already_asked_cnpj}")
+    app_logger.debug("🔍 [VALIDATE_CNPJ] Já perguntou CNPJ antes: %s", already_asked_cnpj)
     
     # Verifica se o usuário tentou enviar algo que parece ser um CNPJ mas é inválido
+    # A validação já falhou acima, não precisa chamar is_valid_cnpj novamente
     user_attempted_cnpj = (
         already_asked_cnpj and 
-        len(incoming_msg.strip()) >= 11 and  # Pelo menos 11 caracteres (pode ser CNPJ)
-        any(char.isdigit() for char in incoming_msg.strip()) and  # Contém números
-        not is_valid_cnpj(incoming_msg.strip())  # Mas não é válido
+        len(msg_limpa) >= 11 and  # Pelo menos 11 caracteres (pode ser CNPJ)
+        _PADRAO_DIGITO.search(msg_limpa) is not None  # Contém números
     )
     
-    print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] Usuário tentou CNPJ inválido: {user_attempted_cnpj}")
+    app_logger.debug("🔍 [VALIDATE_CNPJ] Usuário tentou CNPJ inválido: %s", user_attempted_cnpj)
     
     if user_attempted_cnpj:
         # Usuário tentou enviar CNPJ mas é inválido
-        response_text = (
-            "❌ CNPJ inválido. Por favor, digite um CNPJ válido no formato:\n"
-            "XX.XXX.XXX/XXXX-XX ou apenas os 14 dígitos.\n\n"
-            "Exemplo: 12.345.678/0001-95"
-        )
-        print(f">>> CONSOLE: ❌ [VALIDATE_CNPJ] Retornando erro de CNPJ inválido")
+        response_text = _MSG_INVALID_CNPJ
+        app_logger.debug("❌ [VALIDATE_CNPJ] Retornando erro de CNPJ inválido")
     else:
         # Primeira vez pedindo CNPJ ou usuário não tentou enviar CNPJ ainda
-        response_text = (
-            "🎉 *Olá! Seja bem-vindo à Comercial Esperança!*\n\n"
-            "Eu sou o *G.A.V.* (Gentil Assistente de Vendas) e estou aqui para "
-            "te ajudar com seus pedidos de forma rápida e personalizada! 😊\n\n"
-            "Para começarmos, preciso apenas do CNPJ da sua empresa:\n"
-            "📄 Digite seu CNPJ (pode ser com ou sem pontuação)"
-        )
-        print(f">>> CONSOLE: 🔍 [VALIDATE_CNPJ] Retornando solicitação inicial de CNPJ")
+        response_text = _MSG_CNPJ_INITIAL_REQUEST
+        app_logger.debug("🔍 [VALIDATE_CNPJ] Retornando solicitação inicial de CNPJ")
     
     # Adiciona a mensagem ao histórico da sessão temporária
-    adicionar_mensagem_historico(temp_session, "user", incoming_msg)
-    adicionar_mensagem_historico(temp_session, "assistant", response_text, "REQUEST_CNPJ")
+    adicionar_mensagens_historico(
+        temp_session,
+        (("user", incoming_msg, ""), ("assistant", response_text, "REQUEST_CNPJ")),
+    )
     salvar_sessao(sender_phone, temp_session)
     
-    print(f">>> CONSOLE: ❌ [VALIDATE_CNPJ] Retornando: False, {sender_phone}, response_text")
+    app_logger.debug("❌ [VALIDATE_CNPJ] Retornando: False, %s, response_text", sender_phone)
     return False, sender_phone, response_text
 
 
@@ -2839,11 +3160,15 @@ def process_message_async(sender_phone: str, incoming_msg: str):
     ATUALIZADA COM MEMÓRIA CONVERSACIONAL COMPLETA E VALIDAÇÃO OBRIGATÓRIA DE CNPJ
     """
     with aplicativo.app_context():
+        # Mantidos fora do try para o caminho de erro reaproveitar a sessão já carregada
+        session = None
+        session_id = sender_phone
         try:
-            with ContextoLog(user_id=sender_phone, session_id=f"whatsapp_{sender_phone}"):
+            if log_habilitado():
                 log_info(
                     "MENSAGEM RECEBIDA DO USUARIO", 
                     user_id=sender_phone,
+                    session_id=f"whatsapp_{sender_phone}",
                     mensagem_completa_recebida=incoming_msg,
                     tamanho_mensagem=len(incoming_msg),
                     categoria="MESSAGE_IN"
@@ -2855,11 +3180,8 @@ def process_message_async(sender_phone: str, incoming_msg: str):
             # Se ainda não temos CNPJ válido, envia mensagem solicitando CNPJ e para por aqui
             if not cnpj_validated:
                 if response_text:
-                    try:
-                        twilio_client.send_whatsapp_message(to=sender_phone, body=response_text)
-                        print(f">>> CONSOLE: ✅ Mensagem solicitando CNPJ enviada!")
-                    except Exception as send_error:
-                        print(f">>> CONSOLE: ❌ ERRO ao enviar mensagem: {send_error}")
+                    _enviar_whatsapp(sender_phone, response_text)
+                    app_logger.debug("✅ Mensagem solicitando CNPJ enfileirada!")
                 return
             
             # Usa o session_id que inclui o CNPJ
@@ -2882,7 +3204,7 @@ def process_message_async(sender_phone: str, incoming_msg: str):
                 )
                 
                 # Log da intenção detectada
-                if intent:
+                if intent and log_habilitado():
                     log_info(
                         "INTENCAO DETECTADA",
                         user_id=sender_phone,
@@ -2892,38 +3214,38 @@ def process_message_async(sender_phone: str, incoming_msg: str):
                         categoria="INTENT_DETECTED"
                     )
                 
+            # Lido uma vez para a checagem de checkout e os logs da execução
+            nome_ferramenta = intent.get("nome_ferramenta") if intent else None
+
             # 2.1. PRIORIDADE ESPECIAL: Se detectou finalizar_pedido, limpa ações pendentes conflitantes
-            if intent and intent.get("nome_ferramenta") == "finalizar_pedido":
+            if nome_ferramenta == "finalizar_pedido":
                 if intent.get("parametros", {}).get("force_finalizar_pedido"):
                     state["pending_action"] = None  # Limpa qualquer ação pendente
-                    print(">>> CONSOLE: Checkout forçado - limpando ações pendentes")
+                    app_logger.debug("Checkout forçado - limpando ações pendentes")
 
             # 3. Executa a intenção identificada
             if intent and not response_text:
-                log_debug("Executando ferramenta detectada", user_id=sender_phone, tool_name=intent.get("nome_ferramenta"), categoria="TOOL_EXECUTION")
+                log_debug("Executando ferramenta detectada", user_id=sender_phone, tool_name=nome_ferramenta, categoria="TOOL_EXECUTION")
                 response_text = _route_tool(session, state, intent, sender_phone, incoming_msg)
                 
                 # Log do resultado da ferramenta
-                if response_text:
+                if response_text and log_habilitado():
                     log_info(
                         "FERRAMENTA EXECUTADA",
                         user_id=sender_phone,
-                        tool_name=intent.get("nome_ferramenta"),
+                        tool_name=nome_ferramenta,
                         resposta_gerada=response_text,
                         tamanho_resposta=len(response_text),
                         categoria="TOOL_RESULT"
                     )
 
             # 4. Mensagem padrão caso nenhuma resposta seja definida
-            if not response_text and not state.get("pending_action"):
+            if not response_text and not state["pending_action"]:
                 # Não adiciona quick_actions se estiver aguardando confirmação de finalizar_pedido
-                if state.get("last_bot_action") == "AWAITING_CHECKOUT_CONFIRMATION":
+                if state["last_bot_action"] == "AWAITING_CHECKOUT_CONFIRMATION":
                     response_text = "Operação concluída."
                 else:
-                    response_text = (
-                        "Operação concluída. O que mais posso fazer por você?\n\n"
-                        f"{formatar_acoes_rapidas(tem_carrinho=bool(state.get('shopping_cart', [])))}"
-                    )
+                    response_text = _MSG_OPERATION_COMPLETE_ACOES[bool(state["shopping_cart"])]
                 adicionar_mensagem_historico(
                     session, "assistant", response_text, "OPERATION_COMPLETE"
                 )
@@ -2932,30 +3254,26 @@ def process_message_async(sender_phone: str, incoming_msg: str):
             _finalize_session(sender_phone, session_id, session, state, response_text)
 
             logging.info(f"THREAD: Processamento finalizado para '{incoming_msg}'")
-            print(f"--- FIM DO PROCESSAMENTO DA THREAD PARA: '{incoming_msg}' ---\n")
+            app_logger.debug("FIM DO PROCESSAMENTO DA THREAD PARA: '%s'", incoming_msg)
         except Exception as e:
             logging.error(f"ERRO CRÍTICO NA THREAD: {e}", exc_info=True)
-            print(f"!!! ERRO CRÍTICO NA THREAD: {e}")
 
-            error_response = "Opa, algo deu errado aqui! Pode tentar de novo, por favor?"
-            
+            error_response = _MSG_ERRO_PROCESSAMENTO
+
             # 📝 SEMPRE salva o erro no histórico primeiro
             try:
-                session = carregar_sessao(sender_phone)
+                if session is None:
+                    session = carregar_sessao(session_id)
                 adicionar_mensagem_historico(session, "assistant", error_response, "ERROR")
-                salvar_sessao(sender_phone, session)
-                print(f"\n=== RESPOSTA DE ERRO ===\n{error_response}\n=====================")
-            except:
-                pass  # Se falhar aqui, apenas ignora para não causar loop de erro
+                salvar_sessao(session_id, session)
+                app_logger.debug("=== RESPOSTA DE ERRO === %s", error_response)
+            except Exception as erro_salvamento:
+                # Se falhar aqui, apenas registra para não causar loop de erro
+                logging.warning("Falha ao salvar sessão no caminho de erro: %s", erro_salvamento)
             
-            # Tenta enviar por WhatsApp
-            try:
-                print(f">>> CONSOLE: Tentando enviar resposta de erro para {sender_phone}...")
-                twilio_client.send_whatsapp_message(to=sender_phone, body=error_response)
-                #vonage_client.enviar_whatsapp(error_response)
-                print(f">>> CONSOLE: ✅ Mensagem de erro enviada com sucesso!")
-            except Exception as send_error:
-                print(f">>> CONSOLE: ❌ ERRO ao enviar mensagem de erro: {send_error}")
+            # Enfileira o envio por WhatsApp
+            app_logger.debug("Enfileirando resposta de erro para %s...", sender_phone)
+            _enviar_whatsapp(sender_phone, error_response)
 
 @log_performance
 def process_message_for_web(sender_id: str, incoming_msg: str) -> str:
@@ -2966,10 +3284,11 @@ def process_message_for_web(sender_id: str, incoming_msg: str) -> str:
     # O 'with app.app_context()' é crucial para que a thread acesse a aplicação Flask
     with aplicativo.app_context():
         try:
-            with ContextoLog(user_id=sender_id, session_id=f"webchat_{sender_id}"):
+            if log_habilitado():
                 log_info(
                     "[WEBCHAT] MENSAGEM RECEBIDA DO USUARIO",
                     user_id=sender_id,
+                    session_id=f"webchat_{sender_id}",
                     mensagem_completa_recebida=incoming_msg,
                     tamanho_mensagem=len(incoming_msg),
                     categoria="WEBCHAT_MESSAGE_IN"
@@ -2977,22 +3296,22 @@ def process_message_for_web(sender_id: str, incoming_msg: str) -> str:
             
             cnpj_validated, session_id, response_text = _validate_cnpj_first(sender_id, incoming_msg)
             
-            print(f">>> CONSOLE: 🔍 [WEBCHAT] Resultado validação CNPJ:")
-            print(f">>> CONSOLE: 🔍 [WEBCHAT] - cnpj_validated: {cnpj_validated}")
-            print(f">>> CONSOLE: 🔍 [WEBCHAT] - session_id: {session_id}")
-            print(f">>> CONSOLE: 🔍 [WEBCHAT] - response_text: {response_text}")
+            app_logger.debug("🔍 [WEBCHAT] Resultado validação CNPJ:")
+            app_logger.debug("🔍 [WEBCHAT] - cnpj_validated: %s", cnpj_validated)
+            app_logger.debug("🔍 [WEBCHAT] - session_id: %s", session_id)
+            app_logger.debug("🔍 [WEBCHAT] - response_text: %s", response_text)
             
             # Se ainda não temos CNPJ válido, retorna mensagem solicitando CNPJ
             if not cnpj_validated:
-                print(f">>> CONSOLE: ❌ [WEBCHAT] CNPJ não validado, retornando: {response_text}")
+                app_logger.debug("❌ [WEBCHAT] CNPJ não validado, retornando: %s", response_text)
                 return response_text if response_text else "Por favor, informe seu CNPJ para continuar."
             
             # Se CNPJ foi validado agora e temos uma resposta, retorna ela imediatamente
             if response_text and response_text.strip():
-                print(f">>> CONSOLE: ✅ [WEBCHAT] CNPJ validado COM resposta, retornando mensagem completa")
+                app_logger.debug("✅ [WEBCHAT] CNPJ validado COM resposta, retornando mensagem completa")
                 return response_text
             
-            print(f">>> CONSOLE: ✅ [WEBCHAT] CNPJ validado SEM resposta, continuando fluxo normal")
+            app_logger.debug("✅ [WEBCHAT] CNPJ validado SEM resposta, continuando fluxo normal")
             
             # Usa o session_id que inclui o CNPJ
             session = carregar_sessao(session_id)
@@ -3010,20 +3329,21 @@ def process_message_for_web(sender_id: str, incoming_msg: str) -> str:
                 response_text = _route_tool(session, state, intent, original_sender_id, incoming_msg)
             
             if not response_text and not state.get("pending_action"):
-                response_text = "Operação concluída. O que mais posso fazer por você?"
+                response_text = _MSG_OPERATION_COMPLETE
                 adicionar_mensagem_historico(session, "assistant", response_text, "OPERATION_COMPLETE")
 
             # A grande diferença: não chamamos _finalize_session, apenas salvamos o estado e retornamos o texto.
             _finalize_session_for_web(session_id, session, state, response_text)
             
             # 📝 LOG DETALHADO: Resposta sendo retornada para webchat
-            log_info(
-                "[WEBCHAT] RESPOSTA ENVIADA AO USUARIO",
-                user_id=sender_id,
-                resposta_completa=response_text,
-                tamanho_resposta=len(response_text),
-                categoria="WEBCHAT_RESPONSE_OUT"
-            )
+            if log_habilitado():
+                log_info(
+                    "[WEBCHAT] RESPOSTA ENVIADA AO USUARIO",
+                    user_id=sender_id,
+                    resposta_completa=response_text,
+                    tamanho_resposta=len(response_text),
+                    categoria="WEBCHAT_RESPONSE_OUT"
+                )
             
             return response_text
 
@@ -3033,30 +3353,36 @@ def process_message_for_web(sender_id: str, incoming_msg: str) -> str:
 
 def _finalize_session_for_web(sender_id: str, session: Dict, state: Dict, response_text: str):
     """Uma versão do _finalize_session que apenas salva o estado, sem enviar mensagem."""
-    atualizar_contexto_sessao(
-        session,
-        {
-            "customer_context": state.get("customer_context"),
-            "shopping_cart": state.get("shopping_cart", []),
-            "last_search_type": state.get("last_search_type"),
-            "last_search_params": state.get("last_search_params", {}),
-            "current_offset": state.get("current_offset", 0),
-            "last_shown_products": state.get("last_shown_products", []),
-            "last_bot_action": state.get("last_bot_action"),
-            "pending_action": state.get("pending_action"),
-            "last_kb_search_term": state.get("last_kb_search_term"),
-        },
-    )
-    if response_text:
-        # 🆕 EVITA DUPLICAÇÃO: Só salva se não for idêntica à última mensagem
-        history = session.get("conversation_history", [])
-        last_msg = history[-1] if history else {}
-        if not (last_msg.get("role") == "assistant" and last_msg.get("message") == response_text):
-            adicionar_mensagem_historico(session, "assistant", response_text, "BOT_RESPONSE")
-    
+    # O state já tem exatamente as chaves da sessão (_extract_state): aplica direto
+    atualizar_contexto_sessao(session, state)
+    _registrar_resposta_final(session, response_text)
     salvar_sessao(sender_id, session)
     
 # twillio
+def _enfileirar_mensagem(sender_phone: str, incoming_msg: str) -> bool:
+    """Envia a mensagem para o pool de processamento, se ainda houver vaga na fila.
+
+    Args:
+        sender_phone: Número de telefone do remetente.
+        incoming_msg: Texto da mensagem recebida.
+
+    Returns:
+        True se a mensagem foi enfileirada, False se o pool está saturado.
+    """
+    if not _vagas_fila_mensagens.acquire(blocking=False):
+        logging.warning(f"WEBHOOK | Pool saturado ({_MAX_MENSAGENS_PENDENTES} pendentes), recusando mensagem de {sender_phone}")
+        return False
+    try:
+        futuro = _EXECUTOR.submit(process_message_async, sender_phone, incoming_msg)
+    except RuntimeError as e:
+        # Pool já desligado (encerramento do processo): devolve a vaga reservada
+        _vagas_fila_mensagens.release()
+        logging.warning(f"WEBHOOK | Pool indisponível ({e}), recusando mensagem de {sender_phone}")
+        return False
+    futuro.add_done_callback(lambda _: _vagas_fila_mensagens.release())
+    return True
+
+
 @aplicativo.route("/webhook", methods=["POST"])
 def webhook():
     """
@@ -3067,27 +3393,27 @@ def webhook():
     incoming_msg = request.values.get("Body", "").strip()
     sender_phone = request.values.get("From", "")
     
-    log_info(
-        "TWILIO WEBHOOK | Mensagem recebida",
-        user_id=sender_phone,
-        mensagem_completa_recebida=incoming_msg,
-        tamanho_mensagem=len(incoming_msg) if incoming_msg else 0,
-        categoria="TWILIO_WEBHOOK"
-    )
+    if log_habilitado():
+        log_info(
+            "TWILIO WEBHOOK | Mensagem recebida",
+            user_id=sender_phone,
+            mensagem_completa_recebida=incoming_msg,
+            tamanho_mensagem=len(incoming_msg) if incoming_msg else 0,
+            categoria="TWILIO_WEBHOOK"
+        )
     
     # Valida se os dados essenciais foram recebidos
     if not incoming_msg or not sender_phone:
         logging.warning("TWILIO | 'Body' ou 'From' ausentes na requisição.")
-        return "", 200 # Responde OK para não gerar erro na plataforma
+        return _TWIML_ACK, 200, _CABECALHOS_TWIML # Responde OK para não gerar erro na plataforma
 
-    # Inicia a thread para processar a mensagem sem bloquear a resposta do webhook
-    thread = threading.Thread(
-        target=process_message_async, args=(sender_phone, incoming_msg)
-    )
-    thread.start()
+    # Enfileira o processamento no pool para não bloquear a resposta do webhook
+    if not _enfileirar_mensagem(sender_phone, incoming_msg):
+        # A Twilio não reenvia o webhook após 503: responde 200 pedindo ao usuário para repetir
+        return _TWIML_SOBRECARGA, 200, _CABECALHOS_TWIML
     
-    # Responde imediatamente à Twilio com um status 200 (OK)
-    return "", 200
+    # Responde imediatamente à Twilio com um TwiML vazio (nenhuma mensagem síncrona)
+    return _TWIML_ACK, 200, _CABECALHOS_TWIML
 
 
 # Vonage
@@ -3097,17 +3423,24 @@ def inbound_message():
     Endpoint para o webhook da Vonage.
     A Vonage envia os dados como um corpo JSON (request.get_json()).
     """
-    # Obtém o corpo da requisição como um dicionário Python (JSON)
-    data = request.get_json()
+    # Obtém o corpo da requisição como um dicionário Python (JSON); silent evita exceção
+    # (415/400) para corpo ausente, malformado ou sem Content-Type JSON
+    data = request.get_json(silent=True)
     if not data:
         logging.warning("VONAGE | Webhook recebido sem corpo JSON.")
         return jsonify({"error": "Missing JSON body"}), 400
 
+    # Eventos que não são texto (mídia, localização...) não têm o que processar
+    tipo_mensagem = data.get("message_type", "text")
+    if tipo_mensagem != "text":
+        logging.info("VONAGE | Evento '%s' ignorado (apenas texto é processado).", tipo_mensagem)
+        return "", 200
+
     # Extrai a mensagem e o telefone do remetente do JSON
     incoming_msg = (data.get("text", "") or "").strip()
     sender_phone = str(data.get("from", "") or "").strip() # Garante que seja uma string
 
-    logging.info(f"VONAGE | Mensagem recebida de {sender_phone}: {incoming_msg}")
+    logging.info("VONAGE | Mensagem recebida de %s: %s", sender_phone, incoming_msg)
 
     # Valida se a mensagem e o remetente foram recebidos
     if not incoming_msg or not sender_phone:
@@ -3115,10 +3448,9 @@ def inbound_message():
         return "", 200
 
     # Reutiliza EXATAMENTE a mesma função de processamento da Twilio
-    thread = threading.Thread(
-        target=process_message_async, args=(sender_phone, incoming_msg)
-    )
-    thread.start()
+    if not _enfileirar_mensagem(sender_phone, incoming_msg):
+        # Sem 200 a Vonage reenvia o webhook mais tarde
+        return "", 503
 
     # Responde imediatamente à Vonage com um status 200 (OK)
     return "", 200
@@ -3137,13 +3469,9 @@ def webchat():
     # Usamos um 'sender_id' para manter o histórico da conversa, pode ser qualquer string.
     sender_id = f"webchat:{data['sender_id']}" 
     
-    logging.info(f"WEBCHAT | Mensagem recebida de {sender_id}: {incoming_msg}")
-    print(f">>> 📥 [ENTRADA] ==========================================")
-    print(f">>> 📥 [ENTRADA] Nova mensagem recebida do webchat")  
-    print(f">>> 📥 [ENTRADA] Sender ID: {sender_id}")
-    print(f">>> 📥 [ENTRADA] Mensagem: '{incoming_msg}'")
-    print(f">>> 📥 [ENTRADA] Timestamp: {datetime.now().strftime('%H:%M:%S')}")
-    print(f">>> 📥 [ENTRADA] ==========================================")
+    logging.info("WEBCHAT | Mensagem recebida de %s: %s", sender_id, incoming_msg)
+    # O registro de log já traz o horário: mede só o tempo de processamento
+    inicio_ns = time.monotonic_ns()
 
     # Este é o ponto crucial: precisamos refatorar um pouco o process_message_async
     # para que ele RETORNE a resposta em vez de enviá-la.
@@ -3151,6 +3479,10 @@ def webchat():
     
     # A lógica de processamento é a mesma, mas a resposta volta para o React.
     response_text = process_message_for_web(sender_id, incoming_msg)
+    app_logger.debug(
+        "📤 [SAÍDA] Resposta do webchat para %s em %d ms",
+        sender_id, (time.monotonic_ns() - inicio_ns) // 1_000_000,
+    )
 
     return jsonify({"reply": response_text})
 
@@ -3163,6 +3495,9 @@ def limpar_carrinho_endpoint():
     if not user_id:
         return jsonify({"error": "user_id é obrigatório"}), 400
     
+    # Força nova resolução da sessão com CNPJ na próxima mensagem
+    esquecer_sessao_validada(user_id)
+
     session = carregar_sessao(user_id)
     shopping_cart = session.get("shopping_cart", [])
     
@@ -3177,11 +3512,41 @@ def limpar_carrinho_endpoint():
     adicionar_mensagem_historico(session, "assistant", message, "CLEAR_CART_API")
     salvar_sessao(user_id, session)
     
-    return jsonify({
+    resposta = {
         "success": True,
         "response_text": message,
-        "dados_sessao": session
-    })
+        "cart": empty_cart
+    }
+    # A sessão inteira (histórico incluso) só é serializada quando pedida explicitamente
+    if request.args.get("include_session", "").lower() in ("1", "true"):
+        resposta["dados_sessao"] = session
+    return jsonify(resposta)
 
 if __name__ == "__main__":
-    aplicativo.run(host="0.0.0.0", port=8080, debug=True)
\ No newline at end of file
+    porta = int(os.getenv("PORT", "8080"))
+    # Objetos de longa duração (rotas, clientes, KB, tabelas) já existem: tira-os das varreduras
+    # do GC e espaça as coletas da geração 0, que cada mensagem enche com dicts/strings curtos
+    gc.collect()
+    gc.freeze()
+    gc.set_threshold(int(os.getenv("GAV_GC_GEN0", "50000")), 10, 10)
+    if os.getenv("GAV_DEV_SERVER", "0") == "1":
+        # Servidor de desenvolvimento do Werkzeug, com reloader e debugger
+        aplicativo.run(host="0.0.0.0", port=porta, debug=True)
+    else:
+        try:
+            from waitress import serve
+        except ImportError:
+            serve = None
+        if serve is not None:
+            # Servidor WSGI de produção: conexões keep-alive e pool fixo de threads HTTP.
+            # channel_timeout é o tempo (s) que uma conexão ociosa fica aberta antes de ser fechada
+            serve(
+                aplicativo,
+                host="0.0.0.0",
+                port=porta,
+                threads=int(os.getenv("GAV_HTTP_THREADS", "8")),
+                channel_timeout=int(os.getenv("GAV_IDLE_TIMEOUT", "75")),
+            )
+        else:
+            logging.warning("waitress não disponível - usando o servidor do Werkzeug sem debug")
+            aplicativo.run(host="0.0.0.0", port=porta, debug=False, threaded=True)
\ No newline at end of file
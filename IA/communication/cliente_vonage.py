@@ -4,7 +4,11 @@
 # Signature Secret / JWT token - UjL1GlSAOQYyfU4UOiF73PMZ3xZz4Yp3SaXfV6qPdK3tv1GNWF
 
 
+import os
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 ID_REMETENTE_WHATSAPP = '14157386102'
 NUMERO_DESTINO_MENSAGENS = '5511940726493'
@@ -13,6 +17,30 @@ SEGREDO_API_VONAGE = 'RIoRzUgBljOla5q2'
 ENDPOINT = "https://messages-sandbox.nexmo.com/v1/messages"
 ID_APLICACAO_VONAGE = '2f4fde7f-5a20-41dd-b944-e9914f8e6520'
 
+# Pool HTTP: as threads de envio reutilizam conexões TLS abertas com a API
+VONAGE_POOL_MAXSIZE = int(os.getenv("VONAGE_POOL_MAXSIZE", 16))
+
+
+def _criar_sessao_http() -> requests.Session:
+    """Cria a sessão HTTP do Vonage com keep-alive, credenciais e retentativa de conexão."""
+    sessao = requests.Session()
+    # Retry só em falha de conexão: o urllib3 não repete POST já enviado (sem mensagem duplicada)
+    adaptador = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=VONAGE_POOL_MAXSIZE,
+        max_retries=Retry(total=2, backoff_factor=0.2),
+    )
+    sessao.mount("https://", adaptador)
+    sessao.auth = (CHAVE_API_VONAGE, SEGREDO_API_VONAGE)  # Autenticação Básica
+    sessao.headers.update({
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+    })
+    return sessao
+
+
+_sessao_http = _criar_sessao_http()
+
 def enviar_whatsapp(mensagem: str) -> dict:
     """Envia uma mensagem de WhatsApp usando a API do Vonage.
 
@@ -29,16 +57,6 @@ def enviar_whatsapp(mensagem: str) -> dict:
         "text": mensagem,
         "channel": "whatsapp"
     }
-    cabecalhos = {
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
-    resposta = requests.post(
-        ENDPOINT,
-        auth=(CHAVE_API_VONAGE, SEGREDO_API_VONAGE),  # Autenticação Básica
-        json=carga_util,
-        headers=cabecalhos,
-        timeout=10,
-    )
+    resposta = _sessao_http.post(ENDPOINT, json=carga_util, timeout=10)
     resposta.raise_for_status()
     return resposta.json()
\ No newline at end of file
@@ -1,5 +1,8 @@
 # file: IA/communication/twilio_client.py
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 from dotenv import load_dotenv
 import sys
@@ -20,10 +23,27 @@ TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM", "whatsapp:+14155238886")
 
+# Pool HTTP: as threads de envio reutilizam conexões TLS abertas com a API
+TWILIO_POOL_MAXSIZE = int(os.getenv("TWILIO_POOL_MAXSIZE", 16))
+
+
+def _criar_http_client() -> TwilioHttpClient:
+    """Cria o cliente HTTP do Twilio com sessão keep-alive e retentativa de conexão."""
+    http_client = TwilioHttpClient(pool_connections=True)
+    # Retry só em falha de conexão: o urllib3 não repete POST já enviado (sem mensagem duplicada)
+    adaptador = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=TWILIO_POOL_MAXSIZE,
+        max_retries=Retry(total=2, backoff_factor=0.2),
+    )
+    http_client.session.mount("https://", adaptador)
+    return http_client
+
+
 # Inicializa cliente Twilio
 twilio_client = None
 if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
-    twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, http_client=_criar_http_client())
     log_info("Cliente Twilio inicializado com sucesso", categoria="TWILIO_INIT")
 else:
     log_error("Credenciais do Twilio não encontradas", categoria="TWILIO_INIT")
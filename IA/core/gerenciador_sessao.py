@@ -5,29 +5,67 @@ Gerenciador de Sessões do G.A.V.
 
 import os
 import json
+import functools
+import hashlib
 import logging
 import pickle
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Union, Any
 import redis
 import re
 from utils.extrator_quantidade import detectar_modificadores_quantidade
 
+# orjson (opcional): (de)serialização das sessões em arquivo sem passar pelo json puro
+try:
+    import orjson
+    ORJSON_DISPONIVEL = True
+except ImportError:
+    ORJSON_DISPONIVEL = False
+
 # Configurações
 REDIS_ATIVADO = os.getenv("REDIS_ENABLED", "false").lower() == "true"
 HOST_REDIS = os.getenv("REDIS_HOST", "localhost")
 PORTA_REDIS = int(os.getenv("REDIS_PORT", 6379))
 DB_REDIS = int(os.getenv("REDIS_DB", 0))
 TTL_SESSAO = int(os.getenv("SESSION_TTL", 86400))  # 24 horas em segundos
+MAX_CONEXOES_REDIS = int(os.getenv("REDIS_MAX_CONNECTIONS", 64))  # Conexões compartilhadas pelas threads do pool
+TIMEOUT_REDIS = float(os.getenv("REDIS_TIMEOUT", 2))  # Segundos até cair para o armazenamento em arquivo
+MAX_HISTORICO_SESSAO = int(os.getenv("SESSION_MAX_HISTORY", 40))  # Mensagens antes de resumir
+HISTORICO_RECENTE_SESSAO = int(os.getenv("SESSION_RECENT_HISTORY", 20))  # Mensagens mantidas após resumir
+TTL_CACHE_SESSAO = int(os.getenv("SESSION_CACHE_TTL", 60))  # Segundos; 0 desativa o cache local
+MAX_CACHE_SESSAO = int(os.getenv("SESSION_CACHE_SIZE", 1024))  # Sessões mantidas em memória
+MAX_SESSOES_VALIDADAS = int(os.getenv("VALIDATED_SESSIONS_SIZE", 10000))  # Telefones com CNPJ já validado
+
+# Cache local das últimas sessões gravadas: mensagens em sequência do mesmo usuário não voltam
+# ao Redis/disco. Guarda o pickle (não o dict) para cada leitura devolver uma cópia independente.
+# Com Redis, cada entrada leva a versão da sessão e só é usada se ela ainda for a atual no Redis,
+# pois outro processo/contêiner pode ter regravado a sessão nesse meio-tempo.
+_cache_sessoes: "OrderedDict[str, tuple]" = OrderedDict()
+_lock_cache_sessoes = threading.Lock()
+
+# Telefone -> ID da sessão com CNPJ já validado. Cada entrada vale no máximo TTL_SESSAO, o prazo
+# da sessão a que aponta, e sai antes se essa sessão for limpa ou removida por idade.
+_sessoes_validadas: "OrderedDict[str, tuple]" = OrderedDict()
+_lock_sessoes_validadas = threading.Lock()
 
 # Cliente Redis (opcional)
 cliente_redis = None
 if REDIS_ATIVADO:
     try:
+        # Pool limitado e bloqueante: as threads de mensagem reaproveitam conexões em vez de abrir novas
         cliente_redis = redis.Redis(
-            host=HOST_REDIS,
-            port=PORTA_REDIS,
-            db=DB_REDIS,
+            connection_pool=redis.BlockingConnectionPool(
+                host=HOST_REDIS,
+                port=PORTA_REDIS,
+                db=DB_REDIS,
+                max_connections=MAX_CONEXOES_REDIS,
+                timeout=TIMEOUT_REDIS,
+                socket_timeout=TIMEOUT_REDIS,
+                socket_connect_timeout=TIMEOUT_REDIS,
+            ),
             decode_responses=False
         )
         cliente_redis.ping()
@@ -36,6 +74,11 @@ if REDIS_ATIVADO:
         logging.warning(f"Redis não disponível: {e}. Usando armazenamento em arquivo.")
         cliente_redis = None
 
+def _nome_arquivo_sessao(id_sessao: str) -> str:
+    """Retorna o nome do arquivo de sessão (sem diretório) para o ID informado."""
+    id_seguro = id_sessao.replace(":", "_").replace("/", "_")
+    return f"sessao_{id_seguro}.json"
+
 def _obter_caminho_arquivo_sessao(id_sessao: str) -> str:
     """Retorna o caminho do arquivo de sessão.
 
@@ -50,11 +93,144 @@ def _obter_caminho_arquivo_sessao(id_sessao: str) -> str:
     if not os.path.exists(diretorio_sessoes):
         os.makedirs(diretorio_sessoes)
     
-    id_seguro = id_sessao.replace(":", "_").replace("/", "_")
-    caminho_arquivo = os.path.join(diretorio_sessoes, f"sessao_{id_seguro}.json")
+    caminho_arquivo = os.path.join(diretorio_sessoes, _nome_arquivo_sessao(id_sessao))
     logging.debug(f"Caminho do arquivo de sessão: {caminho_arquivo}")
     return caminho_arquivo
 
+def _chave_versao_sessao(id_sessao: str) -> str:
+    """Retorna a chave Redis do contador de versão da sessão."""
+    return f"sessao_versao:{id_sessao}"
+
+def _obter_versao_redis(id_sessao: str) -> Optional[int]:
+    """Lê a versão atual da sessão no Redis.
+
+    Args:
+        id_sessao: O ID da sessão.
+
+    Returns:
+        A versão (0 se nunca gravada) ou None se o Redis não respondeu.
+    """
+    try:
+        versao = cliente_redis.get(_chave_versao_sessao(id_sessao))
+    except Exception as e:
+        logging.warning(f"Erro ao ler versão da sessão no Redis: {e}")
+        return None
+    return int(versao) if versao else 0
+
+def _obter_sessao_em_cache(id_sessao: str) -> Optional[Dict]:
+    """Retorna uma cópia da sessão do cache local, se ainda válida.
+
+    Args:
+        id_sessao: O ID da sessão.
+
+    Returns:
+        Os dados da sessão ou None se não estiver em cache, expirada ou
+        desatualizada em relação ao Redis.
+    """
+    with _lock_cache_sessoes:
+        entrada = _cache_sessoes.get(id_sessao)
+        if entrada is None:
+            return None
+        dados, expira_em, versao = entrada
+        if expira_em < time.monotonic():
+            del _cache_sessoes[id_sessao]
+            return None
+        _cache_sessoes.move_to_end(id_sessao)
+    if cliente_redis and (versao is None or _obter_versao_redis(id_sessao) != versao):
+        # Outro processo gravou (ou limpou) a sessão depois: a cópia local não serve mais
+        _descartar_sessao_do_cache(id_sessao)
+        return None
+    return pickle.loads(dados)
+
+def _guardar_sessao_em_cache(id_sessao: str, dados: bytes, versao: Optional[int] = None):
+    """Guarda a sessão serializada no cache local, descartando a menos usada se cheio.
+
+    Args:
+        id_sessao: O ID da sessão.
+        dados: A sessão serializada com pickle.
+        versao: A versão da sessão no Redis (None quando gravada só em arquivo).
+    """
+    with _lock_cache_sessoes:
+        _cache_sessoes[id_sessao] = (dados, time.monotonic() + TTL_CACHE_SESSAO, versao)
+        _cache_sessoes.move_to_end(id_sessao)
+        while len(_cache_sessoes) > MAX_CACHE_SESSAO:
+            _cache_sessoes.popitem(last=False)
+
+def _descartar_sessao_do_cache(id_sessao: str):
+    """Remove a sessão do cache local.
+
+    Args:
+        id_sessao: O ID da sessão.
+    """
+    with _lock_cache_sessoes:
+        _cache_sessoes.pop(id_sessao, None)
+
+def _descartar_arquivo_do_cache(nome_arquivo: str):
+    """Remove do cache local as sessões gravadas no arquivo informado.
+
+    Args:
+        nome_arquivo: O nome do arquivo de sessão removido.
+    """
+    with _lock_cache_sessoes:
+        ids_sessao = [
+            id_sessao for id_sessao in _cache_sessoes
+            if _nome_arquivo_sessao(id_sessao) == nome_arquivo
+        ]
+        for id_sessao in ids_sessao:
+            del _cache_sessoes[id_sessao]
+
+def registrar_sessao_validada(telefone: str, id_sessao: str):
+    """Memoriza o ID da sessão com CNPJ validado para o telefone.
+
+    Args:
+        telefone: O telefone do usuário.
+        id_sessao: O ID da sessão com CNPJ.
+    """
+    with _lock_sessoes_validadas:
+        _sessoes_validadas[telefone] = (id_sessao, time.monotonic() + TTL_SESSAO)
+        _sessoes_validadas.move_to_end(telefone)
+        while len(_sessoes_validadas) > MAX_SESSOES_VALIDADAS:
+            _sessoes_validadas.popitem(last=False)
+
+def obter_sessao_validada(telefone: str) -> Optional[str]:
+    """Retorna o ID da sessão com CNPJ validado para o telefone, se ainda válido.
+
+    Args:
+        telefone: O telefone do usuário.
+
+    Returns:
+        O ID da sessão ou None se o telefone não estiver memorizado (ou expirou).
+    """
+    with _lock_sessoes_validadas:
+        entrada = _sessoes_validadas.get(telefone)
+        if entrada is None:
+            return None
+        id_sessao, expira_em = entrada
+        if expira_em < time.monotonic():
+            del _sessoes_validadas[telefone]
+            return None
+        _sessoes_validadas.move_to_end(telefone)
+        return id_sessao
+
+def esquecer_sessao_validada(telefone: str):
+    """Remove o telefone das sessões com CNPJ validado.
+
+    Args:
+        telefone: O telefone do usuário.
+    """
+    with _lock_sessoes_validadas:
+        _sessoes_validadas.pop(telefone, None)
+
+def _esquecer_validacoes(deve_esquecer):
+    """Remove as validações cujo (telefone, ID da sessão) satisfaz o critério informado."""
+    with _lock_sessoes_validadas:
+        telefones = [
+            telefone for telefone, (id_sessao, _) in _sessoes_validadas.items()
+            if deve_esquecer(telefone, id_sessao)
+        ]
+        for telefone in telefones:
+            del _sessoes_validadas[telefone]
+
 def carregar_sessao(id_sessao: str) -> Dict:
     """Carrega os dados da sessão do armazenamento.
 
@@ -65,6 +241,12 @@ def carregar_sessao(id_sessao: str) -> Dict:
         Um dicionário com os dados da sessão.
     """
     logging.debug(f"Carregando sessão para o ID: {id_sessao}")
+    if TTL_CACHE_SESSAO > 0:
+        sessao = _obter_sessao_em_cache(id_sessao)
+        if sessao is not None:
+            logging.debug(f"[SESSAO] Sessão carregada do cache local: {id_sessao}")
+            return sessao
+
     sessao_padrao = {
         "contexto_cliente": None,
         "carrinho_compras": [],
@@ -88,10 +270,16 @@ def carregar_sessao(id_sessao: str) -> Dict:
     
     if cliente_redis:
         try:
-            dados = cliente_redis.get(f"sessao:{id_sessao}")
+            # Sessão e versão na mesma ida ao Redis
+            pipeline = cliente_redis.pipeline()
+            pipeline.get(f"sessao:{id_sessao}")
+            pipeline.get(_chave_versao_sessao(id_sessao))
+            dados, versao = pipeline.execute()
             if dados:
                 sessao = pickle.loads(dados)
                 logging.debug(f"[SESSAO] Sessão carregada do Redis: {id_sessao}")
+                if TTL_CACHE_SESSAO > 0:
+                    _guardar_sessao_em_cache(id_sessao, dados, int(versao) if versao else 0)
                 return sessao
         except Exception as e:
             logging.warning(f"Erro ao carregar sessão do Redis: {e}")
@@ -100,15 +288,19 @@ def carregar_sessao(id_sessao: str) -> Dict:
     
     if os.path.exists(caminho_arquivo):
         try:
-            with open(caminho_arquivo, 'r', encoding='utf-8') as f:
-                sessao = json.load(f)
-                logging.debug(f"[SESSAO] Sessão carregada do arquivo: {caminho_arquivo}")
-                
-                for chave, valor in sessao_padrao.items():
-                    if chave not in sessao:
-                        sessao[chave] = valor
-                
-                return sessao
+            if ORJSON_DISPONIVEL:
+                with open(caminho_arquivo, 'rb') as f:
+                    sessao = orjson.loads(f.read())
+            else:
+                with open(caminho_arquivo, 'r', encoding='utf-8') as f:
+                    sessao = json.load(f)
+            logging.debug(f"[SESSAO] Sessão carregada do arquivo: {caminho_arquivo}")
+
+            for chave, valor in sessao_padrao.items():
+                if chave not in sessao:
+                    sessao[chave] = valor
+
+            return sessao
         except Exception as e:
             logging.error(f"Erro ao carregar sessão do arquivo: {e}")
     
@@ -125,15 +317,21 @@ def salvar_sessao(id_sessao: str, dados_sessao: Dict):
     logging.debug(f"Salvando sessão para o ID: {id_sessao}")
     dados_sessao["ultima_atividade"] = datetime.now().isoformat()
     _resumir_mensagens_antigas(dados_sessao)
+    # Um único pickle serve ao Redis e ao cache local
+    dados_serializados = pickle.dumps(dados_sessao) if (cliente_redis or TTL_CACHE_SESSAO > 0) else None
     
     if cliente_redis:
         try:
-            cliente_redis.setex(
-                f"sessao:{id_sessao}",
-                TTL_SESSAO,
-                pickle.dumps(dados_sessao)
-            )
+            # Grava a sessão e avança a versão juntas, para os caches locais dos outros processos
+            chave_versao = _chave_versao_sessao(id_sessao)
+            pipeline = cliente_redis.pipeline()
+            pipeline.setex(f"sessao:{id_sessao}", TTL_SESSAO, dados_serializados)
+            pipeline.incr(chave_versao)
+            pipeline.expire(chave_versao, TTL_SESSAO)
+            _, versao, _ = pipeline.execute()
             logging.debug(f"[SESSAO] Sessão salva no Redis: {id_sessao}")
+            if TTL_CACHE_SESSAO > 0:
+                _guardar_sessao_em_cache(id_sessao, dados_serializados, int(versao))
             return
         except Exception as e:
             logging.warning(f"Erro ao salvar sessão no Redis: {e}")
@@ -141,11 +339,23 @@ def salvar_sessao(id_sessao: str, dados_sessao: Dict):
     caminho_arquivo = _obter_caminho_arquivo_sessao(id_sessao)
     
     try:
-        with open(caminho_arquivo, 'w', encoding='utf-8') as f:
-            json.dump(dados_sessao, f, ensure_ascii=False, indent=2)
+        # Grava em arquivo temporário e troca de forma atômica para nunca deixar sessão pela metade
+        caminho_temporario = f"{caminho_arquivo}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # JSON compacto: a sessão é regravada a cada turno, sem indentação o arquivo fica bem menor
+        if ORJSON_DISPONIVEL:
+            with open(caminho_temporario, 'wb') as f:
+                f.write(orjson.dumps(dados_sessao, option=orjson.OPT_NON_STR_KEYS))
+        else:
+            with open(caminho_temporario, 'w', encoding='utf-8') as f:
+                json.dump(dados_sessao, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(caminho_temporario, caminho_arquivo)
         logging.debug(f"[SESSAO] Sessão salva no arquivo: {caminho_arquivo}")
+        if TTL_CACHE_SESSAO > 0:
+            _guardar_sessao_em_cache(id_sessao, dados_serializados)
     except Exception as e:
         logging.error(f"Erro ao salvar sessão no arquivo: {e}")
+        # Não deixa no cache uma versão que não chegou ao armazenamento
+        _descartar_sessao_do_cache(id_sessao)
 
 def limpar_sessao(id_sessao: str):
     """Limpa os dados da sessão.
@@ -154,9 +364,19 @@ def limpar_sessao(id_sessao: str):
         id_sessao: O ID da sessão.
     """
     logging.debug(f"Limpando sessão para o ID: {id_sessao}")
+    _descartar_sessao_do_cache(id_sessao)
+    # Sem a sessão, o telefone precisa passar pela validação de CNPJ de novo
+    _esquecer_validacoes(lambda telefone, id_validado: id_sessao in (telefone, id_validado))
     if cliente_redis:
         try:
-            cliente_redis.delete(f"sessao:{id_sessao}")
+            # A versão avança em vez de ser apagada: um contador recomeçado do zero
+            # poderia coincidir com a versão de uma cópia antiga em outro processo
+            chave_versao = _chave_versao_sessao(id_sessao)
+            pipeline = cliente_redis.pipeline()
+            pipeline.delete(f"sessao:{id_sessao}")
+            pipeline.incr(chave_versao)
+            pipeline.expire(chave_versao, TTL_SESSAO)
+            pipeline.execute()
             logging.debug(f"[SESSAO] Sessão removida do Redis: {id_sessao}")
         except Exception as e:
             logging.warning(f"Erro ao remover sessão do Redis: {e}")
@@ -190,10 +410,48 @@ def limpar_sessoes_antigas():
                     tempo_arquivo = datetime.fromtimestamp(os.path.getmtime(caminho_arquivo))
                     if tempo_arquivo < data_corte:
                         os.remove(caminho_arquivo)
+                        _descartar_arquivo_do_cache(nome_arquivo)
+                        _esquecer_validacoes(
+                            lambda telefone, id_validado: nome_arquivo in (
+                                _nome_arquivo_sessao(telefone), _nome_arquivo_sessao(id_validado)
+                            )
+                        )
                         logging.info(f"Sessão antiga removida: {nome_arquivo}")
                 except Exception as e:
                     logging.warning(f"Erro ao processar {nome_arquivo}: {e}")
 
+# Troca separadores decimal/milhar em uma única passada (1,234.56 -> 1.234,56)
+_TABELA_SEPARADORES_BRL = str.maketrans({",": ".", ".": ","})
+
+
+# Os mesmos preços se repetem a cada exibição do carrinho/resumo; memoiza pelo valor
+@functools.lru_cache(maxsize=4096)
+def formatar_preco_brl(valor: float) -> str:
+    """Formata um valor no padrão monetário brasileiro (R$ 1.234,56).
+
+    Args:
+        valor: O valor a ser formatado.
+
+    Returns:
+        O valor formatado.
+    """
+    return f"R$ {valor:,.2f}".translate(_TABELA_SEPARADORES_BRL)
+
+def formatar_quantidade(qt: Union[int, float]) -> str:
+    """Formata uma quantidade para exibição, sem zeros decimais à direita.
+
+    Args:
+        qt: A quantidade a ser formatada.
+
+    Returns:
+        A quantidade formatada (ex.: 2, 1.5).
+    """
+    if not isinstance(qt, float):
+        return str(qt)
+    if qt.is_integer():
+        return str(int(qt))
+    return f"{qt:.1f}".rstrip("0").rstrip(".")
+
 def formatar_lista_produtos_para_exibicao(produtos: List[Dict], titulo: str, tem_mais: bool, offset: int = 0) -> str:
     """Formata uma lista de produtos para exibição no WhatsApp.
 
@@ -226,37 +484,40 @@ def formatar_lista_produtos_para_exibicao(produtos: List[Dict], titulo: str, tem
     produtos_limitados = produtos_unicos[:min(contagem_real, 10)]
     contagem_exibicao = len(produtos_limitados)
 
-    resposta = f"📦 *{titulo}:*\n\n"
+    partes = [f"📦 *{titulo}:*\n\n"]
 
     for i, p in enumerate(produtos_limitados, start=offset + 1):
         preco = p.get('pvenda') or p.get('preco_varejo', 0.0)
-        preco_str = f"R$ {preco:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        preco_str = formatar_preco_brl(preco)
 
         nome_produto = p.get('descricao') or p.get('canonical_name', 'Produto sem nome')
         
-        resposta += f"*{i}.* {nome_produto}\n"
-        resposta += f"    💰 {preco_str}\n\n"
+        partes.append(f"*{i}.* {nome_produto}\n    💰 {preco_str}\n\n")
     
     if contagem_exibicao == 1:
-        resposta += f"Digite *{offset + 1}* para selecionar este produto."
+        partes.append(f"Digite *{offset + 1}* para selecionar este produto.")
     elif contagem_exibicao == 2:
-        resposta += (
+        partes.append(
             f"Qual você quer? Digite *{offset + 1}* ou *{offset + 2}*."
         )
     elif contagem_exibicao <= 5:
         numeros = [str(offset + i + 1) for i in range(contagem_exibicao)]
-        resposta += f"Qual você quer? Digite {', '.join(numeros[:-1])} ou *{numeros[-1]}*."
+        partes.append(f"Qual você quer? Digite {', '.join(numeros[:-1])} ou *{numeros[-1]}*.")
     else:
         primeiro_num = offset + 1
         ultimo_num = offset + contagem_exibicao
-        resposta += f"Qual você quer? Digite o número de *{primeiro_num}* a *{ultimo_num}*."
+        partes.append(f"Qual você quer? Digite o número de *{primeiro_num}* a *{ultimo_num}*.")
     
     if tem_mais:
-        resposta += "\n📝 Digite *mais* para ver outros produtos!"
+        partes.append("\n📝 Digite *mais* para ver outros produtos!")
     
-    logging.debug(f"Lista de produtos formatada: {resposta}")
+    resposta = "".join(partes)
+    logging.debug("Lista de produtos formatada: %s", resposta)
     return resposta
 
+# Cabeçalho fixo da seção de promoções
+_CABECALHO_PROMOCOES = "🔥 *PROMOÇÕES ESPECIAIS* 🔥\n━━━━━━━━━━━━━━━━━━━━\n"
+
 def formatar_lista_produtos_inteligente(produtos_normais: List[Dict], produtos_promo: List[Dict], titulo: str) -> str:
     """Formata uma lista combinada de produtos normais e promocionais.
 
@@ -276,7 +537,7 @@ def formatar_lista_produtos_inteligente(produtos_normais: List[Dict], produtos_p
     produtos_com_desconto = []
     produtos_sem_desconto_extra = []
     
-    print(f">>> 🎯 [PROMO_DEBUG] Analisando {len(produtos_promo)} produtos promocionais")
+    logging.debug("🎯 [PROMO_DEBUG] Analisando %s produtos promocionais", len(produtos_promo))
     
     for p in produtos_promo:
         preco_antigo = p.get('pvenda') or p.get('preco_varejo', 0.0) or 0.0
@@ -301,59 +562,57 @@ def formatar_lista_produtos_inteligente(produtos_normais: List[Dict], produtos_p
         
         # Se tem desconto real (>1%), é promoção; senão é produto normal
         nome_produto = p.get('descricao', 'Produto sem nome')
-        print(f">>> 🎯 [PROMO_ANALISE] {nome_produto}: preço_antigo={preco_antigo}, preço_promo={preco_promo}, desconto={desconto:.1f}%")
+        logging.debug("🎯 [PROMO_ANALISE] %s: preço_antigo=%s, preço_promo=%s, desconto=%.1f%%", nome_produto, preco_antigo, preco_promo, desconto)
         
         if desconto > 1.0:
             produtos_com_desconto.append(p)
-            print(f">>> 🎯 [PROMO_VALIDA] ✅ {nome_produto} é uma promoção válida ({desconto:.1f}% OFF)")
+            logging.debug("🎯 [PROMO_VALIDA] ✅ %s é uma promoção válida (%.1f%% OFF)", nome_produto, desconto)
         else:
             produtos_sem_desconto_extra.append(p)
-            print(f">>> 🎯 [PROMO_NORMAL] ❌ {nome_produto} não tem desconto suficiente ({desconto:.1f}%)")
+            logging.debug("🎯 [PROMO_NORMAL] ❌ %s não tem desconto suficiente (%.1f%%)", nome_produto, desconto)
     
     # Unir todos os produtos normais
     todos_produtos_normais = produtos_normais + produtos_sem_desconto_extra
     
-    resposta = f"*{titulo}*\n\n"
+    partes = [f"*{titulo}*\n\n"]
     contador = 1
 
     # Mostrar produtos normais
     if todos_produtos_normais:
         for p in todos_produtos_normais:
             preco = p.get('_preco_promo') or p.get('preco_atual') or p.get('pvenda') or p.get('preco_varejo', 0.0)
-            preco_str = f"R$ {preco:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+            preco_str = formatar_preco_brl(preco)
             nome_produto = p.get('descricao') or p.get('canonical_name', 'Produto sem nome')
-            resposta += f"*{contador}.* {nome_produto}\n"
-            resposta += f"    💰 {preco_str}\n\n"
+            partes.append(f"*{contador}.* {nome_produto}\n    💰 {preco_str}\n\n")
             contador += 1
 
     # Mostrar produtos com desconto real como promoções
-    print(f">>> 🎯 [PROMO_RESULTADO] Encontradas {len(produtos_com_desconto)} promoções válidas")
+    logging.debug("🎯 [PROMO_RESULTADO] Encontradas %s promoções válidas", len(produtos_com_desconto))
     if produtos_com_desconto:
-        print(f">>> 🎯 [PROMO_EXIBE] ✅ Exibindo seção de promoções")
-        resposta += "🔥 *PROMOÇÕES ESPECIAIS* 🔥\n"
-        resposta += "━━━━━━━━━━━━━━━━━━━━\n"
+        logging.debug("🎯 [PROMO_EXIBE] ✅ Exibindo seção de promoções")
+        partes.append(_CABECALHO_PROMOCOES)
         
         for p in produtos_com_desconto:
-            preco_antigo_str = f"R$ {p['_preco_antigo']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-            preco_promo_str = f"R$ {p['_preco_promo']:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+            preco_antigo_str = formatar_preco_brl(p['_preco_antigo'])
+            preco_promo_str = formatar_preco_brl(p['_preco_promo'])
             nome_produto = p.get('descricao') or p.get('canonical_name', 'Produto sem nome')
 
-            resposta += f"*{contador}.* {nome_produto}\n"
-            resposta += f"    ~{preco_antigo_str}~ → *{preco_promo_str}* ({int(p['_desconto'])}% OFF)\n\n"
+            partes.append(f"*{contador}.* {nome_produto}\n    ~{preco_antigo_str}~ → *{preco_promo_str}* ({int(p['_desconto'])}% OFF)\n\n")
             contador += 1
 
     total_produtos = len(todos_produtos_normais) + len(produtos_com_desconto)
     
     # Instruções de seleção
     if total_produtos == 1:
-        resposta += "Digite *1* para selecionar este produto."
+        partes.append("Digite *1* para selecionar este produto.")
     else:
-        resposta += f"Qual você quer? Digite o número de *1* a *{total_produtos}*."
+        partes.append(f"Qual você quer? Digite o número de *1* a *{total_produtos}*.")
     
     # Opção de ver mais produtos (sempre disponível para dar mais opções ao usuário)
-    resposta += f"\n📝 Digite *mais* para ver outros produtos desta categoria!"
+    partes.append("\n📝 Digite *mais* para ver outros produtos desta categoria!")
 
-    logging.debug(f"Lista de produtos inteligente formatada: {resposta}")
+    resposta = "".join(partes)
+    logging.debug("Lista de produtos inteligente formatada: %s", resposta)
     return resposta
 
 def formatar_carrinho_para_exibicao(carrinho: List[Dict]) -> str:
@@ -404,7 +663,7 @@ def formatar_carrinho_para_exibicao(carrinho: List[Dict]) -> str:
     logging.debug(f"Carrinho formatado: {resposta}")
     return resposta
 
-def _resumir_mensagens_antigas(dados_sessao: Dict, max_historico: int = 40, manter_recentes: int = 20):
+def _resumir_mensagens_antigas(dados_sessao: Dict, max_historico: int = MAX_HISTORICO_SESSAO, manter_recentes: int = HISTORICO_RECENTE_SESSAO):
     """Resume mensagens antigas para evitar crescimento infinito do histórico.
 
     Args:
@@ -431,9 +690,22 @@ def _resumir_mensagens_antigas(dados_sessao: Dict, max_historico: int = 40, mant
     combinado = (resumo_existente + " | " + novo_resumo).strip(" |") if resumo_existente else novo_resumo
     dados_sessao["resumo_conversa"] = combinado[-1000:]
 
-    dados_sessao["historico_conversa"] = historico[-manter_recentes:]
+    # Remove no próprio objeto para manter o histórico limitado sem criar nova lista
+    del historico[:-manter_recentes]
     logging.debug("Mensagens antigas do histórico resumidas com sucesso.")
 
+def calcular_hash_mensagem(mensagem: str) -> str:
+    """Calcula um hash curto e estável do texto completo de uma mensagem.
+
+    Args:
+        mensagem: O texto da mensagem.
+
+    Returns:
+        O hash hexadecimal de 8 bytes da mensagem.
+    """
+    # Algoritmo fixo: o hash é gravado no histórico e comparado por outros processos/instalações
+    return hashlib.blake2b(mensagem.encode("utf-8"), digest_size=8).hexdigest()
+
 def adicionar_mensagem_historico(dados_sessao: Dict, role: str, mensagem: str, tipo_acao: str = ""):
     """Adiciona uma mensagem ao histórico da conversa.
 
@@ -443,18 +715,29 @@ def adicionar_mensagem_historico(dados_sessao: Dict, role: str, mensagem: str, t
         mensagem: A mensagem a ser adicionada.
         tipo_acao: O tipo de ação associado à mensagem.
     """
-    logging.debug(f"Adicionando mensagem ao histórico. Role: {role}, Tipo de Ação: {tipo_acao}, Mensagem: {mensagem[:100]}...")
-    if "historico_conversa" not in dados_sessao:
-        dados_sessao["historico_conversa"] = []
-    
-    dados_sessao["historico_conversa"].append({
-        "role": role,
-        "message": mensagem[:500],
-        "timestamp": datetime.now().isoformat(),
-        "action_type": tipo_acao
-    })
+    adicionar_mensagens_historico(dados_sessao, ((role, mensagem, tipo_acao),))
 
-    _resumir_mensagens_antigas(dados_sessao)
+def adicionar_mensagens_historico(dados_sessao: Dict, mensagens):
+    """Adiciona várias mensagens ao histórico de uma vez.
+
+    Usa um único timestamp. O limite do histórico é aplicado uma vez por turno,
+    em salvar_sessao, e não a cada mensagem adicionada.
+
+    Args:
+        dados_sessao: Os dados da sessão.
+        mensagens: Sequência de tuplas (role, mensagem, tipo_acao).
+    """
+    historico = dados_sessao.setdefault("historico_conversa", [])
+    timestamp = datetime.now().isoformat()
+    for role, mensagem, tipo_acao in mensagens:
+        logging.debug("Adicionando mensagem ao histórico. Role: %s, Tipo de Ação: %s, Mensagem: %.100s...", role, tipo_acao, mensagem)
+        historico.append({
+            "role": role,
+            "message": mensagem[:500],
+            "hash": calcular_hash_mensagem(mensagem),
+            "timestamp": timestamp,
+            "action_type": tipo_acao
+        })
 
 def obter_contexto_conversa(dados_sessao: Dict, max_mensagens: int = 14) -> str:
     """Retorna o contexto da conversa.
@@ -515,6 +798,25 @@ def obter_contexto_conversa(dados_sessao: Dict, max_mensagens: int = 14) -> str:
     logging.debug(f"Contexto da conversa obtido: {contexto_final[:200]}...")
     return contexto_final
 
+# Frases exatas e padrões de limpeza, preparados uma vez na importação
+_COMANDOS_LIMPAR_CARRINHO = frozenset({
+    'esvaziar carrinho', 'limpar carrinho', 'zerar carrinho',
+    'resetar carrinho', 'apagar carrinho', 'deletar carrinho',
+    'esvaziar tudo', 'limpar tudo', 'zerar tudo',
+    'apagar tudo', 'deletar tudo', 'remover tudo',
+    'começar de novo', 'recomeçar', 'reiniciar',
+    'do zero', 'novo pedido', 'nova compra',
+    'limpa carrinho', 'esvazia carrinho', 'zera carrinho'
+})
+_PADRAO_LIMPAR_CARRINHO = re.compile("|".join((
+    r'\b(esvaziar|limpar|zerar|apagar|deletar|remover)\s+(o\s+)?carrinho\b',
+    r'\b(carrinho|tudo)\s+(vazio|limpo|zerado)\b',
+    r'\bcomeca\w*\s+de\s+novo\b',
+    r'\bdo\s+zero\b',
+    r'\breinicia\w*\s+(carrinho|tudo|compra)\b',
+    r'\b(esvazia|limpa|zera)\s+(carrinho|tudo)?\b'
+)))
+
 def detectar_comandos_limpar_carrinho(mensagem: str) -> bool:
     """Detecta comandos de limpeza de carrinho.
 
@@ -524,36 +826,16 @@ def detectar_comandos_limpar_carrinho(mensagem: str) -> bool:
     Returns:
         True se um comando de limpeza for detectado, False caso contrário.
     """
-    logging.debug(f"Detectando comandos de limpar carrinho na mensagem: '{mensagem}'")
+    logging.debug("Detectando comandos de limpar carrinho na mensagem: '%s'", mensagem)
     mensagem_minuscula = mensagem.lower().strip()
     
-    comandos_limpar = [
-        'esvaziar carrinho', 'limpar carrinho', 'zerar carrinho',
-        'resetar carrinho', 'apagar carrinho', 'deletar carrinho',
-        'esvaziar tudo', 'limpar tudo', 'zerar tudo',
-        'apagar tudo', 'deletar tudo', 'remover tudo',
-        'começar de novo', 'recomeçar', 'reiniciar',
-        'do zero', 'novo pedido', 'nova compra',
-        'limpa carrinho', 'esvazia carrinho', 'zera carrinho'
-    ]
-    
-    if mensagem_minuscula in comandos_limpar:
+    if mensagem_minuscula in _COMANDOS_LIMPAR_CARRINHO:
         logging.debug("Comando de limpar carrinho detectado.")
         return True
     
-    padroes_limpar = [
-        r'\b(esvaziar|limpar|zerar|apagar|deletar|remover)\s+(o\s+)?carrinho\b',
-        r'\b(carrinho|tudo)\s+(vazio|limpo|zerado)\b',
-        r'\bcomeca\w*\s+de\s+novo\b',
-        r'\bdo\s+zero\b',
-        r'\breinicia\w*\s+(carrinho|tudo|compra)\b',
-        r'\b(esvazia|limpa|zera)\s+(carrinho|tudo)?\b'
-    ]
-    
-    for padrao in padroes_limpar:
-        if re.search(padrao, mensagem_minuscula):
-            logging.debug("Padrão de limpar carrinho detectado.")
-            return True
+    if _PADRAO_LIMPAR_CARRINHO.search(mensagem_minuscula):
+        logging.debug("Padrão de limpar carrinho detectado.")
+        return True
     
     logging.debug("Nenhum comando de limpar carrinho detectado.")
     return False
@@ -634,6 +916,20 @@ def obter_estatisticas_sessao(dados_sessao: Dict) -> Dict:
     logging.debug(f"Estatísticas da sessão: {estatisticas}")
     return estatisticas
 
+# Menus de ações rápidas: só existem três variações, montadas uma única vez
+_ACOES_RAPIDAS_PRODUTOS = "Digite o número (1, 2 ou 3) do produto desejado"
+_ACOES_RAPIDAS_COM_CARRINHO = "\n".join((
+    "*1* - 🔍 Buscar produtos",
+    "*2* - 🛒 Ver carrinho",
+    "*3* - ✅ Finalizar pedido",
+))
+_ACOES_RAPIDAS_SEM_CARRINHO = "\n".join((
+    "🔍 Digite o nome do produto",
+    "📦 Digite *produtos* para ver os mais vendidos",
+    "❓ Digite *ajuda* para mais opções",
+))
+
+
 def formatar_acoes_rapidas(tem_carrinho: bool = False, tem_produtos: bool = False) -> str:
     """Gera um menu de ações rápidas para o WhatsApp.
 
@@ -644,28 +940,9 @@ def formatar_acoes_rapidas(tem_carrinho: bool = False, tem_produtos: bool = Fals
     Returns:
         O menu de ações rápidas formatado.
     """
-    logging.debug(f"Formatando ações rápidas. Tem carrinho: {tem_carrinho}, Tem produtos: {tem_produtos}")
-    acoes = []
-    
     if tem_produtos:
-        return "Digite o número (1, 2 ou 3) do produto desejado"
-    
-    if tem_carrinho:
-        acoes = [
-            "*1* - 🔍 Buscar produtos",
-            "*2* - 🛒 Ver carrinho",
-            "*3* - ✅ Finalizar pedido"
-        ]
-    else:
-        acoes = [
-            "🔍 Digite o nome do produto",
-            "📦 Digite *produtos* para ver os mais vendidos",
-            "❓ Digite *ajuda* para mais opções"
-        ]
-    
-    resposta = "\n".join(acoes)
-    logging.debug(f"Ações rápidas formatadas: {resposta}")
-    return resposta
+        return _ACOES_RAPIDAS_PRODUTOS
+    return _ACOES_RAPIDAS_COM_CARRINHO if tem_carrinho else _ACOES_RAPIDAS_SEM_CARRINHO
 
 def atualizar_contexto_sessao(dados_sessao: Dict, novo_contexto: Dict):
     """Atualiza os dados da sessão.
@@ -11,6 +11,9 @@ from dotenv import load_dotenv
 from typing import Union, List, Dict
 import time
 import decimal
+import pickle
+import threading
+from collections import OrderedDict
 
 # Adiciona utils ao path se não estiver
 caminho_utils = Path(__file__).resolve().parent.parent / "utils"
@@ -18,26 +21,47 @@ if str(caminho_utils) not in sys.path:
     sys.path.insert(0, str(caminho_utils))
 
 from busca_aproximada import busca_aproximada_produtos, MotorBuscaAproximada
-from gav_logger import obter_logger, log_database_query, log_error, log_warning, log_info, log_debug
+from utils.gav_logger import obter_logger, log_database_query, log_error, log_warning, log_info, log_debug
 
 load_dotenv(dotenv_path='.env')  # Garante que o .env da pasta IA seja lido
 
-# Cache simples em memória para consultas repetidas
-_cache_consultas: Dict = {}
+# Cache simples em memória para consultas repetidas (resultados guardados serializados).
+# Limitado: algumas consultas são cacheadas pelo texto livre da busca do cliente
+MAX_CACHE_CONSULTAS = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+_cache_consultas: "OrderedDict[tuple, tuple]" = OrderedDict()
+_lock_cache_consultas = threading.Lock()
 
 def cache_query(ttl: int = 300):
-    """Decorator para cachear resultados de consultas ao banco."""
+    """Decorator para cachear resultados de consultas ao banco.
+
+    O resultado é guardado serializado e cada acerto devolve uma cópia nova:
+    quem chama pode alterar os produtos (ex.: gravar "qt" e pô-los no carrinho)
+    sem afetar o cache nem outros usuários. Acima de MAX_CACHE_CONSULTAS entradas,
+    as gravadas há mais tempo são descartadas primeiro.
+    """
     def decorator(func):
         def wrapper(*args, **kwargs):
             chave = (func.__name__, args, frozenset(kwargs.items()))
             agora = time.time()
-            if chave in _cache_consultas:
-                resultado, timestamp = _cache_consultas[chave]
-                if agora - timestamp < ttl:
-                    logging.debug(f"[CACHE_DB] Hit para {func.__name__}: {chave}")
-                    return resultado
+            with _lock_cache_consultas:
+                entrada = _cache_consultas.get(chave)
+                if entrada is not None and agora - entrada[1] >= ttl:
+                    del _cache_consultas[chave]
+                    entrada = None
+            if entrada is not None:
+                logging.debug("[CACHE_DB] Hit para %s: %s", func.__name__, chave)
+                return pickle.loads(entrada[0])
             resultado = func(*args, **kwargs)
-            _cache_consultas[chave] = (resultado, agora)
+            try:
+                dados = pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                logging.debug("[CACHE_DB] Resultado de %s não cacheado: %s", func.__name__, e)
+                return resultado
+            with _lock_cache_consultas:
+                _cache_consultas[chave] = (dados, agora)
+                _cache_consultas.move_to_end(chave)
+                while len(_cache_consultas) > MAX_CACHE_CONSULTAS:
+                    _cache_consultas.popitem(last=False)
             return resultado
         return wrapper
     return decorator
@@ -250,6 +274,7 @@ def obter_produtos_mais_vendidos_por_nome(nome_produto: str, limite: int = 10, o
         logging.error(f"Erro ao buscar produtos por nome '{nome_produto}': {e}")
         return []
 
+@cache_query()
 def pesquisar_produtos_com_sugestoes(nome_produto: str, limite: int = 10, offset: int = 0) -> Dict:
     """Busca produtos com sugestões inteligentes e busca aproximada.
 
@@ -372,6 +397,28 @@ def obter_detalhes_produto_fuzzy(termo_busca: str) -> List[Dict]:
     logging.debug(f"Encontrados {len(resultados_fuzzy)} produtos por busca aproximada para '{termo_busca}'.")
     return resultados_fuzzy
 
+def obter_melhor_produto_por_nome(nome_produto: str) -> Union[Dict, None]:
+    """Retorna o produto mais provável para um nome em uma única passada.
+
+    Tenta a busca exata (ranking de vendas) e, se vazia, a busca aproximada,
+    pedindo apenas o primeiro resultado de cada uma.
+
+    Args:
+        nome_produto: O nome do produto a ser buscado.
+
+    Returns:
+        Um dicionário com o produto encontrado ou None.
+    """
+    logging.debug(f"Buscando o melhor produto para '{nome_produto}'.")
+    if not nome_produto or len(nome_produto.strip()) < 2:
+        logging.debug("Nome do produto inválido para busca.")
+        return None
+
+    resultados = obter_produtos_mais_vendidos_por_nome(nome_produto, 1)
+    if not resultados:
+        resultados = busca_aproximada_produtos(nome_produto, 1)
+    return resultados[0] if resultados else None
+
 def obter_todos_produtos_ativos() -> List[Dict]:
     """Retorna todos os produtos ativos para geração da base de conhecimento.
 
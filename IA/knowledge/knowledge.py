@@ -31,6 +31,9 @@ NOME_MODELO_OLLAMA = os.getenv("OLLAMA_MODEL_NAME", "llama3.1")
 
 # Instância global do motor de busca
 _motor_busca = MotorBuscaAproximada()
+# Resultado da busca na KB por termo (antes do enriquecimento com o banco); zera ao recarregar a KB
+MAX_CACHE_BUSCA_KB = int(os.getenv("KB_SEARCH_CACHE_SIZE", "1024"))
+_cache_busca_kb: Dict[str, List[Dict]] = {}
 HOST_OLLAMA = os.getenv("OLLAMA_HOST")
 
 def _carregar_kb() -> Dict[str, List[Dict]]:
@@ -58,6 +61,7 @@ def _carregar_kb() -> Dict[str, List[Dict]]:
         kb_bruto = {}
 
     kb_indexado = {}
+    _cache_busca_kb.clear()
     
     for nome_canonico, dados_produto in kb_bruto.items():
         codprod = dados_produto.get("codprod")
@@ -125,46 +129,39 @@ def _enriquecer_produtos_kb_com_dados_db(produtos_kb: List[Dict]) -> List[Dict]:
     
     return produtos_enriquecidos
 
-def encontrar_produto_na_kb(termo: str) -> List[Dict]:
-    """Encontra um produto na base de conhecimento com busca tolerante a erros.
+def _localizar_produtos_kb(termo: str, kb: Dict[str, List[Dict]]) -> List[Dict]:
+    """Localiza as entradas da KB que correspondem ao termo, sem consultar o banco.
 
     Args:
         termo: O termo de busca.
+        kb: A base de conhecimento indexada.
 
     Returns:
-        Uma lista de produtos que correspondem ao termo.
+        As entradas da KB correspondentes ao termo.
     """
-    if not termo:
-        return []
-        
-    kb = _carregar_kb()
-    termo_minusculo = termo.lower().strip()
-    
     termo_normalizado = _motor_busca.normalizar_texto(termo)
     if termo_normalizado in kb:
         logging.info(f"[KB] Busca exata encontrou: {termo_normalizado}")
-        produtos_kb = kb[termo_normalizado]
-        return _enriquecer_produtos_kb_com_dados_db(produtos_kb)
+        return kb[termo_normalizado]
     
     resultados_fuzzy = busca_aproximada_kb(termo, kb, min_similaridade=0.8)
     if resultados_fuzzy:
         logging.info(f"[KB] Busca fuzzy (alta) encontrou {len(resultados_fuzzy)} produtos para: {termo}")
-        return _enriquecer_produtos_kb_com_dados_db(resultados_fuzzy)
+        return resultados_fuzzy
     
     resultados_fuzzy = busca_aproximada_kb(termo, kb, min_similaridade=0.6)
     if resultados_fuzzy:
         logging.info(f"[KB] Busca fuzzy (média) encontrou {len(resultados_fuzzy)} produtos para: {termo}")
-        return _enriquecer_produtos_kb_com_dados_db(resultados_fuzzy)
+        return resultados_fuzzy
     
     resultados_fuzzy = busca_aproximada_kb(termo, kb, min_similaridade=0.4)
     if resultados_fuzzy:
         logging.info(f"[KB] Busca fuzzy (baixa) encontrou {len(resultados_fuzzy)} produtos para: {termo}")
-        return _enriquecer_produtos_kb_com_dados_db(resultados_fuzzy)
+        return resultados_fuzzy
     
     produtos_correspondentes = []
     codprods_vistos = set()
     
-    termo_normalizado = _motor_busca.normalizar_texto(termo)
     termo_corrigido = _motor_busca.aplicar_correcoes(termo_normalizado)
     
     for termo_indexado, produtos in kb.items():
@@ -182,10 +179,38 @@ def encontrar_produto_na_kb(termo: str) -> List[Dict]:
     
     if produtos_correspondentes:
         logging.info(f"[KB] Busca por contenção encontrou {len(produtos_correspondentes)} produtos para: {termo}")
-        return _enriquecer_produtos_kb_com_dados_db(produtos_correspondentes)
+    else:
+        logging.info(f"[KB] Nenhum produto encontrado para: {termo}")
+    return produtos_correspondentes
+
+def encontrar_produto_na_kb(termo: str) -> List[Dict]:
+    """Encontra um produto na base de conhecimento com busca tolerante a erros.
+
+    O casamento com a KB é memorizado por termo; preços e estoque continuam
+    vindo do banco a cada chamada.
+
+    Args:
+        termo: O termo de busca.
+
+    Returns:
+        Uma lista de produtos que correspondem ao termo.
+    """
+    if not termo:
+        return []
+        
+    kb = _carregar_kb()
+    termo_minusculo = termo.lower().strip()
+    
+    produtos_kb = _cache_busca_kb.get(termo_minusculo)
+    if produtos_kb is None:
+        produtos_kb = _localizar_produtos_kb(termo_minusculo, kb)
+        if len(_cache_busca_kb) >= MAX_CACHE_BUSCA_KB:
+            _cache_busca_kb.clear()
+        _cache_busca_kb[termo_minusculo] = produtos_kb
+    else:
+        logging.debug(f"[KB] Cache hit para: {termo_minusculo}")
     
-    logging.info(f"[KB] Nenhum produto encontrado para: {termo}")
-    return []
+    return _enriquecer_produtos_kb_com_dados_db(produtos_kb)
 
 def encontrar_produto_na_kb_com_analise(termo: str) -> Tuple[List[Dict], Dict]:
     """Busca produtos e retorna uma análise da qualidade da busca.
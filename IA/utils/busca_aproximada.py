@@ -3,12 +3,19 @@
 Sistema de busca aproximada tolerante a erros para o G.A.V.
 """
 
+import os
 import re
+import threading
 import unicodedata
 import logging
-from typing import List, Dict, Tuple
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
 from difflib import SequenceMatcher
 
+# Limite dos caches do motor: as chaves vêm do texto livre dos clientes
+MAX_CACHE_SIMILARIDADE = int(os.getenv("FUZZY_SIMILARITY_CACHE_SIZE", 4096))
+MAX_CACHE_CORRECAO = int(os.getenv("FUZZY_CORRECTION_CACHE_SIZE", 1024))
+
 CORRECOES_COMUNS = {
     'coca-cola': ['coca cola', 'cocacola', 'cokacola', 'coca kola'],
     'refrigerante': ['refri', 'regrigerante', 'refriferante'],
@@ -48,8 +55,40 @@ class MotorBuscaAproximada:
     """Motor de busca aproximada com correções automáticas e sinônimos."""
     
     def __init__(self):
-        self.cache_correcao = {}
-        self.cache_similaridade = {}
+        self.cache_correcao: "OrderedDict[str, str]" = OrderedDict()
+        self.cache_similaridade: "OrderedDict[str, float]" = OrderedDict()
+        self._lock_cache = threading.Lock()
+        
+    def _obter_do_cache(self, cache: OrderedDict, chave: str) -> Optional[object]:
+        """Busca um valor no cache LRU, marcando-o como usado recentemente.
+
+        Args:
+            cache: O cache a consultar.
+            chave: A chave buscada.
+
+        Returns:
+            O valor em cache ou None.
+        """
+        with self._lock_cache:
+            valor = cache.get(chave)
+            if valor is not None:
+                cache.move_to_end(chave)
+            return valor
+    
+    def _guardar_no_cache(self, cache: OrderedDict, chave: str, valor: object, limite: int):
+        """Guarda um valor no cache LRU, descartando o menos usado se cheio.
+
+        Args:
+            cache: O cache a alterar.
+            chave: A chave do valor.
+            valor: O valor a guardar.
+            limite: O número máximo de entradas do cache.
+        """
+        with self._lock_cache:
+            cache[chave] = valor
+            cache.move_to_end(chave)
+            while len(cache) > limite:
+                cache.popitem(last=False)
         
     def normalizar_texto(self, texto: str) -> str:
         """Normaliza o texto removendo acentos, pontuação e padronizando.
@@ -86,45 +125,96 @@ class MotorBuscaAproximada:
             return 0.0
         
         chave_cache = f"{texto1}|||{texto2}"
-        if chave_cache in self.cache_similaridade:
-            return self.cache_similaridade[chave_cache]
+        similaridade = self._obter_do_cache(self.cache_similaridade, chave_cache)
+        if similaridade is not None:
+            return similaridade
         
-        norm1 = self.normalizar_texto(texto1)
-        norm2 = self.normalizar_texto(texto2)
+        similaridade = self._similaridade_normalizada(
+            self.normalizar_texto(texto1), self.normalizar_texto(texto2)
+        )
         
+        self._guardar_no_cache(self.cache_similaridade, chave_cache, similaridade, MAX_CACHE_SIMILARIDADE)
+        return similaridade
+    
+    def calcular_similaridades(self, texto: str, candidatos: List[str], minimo: float = 0.0) -> List[float]:
+        """Calcula a similaridade de um texto contra vários candidatos (0-1).
+
+        Normaliza o texto de referência uma única vez para todo o lote. Não usa o
+        cache de similaridade: os pares do lote quase nunca se repetem e só
+        expulsariam as entradas úteis.
+
+        Args:
+            texto: O texto de referência.
+            candidatos: Os textos a comparar.
+            minimo: Similaridade mínima que interessa ao chamador. Candidatos que
+                não podem alcançá-la recebem um valor abaixo do mínimo sem o
+                cálculo completo da sequência.
+
+        Returns:
+            As similaridades, na mesma ordem dos candidatos.
+        """
+        if not texto:
+            return [0.0] * len(candidatos)
+        
+        norm_texto = self.normalizar_texto(texto)
+        return [
+            self._similaridade_normalizada(norm_texto, self.normalizar_texto(candidato), minimo)
+            if candidato else 0.0
+            for candidato in candidatos
+        ]
+    
+    @staticmethod
+    def _similaridade_normalizada(norm1: str, norm2: str, minimo: float = 0.0) -> float:
+        """Combina as métricas de similaridade para textos já normalizados.
+
+        Com ``minimo`` > 0, as métricas baratas são calculadas primeiro e a razão
+        de sequência (a parte cara) só é calculada se ainda puder levar o total
+        ao mínimo; caso contrário retorna a soma parcial, que fica abaixo dele.
+        """
         if norm1 == norm2:
-            similaridade = 1.0
+            return 1.0
+        
+        palavras1 = set(norm1.split())
+        palavras2 = set(norm2.split())
+        if palavras1 or palavras2:
+            sim_jaccard = len(palavras1 & palavras2) / len(palavras1 | palavras2)
         else:
-            sim_seq = SequenceMatcher(None, norm1, norm2).ratio()
-            
-            palavras1 = set(norm1.split())
-            palavras2 = set(norm2.split())
-            if palavras1 or palavras2:
-                sim_jaccard = len(palavras1 & palavras2) / len(palavras1 | palavras2)
-            else:
-                sim_jaccard = 0.0
-            
-            if norm1 in norm2 or norm2 in norm1:
-                sim_contencao = 0.8
-            else:
-                sim_contencao = 0.0
-            
-            sim_prefixo = 0.0
-            if len(norm1) >= 3 and len(norm2) >= 3:
-                if norm1[:3] == norm2[:3]:
-                    sim_prefixo = 0.3
-                if norm1[-3:] == norm2[-3:]:
-                    sim_prefixo += 0.2
-            
-            similaridade = (
-                sim_seq * 0.4 +
-                sim_jaccard * 0.3 +
-                sim_contencao * 0.2 +
-                sim_prefixo * 0.1
-            )
-        
-        self.cache_similaridade[chave_cache] = similaridade
-        return similaridade
+            sim_jaccard = 0.0
+        
+        if norm1 in norm2 or norm2 in norm1:
+            sim_contencao = 0.8
+        else:
+            sim_contencao = 0.0
+        
+        sim_prefixo = 0.0
+        if len(norm1) >= 3 and len(norm2) >= 3:
+            if norm1[:3] == norm2[:3]:
+                sim_prefixo = 0.3
+            if norm1[-3:] == norm2[-3:]:
+                sim_prefixo += 0.2
+        
+        parcial = (
+            sim_jaccard * 0.3 +
+            sim_contencao * 0.2 +
+            sim_prefixo * 0.1
+        )
+        
+        comparador = SequenceMatcher(None, norm1, norm2)
+        if minimo > 0:
+            # Folga evita descartar por arredondamento um valor exatamente no mínimo
+            alvo = minimo - 1e-9
+            if (
+                parcial + comparador.real_quick_ratio() * 0.4 < alvo
+                or parcial + comparador.quick_ratio() * 0.4 < alvo
+            ):
+                return parcial
+        
+        return (
+            comparador.ratio() * 0.4 +
+            sim_jaccard * 0.3 +
+            sim_contencao * 0.2 +
+            sim_prefixo * 0.1
+        )
     
     def aplicar_correcoes(self, texto: str) -> str:
         """Aplica correções automáticas para erros comuns.
@@ -138,8 +228,9 @@ class MotorBuscaAproximada:
         if not texto:
             return texto
         
-        if texto in self.cache_correcao:
-            return self.cache_correcao[texto]
+        corrigido = self._obter_do_cache(self.cache_correcao, texto)
+        if corrigido is not None:
+            return corrigido
         
         normalizado = self.normalizar_texto(texto)
         corrigido = normalizado
@@ -162,7 +253,7 @@ class MotorBuscaAproximada:
             corrigido = re.sub(r'\bcoca\s+cola\b', 'coca cola', corrigido)
             corrigido = re.sub(r'\bomô\b', 'omo', corrigido)
         
-        self.cache_correcao[texto] = corrigido
+        self._guardar_no_cache(self.cache_correcao, texto, corrigido, MAX_CACHE_CORRECAO)
         return corrigido
     
     def expandir_com_sinonimos(self, texto: str) -> List[str]:
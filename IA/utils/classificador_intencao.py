@@ -7,6 +7,7 @@ Usa IA para detectar automaticamente a intenção do usuário e escolher a ferra
 
 import ollama
 import json
+import logging
 import os
 import re
 import time
@@ -22,12 +23,16 @@ from .redirecionamento_inteligente import (
     verificar_entrada_vazia_selecao,
 )
 
-from .gav_logger import log_decisao_ia
+from .gav_logger import log_decisao_ia, log_prompt_completo, obter_logger
+
+logger = obter_logger(__name__)
 
 
 # Configurações
 NOME_MODELO_OLLAMA = os.getenv("OLLAMA_MODEL_NAME", "llama3.1")
 HOST_OLLAMA = os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434")
+# Abaixo deste score a intenção vai para o fallback inteligente (ver get_decision_strategy)
+CONFIDENCE_THRESHOLD = 0.5
 
 _cache_intencao = {}
 
@@ -275,7 +280,7 @@ def detectar_intencao_usuario_com_ia(user_message: str, conversation_context: st
     # 🚀 CACHE SEMÂNTICO IA-FIRST - Tenta cache por similaridade primeiro
     cache_result = buscar_semelhante(user_message, conversation_context)
     if cache_result:
-        logging.info(f"[CACHE
+        logging.info("[CACHE] Intenção reaproveitada do cache semântico: %s", cache_result.get("nome_ferramenta"))
         score = cache_result.get("confidence_score", 0.0)
         cache_result["confidence_below_threshold"] = score < CONFIDENCE_THRESHOLD
         log_decisao_ia(cache_result.get("nome_ferramenta", "unknown"), score, cache_result.get("decision_strategy"))
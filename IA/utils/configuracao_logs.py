@@ -12,9 +12,11 @@ Recursos:
 - Logging de audit trail
 """
 
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
 import sys
 from datetime import datetime
 from pathlib import Path
@@ -766,9 +768,23 @@ def limpar_cache_deduplicacao():
         _deduplicador_global._cache_mensagens.clear()
         _deduplicador_global._ultima_limpeza = time.time()
 
+class ManipuladorFila(logging.handlers.QueueHandler):
+    """QueueHandler que só resolve a mensagem e deixa a formatação para a thread de escrita."""
+
+    def prepare(self, record):
+        # Fixa msg/args agora (os argumentos podem mudar depois), mas mantém exc_info e os
+        # extras para os formatadores contextual/JSON rodarem no QueueListener
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+# Thread que escreve os logs da fila nos handlers reais (recriada a cada configuração)
+_ouvinte_fila_logs = None
+
 # Configuração principal do sistema
 def configurar_logging_principal():
     """Configura logging principal do sistema G.A.V."""
+    global _ouvinte_fila_logs
     
     # Cria diretório de logs
     DIRETORIO_LOGS.mkdir(exist_ok=True)
@@ -779,6 +795,7 @@ def configurar_logging_principal():
     
     # Remove handlers padrão
     logger_raiz.handlers.clear()
+    manipuladores = []
     
     # Configura formatters
     formatador_contextual = FormatadorContextual(FORMATO_SUPER_DETALHADO)
@@ -789,7 +806,7 @@ def configurar_logging_principal():
     manipulador_console = logging.StreamHandler(sys.stdout)
     manipulador_console.setLevel(logging.DEBUG)  # TUDO no console
     manipulador_console.setFormatter(FormatadorColorido(FORMATO_SUPER_DETALHADO))  # Formato completo
-    logger_raiz.addHandler(manipulador_console)
+    manipuladores.append(manipulador_console)
     
     # Handler para arquivo principal (DEBUG+) com deduplicação
     manipulador_arquivo_principal = logging.handlers.RotatingFileHandler(
@@ -802,7 +819,7 @@ def configurar_logging_principal():
     manipulador_arquivo_principal.setFormatter(formatador_contextual)
     if DEDUPLICACAO_HABILITADA:
         manipulador_arquivo_principal.addFilter(FiltroDeduplicacao())
-    logger_raiz.addHandler(manipulador_arquivo_principal)
+    manipuladores.append(manipulador_arquivo_principal)
     
     # Handler para erros (ERROR+) com deduplicação agressiva
     manipulador_arquivo_erro = logging.handlers.RotatingFileHandler(
@@ -815,7 +832,7 @@ def configurar_logging_principal():
     manipulador_arquivo_erro.setFormatter(formatador_contextual)
     if DEDUPLICACAO_HABILITADA:
         manipulador_arquivo_erro.addFilter(FiltroDeduplicacao())
-    logger_raiz.addHandler(manipulador_arquivo_erro)
+    manipuladores.append(manipulador_arquivo_erro)
     
     # Handler para auditoria (JSON)
     manipulador_arquivo_audit = logging.handlers.RotatingFileHandler(
@@ -827,7 +844,7 @@ def configurar_logging_principal():
     manipulador_arquivo_audit.setLevel(logging.INFO)
     manipulador_arquivo_audit.setFormatter(formatador_json)
     manipulador_arquivo_audit.addFilter(FiltroModulo(['gav_audit']))
-    logger_raiz.addHandler(manipulador_arquivo_audit)
+    manipuladores.append(manipulador_arquivo_audit)
     
     # Handler separado para performance com JSON
     manipulador_performance = logging.handlers.RotatingFileHandler(
@@ -839,7 +856,7 @@ def configurar_logging_principal():
     manipulador_performance.setLevel(logging.INFO)
     manipulador_performance.setFormatter(formatador_json)
     manipulador_performance.addFilter(FiltroPerformance())
-    logger_raiz.addHandler(manipulador_performance)
+    manipuladores.append(manipulador_performance)
 
     # Handler dedicado para decisões de IA
     manipulador_ia_decisoes = logging.handlers.RotatingFileHandler(
@@ -851,7 +868,18 @@ def configurar_logging_principal():
     manipulador_ia_decisoes.setLevel(logging.INFO)
     manipulador_ia_decisoes.setFormatter(formatador_json)
     manipulador_ia_decisoes.addFilter(FiltroModulo(['ia_decisoes']))
-    logger_raiz.addHandler(manipulador_ia_decisoes)
+    manipuladores.append(manipulador_ia_decisoes)
+
+    # Escrita assíncrona: as threads de mensagem só enfileiram; console e arquivos são
+    # escritos por uma única thread do QueueListener
+    if _ouvinte_fila_logs is not None:
+        _ouvinte_fila_logs.stop()
+    fila_logs = queue.SimpleQueue()
+    _ouvinte_fila_logs = logging.handlers.QueueListener(
+        fila_logs, *manipuladores, respect_handler_level=True
+    )
+    _ouvinte_fila_logs.start()
+    logger_raiz.addHandler(ManipuladorFila(fila_logs))
     
     # Suprime logs verbosos de bibliotecas externas
     logging.getLogger('twilio').setLevel(logging.WARNING)
@@ -864,6 +892,13 @@ def configurar_logging_principal():
     
     return logger_raiz
 
+def _parar_ouvinte_fila_logs():
+    """Esvazia a fila de logs ao encerrar o processo."""
+    if _ouvinte_fila_logs is not None:
+        _ouvinte_fila_logs.stop()
+
+atexit.register(_parar_ouvinte_fila_logs)
+
 # Instâncias globais
 logger_performance = LoggerPerformance()
 logger_auditoria = LoggerAuditoria()
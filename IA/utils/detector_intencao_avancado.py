@@ -133,7 +133,7 @@ JSON:"""
                 json_str = json_match.group(0)
                 resultado = json.loads(json_str)
                 if "acao" in resultado:
-                    print(f">>> DEBUG: [CARRINHO_JSON] ✅ JSON válido extraído: {json.dumps(resultado, ensure_ascii=False)}")
+                    logging.debug("[CARRINHO_JSON] ✅ JSON válido extraído: %s", resultado)
                     log_decisao_ia(resultado["acao"], float(resultado.get("confianca", 0)), "json")
 
                     return resultado
@@ -153,7 +153,7 @@ JSON:"""
         if any(cmd in resposta_lower for cmd in ["visualizar", "ver", "mostrar", "exibir"]):
             resultado = {"acao": "visualizar_carrinho", "parametros": {}, "confianca": 0.9}
 
-            print(f">>> DEBUG: [CARRINHO_SEMANTICO] ✅ Detectado por semântica: {json.dumps(resultado, ensure_ascii=False)}")
+            logging.debug("[CARRINHO_SEMANTICO] ✅ Detectado por semântica: %s", resultado)
             log_decisao_ia(resultado["acao"], resultado.get("confianca", 0), "semantica")
 
             return resultado
@@ -162,18 +162,18 @@ JSON:"""
         ):
             resultado = {"acao": "limpar_carrinho", "parametros": {}, "confianca": 0.9}
 
-            print(f">>> DEBUG: [CARRINHO_SEMANTICO] ✅ Detectado por semântica: {json.dumps(resultado, ensure_ascii=False)}")
+            logging.debug("[CARRINHO_SEMANTICO] ✅ Detectado por semântica: %s", resultado)
             log_decisao_ia(resultado["acao"], resultado.get("confianca", 0), "semantica")
 
             return resultado
         elif any(cmd in resposta_lower for cmd in ["finalizar", "checkout", "concluir"]):
             resultado = {"acao": "finalizar_pedido", "parametros": {}, "confianca": 0.9}
-            print(f">>> DEBUG: [CARRINHO_SEMANTICO] ✅ Detectado por semântica: {json.dumps(resultado, ensure_ascii=False)}")
+            logging.debug("[CARRINHO_SEMANTICO] ✅ Detectado por semântica: %s", resultado)
             log_decisao_ia(resultado["acao"], resultado.get("confianca", 0), "semantica")
             return resultado
 
         resultado = {"acao": "unknown", "parametros": {}, "confianca": 0}
-        print(f">>> DEBUG: [CARRINHO_SEMANTICO] ❌ Nenhuma ação detectada. Retornando: {json.dumps(resultado, ensure_ascii=False)}")
+        logging.debug("[CARRINHO_SEMANTICO] ❌ Nenhuma ação detectada. Retornando: %s", resultado)
         log_decisao_ia(resultado["acao"], resultado.get("confianca", 0), "semantica")
 
         return resultado
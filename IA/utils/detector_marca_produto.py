@@ -76,7 +76,7 @@ Responda SOMENTE o JSON:""".format(mensagem)
         
         # Extrai JSON da resposta
         import json
-        print(f">>> DEBUG: [EXTRAÇÃO_JSON] Resposta completa da IA: {resposta_ia}")
+        logging.debug("[EXTRAÇÃO_JSON] Resposta completa da IA: %s", resposta_ia)
         
         try:
             # Se a resposta não começa com {, adiciona }
@@ -87,25 +87,25 @@ Responda SOMENTE o JSON:""".format(mensagem)
             json_match = re.search(r'\{[^{}]*\}', resposta_ia, re.DOTALL)
             if json_match:
                 json_texto = json_match.group(0)
-                print(f">>> DEBUG: [EXTRAÇÃO_JSON] JSON extraído: {json_texto}")
+                logging.debug("[EXTRAÇÃO_JSON] JSON extraído: %s", json_texto)
                 resultado = json.loads(json_texto)
                 
-                print(f">>> DEBUG: [EXTRAÇÃO_JSON] JSON parsed: {resultado}")
+                logging.debug("[EXTRAÇÃO_JSON] JSON parsed: %s", resultado)
                 
                 # Valida resultado
                 if resultado.get("tipo_busca") in ["marca_especifica", "categoria_geral", "produto_especifico"]:
-                    print(f">>> DEBUG: [EXTRAÇÃO_JSON] ✅ JSON válido - tipo: {resultado.get('tipo_busca')}, marca: {resultado.get('marca')}")
+                    logging.debug("[EXTRAÇÃO_JSON] ✅ JSON válido - tipo: %s, marca: %s", resultado.get('tipo_busca'), resultado.get('marca'))
                     logging.info(f"[MARCA_PRODUTO_IA] Detectado: {resultado.get('tipo_busca')} - {resultado.get('marca', 'sem marca')}")
                     return resultado
                 else:
-                    print(f">>> DEBUG: [EXTRAÇÃO_JSON] ❌ JSON inválido - tipo_busca não reconhecido: {resultado.get('tipo_busca')}")
+                    logging.debug("[EXTRAÇÃO_JSON] ❌ JSON inválido - tipo_busca não reconhecido: %s", resultado.get('tipo_busca'))
             else:
-                print(f">>> DEBUG: [EXTRAÇÃO_JSON] ❌ Nenhum JSON encontrado na resposta")
+                logging.debug("[EXTRAÇÃO_JSON] ❌ Nenhum JSON encontrado na resposta")
         except (json.JSONDecodeError, AttributeError) as e:
-            print(f">>> DEBUG: [EXTRAÇÃO_JSON] ❌ Erro ao parsear JSON: {e}")
+            logging.debug("[EXTRAÇÃO_JSON] ❌ Erro ao parsear JSON: %s", e)
             
             # Tenta extrair dados manualmente da resposta
-            print(f">>> DEBUG: [EXTRAÇÃO_JSON] Tentando extração manual...")
+            logging.debug("[EXTRAÇÃO_JSON] Tentando extração manual...")
             try:
                 # Busca por padrões específicos na resposta
                 tipo_match = re.search(r'tipo_busca["\s:]*["\s]*(\w+)', resposta_ia)
@@ -117,7 +117,7 @@ Responda SOMENTE o JSON:""".format(mensagem)
                     marca = marca_match.group(1) if marca_match else None
                     produto = produto_match.group(1) if produto_match else None
                     
-                    print(f">>> DEBUG: [EXTRAÇÃO_MANUAL] tipo: {tipo_busca}, marca: {marca}, produto: {produto}")
+                    logging.debug("[EXTRAÇÃO_MANUAL] tipo: %s, marca: %s, produto: %s", tipo_busca, marca, produto)
                     
                     if tipo_busca in ["marca_especifica", "categoria_geral", "produto_especifico"]:
                         resultado_manual = {
@@ -128,24 +128,24 @@ Responda SOMENTE o JSON:""".format(mensagem)
                             "categoria": "bebidas" if produto == "cerveja" else "outros",
                             "prioridade_marca": tipo_busca == "marca_especifica"
                         }
-                        print(f">>> DEBUG: [EXTRAÇÃO_MANUAL] ✅ Resultado manual: {resultado_manual}")
+                        logging.debug("[EXTRAÇÃO_MANUAL] ✅ Resultado manual: %s", resultado_manual)
                         return resultado_manual
             except Exception as manual_error:
-                print(f">>> DEBUG: [EXTRAÇÃO_MANUAL] ❌ Erro na extração manual: {manual_error}")
+                logging.debug("[EXTRAÇÃO_MANUAL] ❌ Erro na extração manual: %s", manual_error)
         
         # Fallback se IA falhou
         return _detectar_marca_fallback(mensagem)
         
     except Exception as e:
         logging.error(f"[MARCA_PRODUTO_IA] Erro: {str(e)}")
-        print(f">>> DEBUG: [ERRO_IA] Exceção completa: {repr(e)}")
+        logging.debug("[ERRO_IA] Exceção completa: %s", repr(e))
         return _detectar_marca_fallback(mensagem)
 
 def _detectar_marca_fallback(mensagem: str) -> Dict:
     """
     🚀 FALLBACK 100% IA-FIRST: Usa apenas contexto semântico, sem listas pré-definidas.
     """
-    print(f">>> DEBUG: [FALLBACK] Executando fallback IA-FIRST para: '{mensagem}'")
+    logging.debug("[FALLBACK] Executando fallback IA-FIRST para: '%s'", mensagem)
     mensagem_lower = mensagem.lower().strip()
     
     # 🧠 ANÁLISE SEMÂNTICA: Detecta se é comando de carrinho vs busca de produto
@@ -154,7 +154,7 @@ def _detectar_marca_fallback(mensagem: str) -> Dict:
         "meu carrinho", "ver carrinho", "carrinho", "limpar carrinho", "esvaziar carrinho",
         "finalizar", "total", "pedido", "compra"
     ]):
-        print(f">>> DEBUG: [FALLBACK] 🛒 Comando de carrinho detectado, retornando categoria_geral")
+        logging.debug("[FALLBACK] 🛒 Comando de carrinho detectado, retornando categoria_geral")
         return {
             "tipo_busca": "categoria_geral", 
             "marca": None,
@@ -172,7 +172,7 @@ def _detectar_marca_fallback(mensagem: str) -> Dict:
     if len(palavras) == 1:
         # Uma palavra só: provavelmente categoria geral
         produto_inferido = palavras[0]
-        print(f">>> DEBUG: [FALLBACK] 🎯 Palavra única '{produto_inferido}' = categoria_geral")
+        logging.debug("[FALLBACK] 🎯 Palavra única '%s' = categoria_geral", produto_inferido)
         return {
             "tipo_busca": "categoria_geral",
             "marca": None,
@@ -187,7 +187,7 @@ def _detectar_marca_fallback(mensagem: str) -> Dict:
         if palavras[0] in ["quero", "preciso", "buscar", "comprar"]:
             # "quero cerveja" = categoria_geral
             produto_inferido = palavras[1]
-            print(f">>> DEBUG: [FALLBACK] 🎯 Padrão 'verbo + produto' = categoria_geral")
+            logging.debug("[FALLBACK] 🎯 Padrão 'verbo + produto' = categoria_geral")
             return {
                 "tipo_busca": "categoria_geral",
                 "marca": None,
@@ -200,7 +200,7 @@ def _detectar_marca_fallback(mensagem: str) -> Dict:
             # "cerveja heineken" = marca_especifica
             produto_inferido = palavras[0] if len(palavras[0]) > len(palavras[1]) else palavras[1]
             marca_inferida = palavras[1] if produto_inferido == palavras[0] else palavras[0]
-            print(f">>> DEBUG: [FALLBACK] 🏷️ Padrão 'produto + marca' detectado: {produto_inferido} + {marca_inferida}")
+            logging.debug("[FALLBACK] 🏷️ Padrão 'produto + marca' detectado: %s + %s", produto_inferido, marca_inferida)
             return {
                 "tipo_busca": "marca_especifica",
                 "marca": marca_inferida,
@@ -211,7 +211,7 @@ def _detectar_marca_fallback(mensagem: str) -> Dict:
             }
     
     # 🧠 FALLBACK FINAL: Múltiplas palavras = categoria_geral (busca ampla)
-    print(f">>> DEBUG: [FALLBACK] 🌐 Múltiplas palavras = categoria_geral")
+    logging.debug("[FALLBACK] 🌐 Múltiplas palavras = categoria_geral")
     return {
         "tipo_busca": "categoria_geral",
         "marca": None,
@@ -233,16 +233,16 @@ def filtrar_produtos_por_marca(produtos: List[Dict], marca_desejada: str, produt
     Returns:
         List[Dict]: Produtos filtrados pela marca.
     """
-    print(f">>> DEBUG: [FILTRO_MARCA] Iniciando filtro por marca '{marca_desejada}' em {len(produtos)} produtos")
+    logging.debug("[FILTRO_MARCA] Iniciando filtro por marca '%s' em %s produtos", marca_desejada, len(produtos))
     
     if not marca_desejada or not produtos:
-        print(f">>> DEBUG: [FILTRO_MARCA] Retornando sem filtrar - marca_desejada: {marca_desejada}, produtos: {len(produtos) if produtos else 0}")
+        logging.debug("[FILTRO_MARCA] Retornando sem filtrar - marca_desejada: %s, produtos: %s", marca_desejada, len(produtos) if produtos else 0)
         return produtos
     
     marca_lower = marca_desejada.lower()
     produtos_filtrados = []
     
-    print(f">>> DEBUG: [FILTRO_MARCA] Procurando por marca: '{marca_lower}'")
+    logging.debug("[FILTRO_MARCA] Procurando por marca: '%s'", marca_lower)
     
     for i, produto in enumerate(produtos):
         descricao = produto.get('descricao', '').lower()
@@ -254,23 +254,23 @@ def filtrar_produtos_por_marca(produtos: List[Dict], marca_desejada: str, produt
         match_desc = marca_lower in descricao
         match_canonical = marca_lower in canonical_name
         
-        print(f">>> DEBUG: [FILTRO_{i+1}] Produto: {produto.get('descricao')}")
-        print(f">>> DEBUG: [FILTRO_{i+1}] - Marca produto: '{marca_produto}' | Match: {match_marca}")
-        print(f">>> DEBUG: [FILTRO_{i+1}] - Descrição: '{descricao}' | Match: {match_desc}")
-        print(f">>> DEBUG: [FILTRO_{i+1}] - Canonical: '{canonical_name}' | Match: {match_canonical}")
+        logging.debug("[FILTRO_%s] Produto: %s", i+1, produto.get('descricao'))
+        logging.debug("[FILTRO_%s] - Marca produto: '%s' | Match: %s", i+1, marca_produto, match_marca)
+        logging.debug("[FILTRO_%s] - Descrição: '%s' | Match: %s", i+1, descricao, match_desc)
+        logging.debug("[FILTRO_%s] - Canonical: '%s' | Match: %s", i+1, canonical_name, match_canonical)
         
         # Verifica também similaridade
         similar_desc = _marca_similar_no_texto(marca_lower, descricao)
         similar_canonical = _marca_similar_no_texto(marca_lower, canonical_name)
         similar_marca = _marca_similar_no_texto(marca_lower, marca_produto)
         
-        print(f">>> DEBUG: [FILTRO_{i+1}] - Similar desc: {similar_desc}, Similar canonical: {similar_canonical}, Similar marca: {similar_marca}")
+        logging.debug("[FILTRO_%s] - Similar desc: %s, Similar canonical: %s, Similar marca: %s", i+1, similar_desc, similar_canonical, similar_marca)
         
         if (match_desc or match_canonical or match_marca or similar_desc or similar_canonical or similar_marca):
-            print(f">>> DEBUG: [FILTRO_{i+1}] ✅ INCLUÍDO: {produto.get('descricao')}")
+            logging.debug("[FILTRO_%s] ✅ INCLUÍDO: %s", i+1, produto.get('descricao'))
             produtos_filtrados.append(produto)
         else:
-            print(f">>> DEBUG: [FILTRO_{i+1}] ❌ EXCLUÍDO: {produto.get('descricao')}")
+            logging.debug("[FILTRO_%s] ❌ EXCLUÍDO: %s", i+1, produto.get('descricao'))
     
     logging.info(f"[FILTRO_MARCA] Filtrados {len(produtos_filtrados)} de {len(produtos)} produtos para marca '{marca_desejada}'")
     return produtos_filtrados
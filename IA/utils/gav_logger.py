@@ -61,6 +61,15 @@ def obter_logger(nome_modulo: str = None) -> logging.Logger:
     
     return logging.getLogger(f"gav.{nome_modulo}")
 
+def log_habilitado(nivel: int = logging.INFO) -> bool:
+    """Indica se as funções log_* emitiriam registros no nível informado.
+
+    Permite pular a montagem de extras caros quando o nível está desligado.
+    """
+    if _logger_principal is None:
+        inicializar_logging()
+    return logging.getLogger(f"gav.{__name__}").isEnabledFor(nivel)
+
 class ContextoLog:
     """Gerenciador de contexto para logs com informações de usuário/sessão."""
     
@@ -236,12 +245,16 @@ def _preparar_contexto_seguro(user_id: str = None, session_id: str = None, **ext
 def log_debug(message: str, user_id: str = None, session_id: str = None, **extras):
     """Log de debug com contexto seguro."""
     logger = obter_logger()
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     extra_dict = _preparar_contexto_seguro(user_id, session_id, **extras)
     logger.debug(message, extra=extra_dict)
 
 def log_info(message: str, user_id: str = None, session_id: str = None, **extras):
     """Log de informação com contexto seguro."""
     logger = obter_logger()
+    if not logger.isEnabledFor(logging.INFO):
+        return
     extra_dict = _preparar_contexto_seguro(user_id, session_id, **extras)
     logger.info(message, extra=extra_dict)
 
@@ -226,21 +226,21 @@ RESPONDA APENAS: true (se confuso) ou false (se comando legítimo)'''
             response = ollama.chat(model='llama3.1', messages=[{'role': 'user', 'content': prompt}])
             resposta = response['message']['content']
             
-            print(f">>> DEBUG: [IA_CONFUSAO] Entrada: '{entrada}' | Resposta IA completa: {resposta}")
+            logging.debug("[IA_CONFUSAO] Entrada: '%s' | Resposta IA completa: %s", entrada, resposta)
             
             # Extrai boolean da resposta
             if 'true' in resposta.lower():
-                print(f">>> DEBUG: [IA_CONFUSAO] ✅ IA detectou CONFUSÃO REAL")
+                logging.debug("[IA_CONFUSAO] ✅ IA detectou CONFUSÃO REAL")
                 return True
             elif 'false' in resposta.lower():
-                print(f">>> DEBUG: [IA_CONFUSAO] ✅ IA detectou COMANDO LEGÍTIMO")
+                logging.debug("[IA_CONFUSAO] ✅ IA detectou COMANDO LEGÍTIMO")
                 return False
             else:
-                print(f">>> DEBUG: [IA_CONFUSAO] ⚠️ IA não decidiu, assumindo comando legítimo")
+                logging.debug("[IA_CONFUSAO] ⚠️ IA não decidiu, assumindo comando legítimo")
                 return False
                 
         except Exception as e:
-            print(f">>> DEBUG: [IA_CONFUSAO] Erro na IA: {e}")
+            logging.debug("[IA_CONFUSAO] Erro na IA: %s", e)
             # Fallback: Em caso de erro, assume comando legítimo (menos restritivo)
             return False
     
@@ -293,21 +293,21 @@ RESPONDA APENAS: true (se problemática) ou false (se natural/válida)'''
             response = ollama.chat(model='llama3.1', messages=[{'role': 'user', 'content': prompt}])
             resposta = response['message']['content']
             
-            print(f">>> DEBUG: [IA_MUDANCA] Entrada: '{entrada}' | Resposta IA completa: {resposta}")
+            logging.debug("[IA_MUDANCA] Entrada: '%s' | Resposta IA completa: %s", entrada, resposta)
             
             # Extrai boolean da resposta
             if 'true' in resposta.lower():
-                print(f">>> DEBUG: [IA_MUDANCA] ✅ IA detectou mudança PROBLEMÁTICA")
+                logging.debug("[IA_MUDANCA] ✅ IA detectou mudança PROBLEMÁTICA")
                 return True
             elif 'false' in resposta.lower():
-                print(f">>> DEBUG: [IA_MUDANCA] ✅ IA detectou mudança NATURAL/VÁLIDA")
+                logging.debug("[IA_MUDANCA] ✅ IA detectou mudança NATURAL/VÁLIDA")
                 return False
             else:
-                print(f">>> DEBUG: [IA_MUDANCA] ⚠️ IA não decidiu, assumindo mudança natural")
+                logging.debug("[IA_MUDANCA] ⚠️ IA não decidiu, assumindo mudança natural")
                 return False
                 
         except Exception as e:
-            print(f">>> DEBUG: [IA_MUDANCA] Erro na IA: {e}")
+            logging.debug("[IA_MUDANCA] Erro na IA: %s", e)
             # Fallback: Em caso de erro, assume mudança natural (menos restritivo)
             return False
     
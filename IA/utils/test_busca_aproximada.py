@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Testes para os caches do motor de busca aproximada."""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Adiciona diretório IA ao path para permitir importações
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils import busca_aproximada
+
+
+class TestCachesMotorBusca(unittest.TestCase):
+    """Verifica que os caches do motor não crescem sem limite."""
+
+    def setUp(self):
+        self.motor = busca_aproximada.MotorBuscaAproximada()
+
+    def test_cache_similaridade_e_limitado(self):
+        """Acima do limite, o par usado há mais tempo deve sair do cache."""
+        with mock.patch.object(busca_aproximada, "MAX_CACHE_SIMILARIDADE", 2):
+            self.motor.calcular_similaridade("skol", "skol lata")
+            self.motor.calcular_similaridade("coca", "coca cola")
+            self.motor.calcular_similaridade("skol", "skol lata")  # passa a ser o mais recente
+            self.motor.calcular_similaridade("omo", "omo multiacao")
+
+        self.assertEqual(list(self.motor.cache_similaridade), ["skol|||skol lata", "omo|||omo multiacao"])
+
+    def test_cache_correcao_e_limitado(self):
+        """Termos de busca corrigidos não devem se acumular além do limite."""
+        with mock.patch.object(busca_aproximada, "MAX_CACHE_CORRECAO", 2):
+            for termo in ("cokacola", "refriferante", "xampu", "oleo"):
+                self.motor.aplicar_correcoes(termo)
+
+        self.assertEqual(list(self.motor.cache_correcao), ["xampu", "oleo"])
+        self.assertEqual(self.motor.aplicar_correcoes("cokacola"), "coca-cola")
+
+    def test_lote_nao_usa_cache(self):
+        """O cálculo em lote deve coincidir com o individual sem preencher o cache."""
+        candidatos = ["skol lata 350ml", "", "coca cola 2l"]
+
+        similaridades = self.motor.calcular_similaridades("skol", candidatos)
+
+        self.assertEqual(self.motor.cache_similaridade, {})
+        self.assertEqual(similaridades[1], 0.0)
+        self.assertAlmostEqual(similaridades[0], self.motor.calcular_similaridade("skol", candidatos[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Testes para o cache de consultas do banco de dados."""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Adiciona diretório IA ao path para permitir importações
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# O módulo valida a configuração do banco na importação; nenhum acesso real é feito aqui
+for _variavel in ("DB_NAME", "DB_USERNAME", "DB_PASSWORD", "DB_HOST", "DB_PORT"):
+    os.environ.setdefault(_variavel, "teste")
+
+from db import database
+
+
+class TestCacheConsultas(unittest.TestCase):
+    """Verifica que o cache de consultas não compartilha objetos entre chamadas."""
+
+    def setUp(self):
+        database._cache_consultas.clear()
+        self.chamadas = 0
+
+        @database.cache_query()
+        def _buscar_produtos(termo, limite=1):
+            self.chamadas += 1
+            return {"products": [{"codprod": 10, "descricao": termo.upper(), "pvenda": 5.0}]}
+
+        self.buscar = _buscar_produtos
+
+    def tearDown(self):
+        database._cache_consultas.clear()
+
+    def test_alterar_resultado_nao_afeta_cache(self):
+        """Gravar 'qt' num produto retornado não deve vazar para a próxima chamada."""
+        primeiro = self.buscar("skol", limite=1)
+        primeiro["products"][0]["qt"] = 12
+
+        segundo = self.buscar("skol", limite=1)
+        segundo["products"][0]["qt"] = 3
+        terceiro = self.buscar("skol", limite=1)
+
+        self.assertEqual(self.chamadas, 1)
+        self.assertNotIn("qt", terceiro["products"][0])
+        self.assertEqual(primeiro["products"][0]["qt"], 12)
+
+    def test_acertos_devolvem_objetos_distintos(self):
+        """Dois acertos no cache não devem devolver o mesmo dicionário de produto."""
+        self.buscar("coca")
+        carrinho = [self.buscar("coca")["products"][0], self.buscar("coca")["products"][0]]
+
+        self.assertIsNot(carrinho[0], carrinho[1])
+
+    def test_cache_descarta_entradas_mais_antigas(self):
+        """Buscas por texto livre não devem acumular entradas além do limite."""
+        with mock.patch.object(database, "MAX_CACHE_CONSULTAS", 2):
+            for termo in ("skol", "coca", "omo"):
+                self.buscar(termo)
+
+        self.assertEqual([chave[1] for chave in database._cache_consultas], [("coca",), ("omo",)])
+        self.buscar("skol")
+        self.assertEqual(self.chamadas, 4)
+
+    def test_entrada_expirada_e_removida(self):
+        """Uma entrada vencida deve ser descartada e a consulta refeita."""
+        self.buscar("skol")
+        depois_do_ttl = database.time.time() + 301
+        with mock.patch.object(database.time, "time", return_value=depois_do_ttl):
+            self.buscar("skol")
+
+        self.assertEqual(self.chamadas, 2)
+        self.assertEqual(len(database._cache_consultas), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
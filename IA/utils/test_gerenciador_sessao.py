@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Testes para os caches em memória do gerenciador de sessões."""
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Adiciona diretório IA ao path para permitir importações
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core import gerenciador_sessao
+
+
+class _PipelineFalso:
+    """Pipeline que executa os comandos enfileirados no Redis falso, em ordem."""
+
+    def __init__(self, redis_falso):
+        self._redis = redis_falso
+        self._comandos = []
+
+    def __getattr__(self, nome):
+        def enfileirar(*args):
+            self._comandos.append((nome, args))
+            return self
+        return enfileirar
+
+    def execute(self):
+        return [getattr(self._redis, nome)(*args) for nome, args in self._comandos]
+
+
+class _RedisFalso:
+    """Redis em memória com os comandos usados pelo gerenciador de sessões."""
+
+    def __init__(self):
+        self.dados = {}
+
+    def get(self, chave):
+        return self.dados.get(chave)
+
+    def setex(self, chave, ttl, valor):
+        self.dados[chave] = valor
+        return True
+
+    def incr(self, chave):
+        valor = int(self.dados.get(chave, 0)) + 1
+        self.dados[chave] = str(valor).encode()
+        return valor
+
+    def expire(self, chave, ttl):
+        return True
+
+    def delete(self, *chaves):
+        return sum(self.dados.pop(chave, None) is not None for chave in chaves)
+
+    def pipeline(self):
+        return _PipelineFalso(self)
+
+
+class TestCacheSessoes(unittest.TestCase):
+    """Verifica TTL, LRU e invalidação do cache local de sessões."""
+
+    def setUp(self):
+        self._diretorio_original = os.getcwd()
+        self._diretorio_temporario = tempfile.TemporaryDirectory()
+        os.chdir(self._diretorio_temporario.name)
+        gerenciador_sessao._cache_sessoes.clear()
+        self._patches = [
+            mock.patch.object(gerenciador_sessao, "cliente_redis", None),
+            mock.patch.object(gerenciador_sessao, "TTL_CACHE_SESSAO", 60),
+            mock.patch.object(gerenciador_sessao, "MAX_CACHE_SESSAO", 1024),
+        ]
+        for patch in self._patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self._patches:
+            patch.stop()
+        gerenciador_sessao._cache_sessoes.clear()
+        os.chdir(self._diretorio_original)
+        self._diretorio_temporario.cleanup()
+
+    def test_leitura_devolve_copia_independente(self):
+        """Alterar a sessão carregada não deve alterar a cópia em cache."""
+        gerenciador_sessao.salvar_sessao("5511999999999", {"shopping_cart": [{"codprod": 1, "qt": 1}]})
+
+        sessao = gerenciador_sessao.carregar_sessao("5511999999999")
+        sessao["shopping_cart"].append({"codprod": 2, "qt": 3})
+
+        self.assertEqual(len(gerenciador_sessao.carregar_sessao("5511999999999")["shopping_cart"]), 1)
+
+    def test_entrada_expira_apos_ttl(self):
+        """Depois do TTL a entrada deve ser descartada do cache."""
+        gerenciador_sessao.salvar_sessao("sessao_ttl", {"shopping_cart": []})
+        self.assertIsNotNone(gerenciador_sessao._obter_sessao_em_cache("sessao_ttl"))
+
+        depois_do_ttl = time.monotonic() + 61
+        with mock.patch.object(gerenciador_sessao.time, "monotonic", return_value=depois_do_ttl):
+            self.assertIsNone(gerenciador_sessao._obter_sessao_em_cache("sessao_ttl"))
+        self.assertNotIn("sessao_ttl", gerenciador_sessao._cache_sessoes)
+
+    def test_descarta_sessao_menos_usada_quando_cheio(self):
+        """Com o cache cheio, a sessão usada há mais tempo deve sair primeiro."""
+        with mock.patch.object(gerenciador_sessao, "MAX_CACHE_SESSAO", 2):
+            gerenciador_sessao.salvar_sessao("a", {"n": 1})
+            gerenciador_sessao.salvar_sessao("b", {"n": 2})
+            gerenciador_sessao.carregar_sessao("a")  # "a" passa a ser a mais recente
+            gerenciador_sessao.salvar_sessao("c", {"n": 3})
+
+        self.assertEqual(list(gerenciador_sessao._cache_sessoes), ["a", "c"])
+
+    def test_limpar_sessao_invalida_cache(self):
+        """Após limpar a sessão, a próxima leitura não deve vir do cache."""
+        gerenciador_sessao.salvar_sessao("sessao_limpa", {"shopping_cart": [{"codprod": 1}]})
+        gerenciador_sessao.limpar_sessao("sessao_limpa")
+
+        self.assertNotIn("sessao_limpa", gerenciador_sessao._cache_sessoes)
+        self.assertEqual(gerenciador_sessao.carregar_sessao("sessao_limpa")["carrinho_compras"], [])
+
+    def test_limpar_sessoes_antigas_invalida_cache(self):
+        """Sessões removidas por idade também devem sair do cache local."""
+        gerenciador_sessao.salvar_sessao("whatsapp:5511", {"shopping_cart": [{"codprod": 1}]})
+        caminho = gerenciador_sessao._obter_caminho_arquivo_sessao("whatsapp:5511")
+        antigo = time.time() - 8 * 24 * 3600
+        os.utime(caminho, (antigo, antigo))
+
+        gerenciador_sessao.limpar_sessoes_antigas()
+
+        self.assertFalse(os.path.exists(caminho))
+        self.assertNotIn("whatsapp:5511", gerenciador_sessao._cache_sessoes)
+
+    def test_cache_ignora_sessao_regravada_por_outro_processo(self):
+        """Com Redis, uma versão mais nova gravada por outro processo deve prevalecer."""
+        redis_falso = _RedisFalso()
+        with mock.patch.object(gerenciador_sessao, "cliente_redis", redis_falso):
+            gerenciador_sessao.salvar_sessao("sessao_redis", {"shopping_cart": [{"codprod": 1, "qt": 1}]})
+            self.assertIn("sessao_redis", gerenciador_sessao._cache_sessoes)
+
+            # Outro processo regrava a sessão e avança a versão
+            redis_falso.setex("sessao:sessao_redis", 60, pickle.dumps({"shopping_cart": [{"codprod": 1, "qt": 5}]}))
+            redis_falso.incr("sessao_versao:sessao_redis")
+
+            sessao = gerenciador_sessao.carregar_sessao("sessao_redis")
+
+        self.assertEqual(sessao["shopping_cart"][0]["qt"], 5)
+
+    def test_cache_acerta_quando_versao_nao_mudou(self):
+        """Sem gravações de outros processos, a leitura deve vir do cache local."""
+        redis_falso = _RedisFalso()
+        with mock.patch.object(gerenciador_sessao, "cliente_redis", redis_falso):
+            gerenciador_sessao.salvar_sessao("sessao_redis", {"shopping_cart": []})
+            # Se a leitura fosse ao Redis, veria este valor
+            redis_falso.dados["sessao:sessao_redis"] = pickle.dumps({"shopping_cart": [{"codprod": 9}]})
+
+            sessao = gerenciador_sessao.carregar_sessao("sessao_redis")
+
+        self.assertEqual(sessao["shopping_cart"], [])
+
+
+class TestSessoesValidadas(unittest.TestCase):
+    """Verifica limite, expiração e invalidação das sessões com CNPJ validado."""
+
+    def setUp(self):
+        self._diretorio_original = os.getcwd()
+        self._diretorio_temporario = tempfile.TemporaryDirectory()
+        os.chdir(self._diretorio_temporario.name)
+        gerenciador_sessao._sessoes_validadas.clear()
+        self._patch_redis = mock.patch.object(gerenciador_sessao, "cliente_redis", None)
+        self._patch_redis.start()
+
+    def tearDown(self):
+        self._patch_redis.stop()
+        gerenciador_sessao._sessoes_validadas.clear()
+        gerenciador_sessao._cache_sessoes.clear()
+        os.chdir(self._diretorio_original)
+        self._diretorio_temporario.cleanup()
+
+    def test_validacao_expira_com_o_ttl_da_sessao(self):
+        """Passado o TTL da sessão, o telefone deve ser validado de novo."""
+        gerenciador_sessao.registrar_sessao_validada("5511", "5511:11222333000181")
+        self.assertEqual(gerenciador_sessao.obter_sessao_validada("5511"), "5511:11222333000181")
+
+        depois_do_ttl = time.monotonic() + gerenciador_sessao.TTL_SESSAO + 1
+        with mock.patch.object(gerenciador_sessao.time, "monotonic", return_value=depois_do_ttl):
+            self.assertIsNone(gerenciador_sessao.obter_sessao_validada("5511"))
+
+    def test_mapa_de_validacoes_e_limitado(self):
+        """Acima do limite, o telefone usado há mais tempo deve sair."""
+        with mock.patch.object(gerenciador_sessao, "MAX_SESSOES_VALIDADAS", 2):
+            gerenciador_sessao.registrar_sessao_validada("1", "1:cnpj")
+            gerenciador_sessao.registrar_sessao_validada("2", "2:cnpj")
+            gerenciador_sessao.registrar_sessao_validada("3", "3:cnpj")
+
+        self.assertIsNone(gerenciador_sessao.obter_sessao_validada("1"))
+        self.assertEqual(gerenciador_sessao.obter_sessao_validada("3"), "3:cnpj")
+
+    def test_limpar_sessao_esquece_validacao(self):
+        """Limpar a sessão com CNPJ deve exigir nova validação do telefone."""
+        gerenciador_sessao.registrar_sessao_validada("5511", "5511:11222333000181")
+        gerenciador_sessao.limpar_sessao("5511:11222333000181")
+
+        self.assertIsNone(gerenciador_sessao.obter_sessao_validada("5511"))
+
+    def test_limpar_sessoes_antigas_esquece_validacao(self):
+        """A sessão com CNPJ removida por idade também deve invalidar o telefone."""
+        gerenciador_sessao.salvar_sessao("5511:11222333000181", {"shopping_cart": []})
+        gerenciador_sessao.registrar_sessao_validada("5511", "5511:11222333000181")
+        caminho = gerenciador_sessao._obter_caminho_arquivo_sessao("5511:11222333000181")
+        antigo = time.time() - 8 * 24 * 3600
+        os.utime(caminho, (antigo, antigo))
+
+        gerenciador_sessao.limpar_sessoes_antigas()
+
+        self.assertIsNone(gerenciador_sessao.obter_sessao_validada("5511"))
+
+
+class TestHashMensagem(unittest.TestCase):
+    """Verifica que o hash gravado no histórico é estável entre instalações."""
+
+    def test_hash_usa_blake2b_de_8_bytes(self):
+        """O hash deve ser sempre o blake2b de 8 bytes, independente de pacotes opcionais."""
+        self.assertEqual(
+            gerenciador_sessao.calcular_hash_mensagem("Adicionei 2 Skol ao carrinho"),
+            hashlib.blake2b("Adicionei 2 Skol ao carrinho".encode("utf-8"), digest_size=8).hexdigest(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Testes para o cache de intenções, o classificador e a validação de CNPJ da interface LLM."""
+
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Adiciona diretório IA ao path para permitir importações
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ai_llm import llm_interface
+from utils import classificador_intencao
+
+
+def _sessao(criado_em: str, historico: list) -> dict:
+    """Monta uma sessão mínima aguardando seleção no menu."""
+    return {
+        "criado_em": criado_em,
+        "historico_conversa": historico,
+        "shopping_cart": [{"codprod": 1, "qt": 1}],
+        "customer_context": None,
+        "last_bot_action": "AWAITING_MENU_SELECTION",
+        "pending_action": None,
+    }
+
+
+class TestCacheIntencao(unittest.TestCase):
+    """Verifica que o cache de intenções respeita sessão e histórico."""
+
+    def setUp(self):
+        llm_interface._cache_intencao.clear()
+
+    def tearDown(self):
+        llm_interface._cache_intencao.clear()
+
+    def test_sessoes_com_historicos_diferentes_nao_compartilham_entrada(self):
+        """A intenção de uma sessão não deve ser reaproveitada por outra."""
+        sessao_a = _sessao("2024-01-01T10:00:00", [
+            {"role": "user", "message": "quero skol"},
+            {"role": "assistant", "message": "Adicionei 1 Skol", "action_type": "ADD_TO_CART"},
+            {"role": "user", "message": "quero mais 2"},
+        ])
+        sessao_b = _sessao("2024-01-01T11:00:00", [
+            {"role": "user", "message": "quero coca"},
+            {"role": "assistant", "message": "Adicionei 1 Coca", "action_type": "ADD_TO_CART"},
+            {"role": "user", "message": "quero mais 2"},
+        ])
+        intencao_a = {"nome_ferramenta": "adicionar_item_ao_carrinho", "parametros": {"produto": "skol"}}
+        intencao_b = {"nome_ferramenta": "adicionar_item_ao_carrinho", "parametros": {"produto": "coca"}}
+
+        with mock.patch.object(
+            llm_interface, "detectar_intencao_com_sistemas_criticos", side_effect=[intencao_a, intencao_b]
+        ) as detector:
+            resultado_a = llm_interface.obter_intencao_rapida("quero mais 2", sessao_a)
+            resultado_b = llm_interface.obter_intencao_rapida("quero mais 2", sessao_b)
+
+        self.assertEqual(detector.call_count, 2)
+        self.assertEqual(resultado_a["parametros"]["produto"], "skol")
+        self.assertEqual(resultado_b["parametros"]["produto"], "coca")
+        self.assertEqual(len(llm_interface._cache_intencao), 2)
+
+    def test_segundo_turno_da_conversa_reaproveita_entrada(self):
+        """Repetir o comando no turno seguinte deve vir do cache, mesmo com o histórico maior."""
+        sessao = _sessao("2024-01-01T10:00:00", [])
+        intencao = {"nome_ferramenta": "visualizar_carrinho", "parametros": {}}
+
+        with mock.patch.object(
+            llm_interface, "detectar_intencao_com_sistemas_criticos", return_value=intencao
+        ) as detector:
+            for turno in range(2):
+                # Como no app: a mensagem entra no histórico antes da detecção e a resposta depois
+                sessao["historico_conversa"].append({"role": "user", "message": "Ver carrinho"})
+                resultado = llm_interface.obter_intencao_rapida("Ver carrinho", sessao)
+                resultado["parametros"]["alterado"] = turno
+                sessao["historico_conversa"].append(
+                    {"role": "assistant", "message": f"Seu carrinho ({turno})", "action_type": "SHOW_CART"}
+                )
+
+        self.assertEqual(detector.call_count, 1)
+        self.assertEqual(len(llm_interface._cache_intencao), 1)
+        # Cada acerto devolve uma cópia: alterações de um turno não vazam para o cache
+        self.assertNotIn("alterado", llm_interface.obter_intencao_rapida("ver carrinho", sessao)["parametros"])
+
+    def test_fora_do_menu_nao_usa_cache(self):
+        """Aguardando outra ação, a mensagem depende do contexto e não é cacheada."""
+        sessao = _sessao("2024-01-01T10:00:00", [])
+        sessao["last_bot_action"] = "AWAITING_PRODUCT_SELECTION"
+
+        self.assertIsNone(llm_interface._chave_cache_intencao("quero mais 2", sessao))
+
+class TestClassificadorIntencao(unittest.TestCase):
+    """Verifica os caminhos de cache do classificador de intenções."""
+
+    def test_acerto_no_cache_semantico(self):
+        """Um acerto no cache semântico deve devolver a intenção sem erro."""
+        intencao = {"nome_ferramenta": "visualizar_carrinho", "parametros": {}, "confidence_score": 0.4}
+
+        with mock.patch.object(classificador_intencao, "buscar_semelhante", return_value=intencao), \
+                mock.patch.object(classificador_intencao, "log_decisao_ia"):
+            resultado = classificador_intencao.detectar_intencao_usuario_com_ia("ver carrinho", "")
+
+        self.assertEqual(resultado["nome_ferramenta"], "visualizar_carrinho")
+        self.assertTrue(resultado["confidence_below_threshold"])
+
+
+def _cnpj_referencia(cnpj: str) -> bool:
+    """Validação de CNPJ escrita da forma direta, usada como referência."""
+    digitos = [int(c) for c in cnpj if c in "0123456789"]
+    if len(digitos) != 14 or len(set(digitos)) == 1:
+        return False
+    for tamanho in (12, 13):
+        pesos = list(range(tamanho - 7, 1, -1)) + list(range(9, 1, -1))
+        resto = sum(d * p for d, p in zip(digitos, pesos)) % 11
+        if digitos[tamanho] != (0 if resto < 2 else 11 - resto):
+            return False
+    return True
+
+
+class TestValidacaoCnpj(unittest.TestCase):
+    """Verifica a validação de CNPJ contra uma implementação de referência."""
+
+    def test_digitos_verificadores_zero(self):
+        """Resto menor que 2 deve gerar dígito verificador 0."""
+        for cnpj in ("11222333000505", "11222333001820", "11222333001900"):
+            with self.subTest(cnpj=cnpj):
+                self.assertTrue(llm_interface.is_valid_cnpj(cnpj))
+                self.assertTrue(_cnpj_referencia(cnpj))
+        self.assertTrue(llm_interface.is_valid_cnpj("11.222.333/0019-00"))
+
+    def test_digito_verificador_errado(self):
+        """Trocar qualquer dígito verificador deve invalidar o CNPJ."""
+        self.assertFalse(llm_interface.is_valid_cnpj("11222333000506"))
+        self.assertFalse(llm_interface.is_valid_cnpj("11222333000515"))
+
+    def test_digitos_nao_ascii_sao_recusados(self):
+        """Dígitos unicode (largura total, arábicos) não formam um CNPJ válido."""
+        largura_total = "".join(chr(ord(c) + 0xFEE0) for c in "11222333000181")
+        arabicos = "".join(chr(ord(c) - 48 + 0x0660) for c in "11222333000181")
+        for cnpj in (largura_total, arabicos, "1122233300018\u0661"):
+            with self.subTest(cnpj=cnpj):
+                self.assertFalse(llm_interface.is_valid_cnpj(cnpj))
+
+    def test_entradas_curtas_sao_recusadas(self):
+        """Menos de 14 caracteres nunca é um CNPJ, nem dos de teste."""
+        for cnpj in ("", "1", "1122233300018", "11.222.333"):
+            with self.subTest(cnpj=cnpj):
+                self.assertFalse(llm_interface.is_valid_cnpj(cnpj))
+
+    def test_cnpjs_de_teste_sao_aceitos(self):
+        """Os CNPJs de desenvolvimento devem passar mesmo sem dígitos válidos."""
+        for cnpj in llm_interface._CNPJS_TESTE:
+            with self.subTest(cnpj=cnpj):
+                self.assertTrue(llm_interface.is_valid_cnpj(cnpj))
+        self.assertFalse(llm_interface.is_valid_cnpj("22222222222222"))
+
+    def test_concorda_com_referencia(self):
+        """Para bases sequenciais, o resultado deve coincidir com a referência."""
+        for n in range(1000):
+            cnpj = f"{11222333000000 + n * 7:014d}"
+            if cnpj in llm_interface._CNPJS_TESTE:
+                continue
+            with self.subTest(cnpj=cnpj):
+                self.assertEqual(llm_interface.is_valid_cnpj(cnpj), _cnpj_referencia(cnpj))
+
+
+if __name__ == "__main__":
+    unittest.main()